@@ -0,0 +1,106 @@
+from __future__ import annotations
+import numpy as np
+from compiled import CompiledStory, EXIT_ID, MISSING_ID, STUCK_ID, FLAG_END
+
+# Destinazione fittizia usata solo dal motore vettoriale
+PENDING_ID = -4  # la prima opzione ha requisiti: va valutata con l'inventario
+SHIFT = 3        # terminal[next + SHIFT] copre anche EXIT_ID, MISSING_ID e STUCK_ID
+
+class BatchEngine:
+    ''' K sessioni sulla stessa storia compilata, avanzate insieme con operazioni vettoriali NumPy '''
+    def __init__(self, story: CompiledStory, sessions: int, inventories: list[int] = None, startKey: str = "0"):
+        self.story = story
+        self.sessions = sessions
+        self.start = story.nodeId(startKey)
+
+        slots = 2 * story.nodeCount
+        optStart = np.asarray(story.optStart, dtype=np.int64)
+        counts = np.diff(optStart)
+        width = max(int(counts.max()) if slots else 0, 1)
+        # Opzioni di ogni (nodo, lato) per colonne; le celle vuote portano a STUCK_ID senza requisiti
+        self.optMask = np.zeros((width, slots), dtype=np.uint64)
+        self.optNext = np.full((width, slots), STUCK_ID, dtype=np.int32)
+        rows = np.arange(len(story.optMask)) - np.repeat(optStart[:-1], counts)
+        cols = np.repeat(np.arange(slots), counts)
+        self.optMask[rows, cols] = np.asarray(story.optMask, dtype=np.uint64)
+        self.optNext[rows, cols] = np.asarray(story.optNext, dtype=np.int32)
+        self.width = counts
+        # Quasi sempre la prima opzione non ha requisiti: la destinazione si legge direttamente
+        self.direct = np.where(self.optMask[0] == 0, self.optNext[0], PENDING_ID).astype(np.int32)
+
+        self.grant = np.asarray(story.grant, dtype=np.uint64)
+        self.turnOf = np.asarray(story.turn, dtype=np.int32)
+        terminal = (np.asarray(story.flags, dtype=np.uint8) & FLAG_END).astype(bool)
+        self.terminal = np.concatenate([np.ones(SHIFT, dtype=bool), terminal])
+
+        inventories = list(inventories or [])
+        self.characters = max(len(inventories), int(self.turnOf.max()) + 1 if story.nodeCount else 1)
+        self.initial = np.zeros(self.characters, dtype=np.uint64)
+        self.initial[:len(inventories)] = inventories
+
+        # Stato delle K sessioni: nodo corrente e un inventario per personaggio
+        self.node = np.full(sessions, self.start, dtype=np.int32)
+        self.inventory = np.tile(self.initial, (sessions, 1))
+        self._base = np.arange(sessions, dtype=np.int64) * self.characters
+
+        # Statistiche
+        self.endings = np.zeros(story.nodeCount, dtype=np.int64)
+        self.exits = 0
+        self.stuck = 0
+        self.broken = 0
+        self.transitions = 0
+
+    def turn(self) -> np.ndarray:
+        '''Personaggio di turno in ogni sessione'''
+        return self.turnOf.take(self.node)
+
+    def step(self, choices: np.ndarray):
+        '''Un passo per ogni sessione: choices[k] è 0 (sinistra) o 1 (destra)'''
+        slot = self.node * 2 + choices
+        # Il giocatore di turno ottiene gli oggetti prima che si valutino i requisiti
+        inventory = self.inventory.reshape(-1)
+        where = self._base + self.turnOf.take(self.node)
+        held = inventory.take(where) | self.grant.take(slot)
+        inventory.put(where, held)
+
+        following = self.direct.take(slot)
+        pending = np.flatnonzero(following == PENDING_ID)
+        if pending.size:
+            following[pending] = self._evaluate(slot.take(pending), held.take(pending))
+        self.transitions += self.sessions
+
+        finished = self.terminal.take(following + SHIFT)
+        if finished.any():
+            self._finish(following, finished)
+            following[finished] = self.start
+        self.node = following
+
+    def _evaluate(self, slot: np.ndarray, held: np.ndarray) -> np.ndarray:
+        '''Prima opzione soddisfatta per le sessioni i cui (nodo, lato) hanno requisiti'''
+        following = np.full(slot.size, STUCK_ID, dtype=np.int32)
+        # Dall'ultima colonna alla prima: vince la prima opzione soddisfatta, come in getLeft/getRight
+        for column in range(int(self.width.take(slot).max()) - 1, -1, -1):
+            satisfied = (self.optMask[column].take(slot) & ~held) == 0
+            np.copyto(following, self.optNext[column].take(slot), where=satisfied)
+        return following
+
+    def _finish(self, following: np.ndarray, finished: np.ndarray):
+        '''Registra l'esito delle partite concluse e le fa ricominciare da capo'''
+        outcome = following[finished]
+        self.endings += np.bincount(outcome[outcome >= 0], minlength=self.story.nodeCount)
+        self.exits += int(np.count_nonzero(outcome == EXIT_ID))
+        self.broken += int(np.count_nonzero(outcome == MISSING_ID))
+        self.stuck += int(np.count_nonzero(outcome == STUCK_ID))
+        self.inventory[finished] = self.initial
+
+    def run(self, steps: int, seed: int = 0):
+        '''Avanza tutte le sessioni per `steps` passi con scelte casuali uniformi'''
+        rng = np.random.default_rng(seed)
+        size = (self.sessions + 7) // 8
+        for _ in range(steps):
+            bits = np.unpackbits(rng.integers(0, 256, size=size, dtype=np.uint8))
+            self.step(bits[:self.sessions])
+
+    def histogram(self) -> dict[str, int]:
+        '''Numero di partite concluse in ogni finale, per chiave del nodo'''
+        return {self.story.key(int(node)): int(self.endings[node]) for node in np.flatnonzero(self.endings)}
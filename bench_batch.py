@@ -0,0 +1,50 @@
+import argparse
+import random
+import time
+from model import GameSession, StoryCache, parseScelte, parseCharacters
+from compiled import CompiledStory
+from batch import BatchEngine
+from storygen import generateStory
+
+# Transizioni al secondo: GameSession.choose una sessione alla volta contro BatchEngine su K sessioni
+
+def scalar(collection, characters, transitions: int) -> float:
+    rng = random.Random(0)
+    session, iterator = GameSession(collection, [c.clone() for c in characters]), iter(collection)
+    start = time.perf_counter()
+    for _ in range(transitions):
+        next_s = session.choose(rng.choice(("left", "right")), iterator)
+        if next_s.key == "EXIT" or next_s.is_end:
+            session = GameSession(collection, [c.clone() for c in characters])
+    return transitions / (time.perf_counter() - start)
+
+def batch(story, characters, sessions: int, steps: int) -> tuple[float, BatchEngine]:
+    engine = BatchEngine(story, sessions, [story.itemMask(c.abilities) for c in characters])
+    start = time.perf_counter()
+    engine.run(steps)
+    return engine.transitions / (time.perf_counter() - start), engine
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--story", default="storia.json")
+    parser.add_argument("--generated", type=int, default=20000, help="nodi della storia generata (0 per saltarla)")
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--steps", type=int, default=300)
+    args = parser.parse_args()
+
+    stories = [(args.story, *StoryCache().load(args.story))]
+    if args.generated:
+        data = generateStory(args.generated)
+        stories.append((f"generated {args.generated}", parseScelte(data["nodes"], data["level_introductions"]), parseCharacters(data["characters"])))
+
+    for label, collection, characters in stories:
+        story = CompiledStory.fromCollection(collection, characters)
+        rate, engine = batch(story, characters, args.sessions, args.steps)
+        print(f"{label}")
+        print(f"  GameSession.choose     {scalar(collection, characters, 200_000) / 1e6:8.2f} M transitions/s")
+        print(f"  BatchEngine K={args.sessions:<9} {rate / 1e6:8.2f} M transitions/s")
+        top = sorted(engine.histogram().items(), key=lambda item: -item[1])[:5]
+        print("  endings: " + ", ".join(f"{key} {count}" for key, count in top))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+from view import TextLayout, get_font, FONT_SIZE_NORMAL
+
+# Divisione in righe dei testi della storia: il vecchio _wrap_text (font.size per ogni prefisso)
+# contro TextLayout, a freddo (solo la cache degli avanzamenti) e con la cache delle righe
+
+def legacy(content, font, max_width):
+    '''Il _wrap_text di MultiLineText prima di TextLayout'''
+    words = content.split(' ')
+    lines, current_line = [], []
+    for word in words:
+        for i, sw in enumerate(word.split('\n')):
+            if i > 0:
+                lines.append(' '.join(current_line))
+                current_line = []
+            if font.size(' '.join(current_line + [sw]))[0] <= max_width:
+                current_line.append(sw)
+            else:
+                lines.append(' '.join(current_line))
+                current_line = [sw]
+    lines.append(' '.join(current_line))
+    return lines
+
+def texts(story: str) -> list:
+    with open(story, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    found = [intro.get("text", "") if isinstance(intro, dict) else str(intro) for intro in data.get("level_introductions", {}).values()]
+    for node in data.get("nodes", {}).values():
+        found += [node.get(field, "") for field in ("text", "rightText", "leftText")]
+    return [t for t in found if t]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--story", default="storia.json")
+    parser.add_argument("--width", type=int, default=700)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pygame.font.init()
+    font = get_font(FONT_SIZE_NORMAL)
+    corpus = texts(args.story)
+    chars = sum(len(t) for t in corpus)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in corpus:
+            legacy(t, font, args.width)
+    old = (time.perf_counter() - start) / args.repeat
+
+    layout = TextLayout()
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        layout.lines.clear()
+        for t in corpus:
+            layout.wrap(t, font, args.width, (FONT_SIZE_NORMAL, False))
+    cold = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in corpus:
+            layout.wrap(t, font, args.width, (FONT_SIZE_NORMAL, False))
+    warm = (time.perf_counter() - start) / args.repeat
+
+    # Le larghezze sommate ignorano la crenatura: si conta quante righe escono dal limite misurate con font.size
+    over = sum(font.size(line)[0] > args.width for t in corpus for line in layout.wrap(t, font, args.width, (FONT_SIZE_NORMAL, False)) if " " in line)
+    print(f"{args.story}: {len(corpus)} texts, {chars} chars, width {args.width}")
+    print(f"  _wrap_text (font.size per prefix)  {old * 1e6 / len(corpus):8.1f} us/text")
+    print(f"  TextLayout (glyph advances)        {cold * 1e6 / len(corpus):8.1f} us/text")
+    print(f"  TextLayout (memo)                  {warm * 1e6 / len(corpus):8.1f} us/text")
+    print(f"  lines over width by kerning        {over}")
+
+if __name__ == "__main__":
+    main()
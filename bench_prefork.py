@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+from compiled import CompiledStory, EXIT_ID
+from model import GameSession, SingletonMeta, StoryCache
+from prefork import preforkWorkers, uniqueMemory
+from storygen import generateStory
+
+# Memoria privata (USS) per worker: ogni worker che legge la storia da solo,
+# contro i worker creati dopo che il padre l'ha caricata e congelata.
+
+def walk(story, characters, steps: int, seed: int):
+    '''Percorso casuale nella storia, per toccare nodi e testi come farebbe una partita'''
+    rng = random.Random(seed)
+    if isinstance(story, CompiledStory):
+        start = story.nodeId("0")
+        node, inventories = start, [story.itemMask(c.abilities) for c in characters]
+        for _ in range(steps):
+            side = rng.randrange(2)
+            turn = story.turn[node]
+            inventories[turn] |= story.grant[node * 2 + side]
+            node = story.step(node, side, inventories[turn])
+            if node < 0 or story.isEnd(node):
+                node, inventories = start, [story.itemMask(c.abilities) for c in characters]
+        return
+    session = GameSession(story, [c.clone() for c in characters])
+    iterator = iter(story)
+    for _ in range(steps):
+        next_s = session.choose(rng.choice(("left", "right")), iterator)
+        if next_s.key == "EXIT" or next_s.is_end:
+            session = GameSession(story, [c.clone() for c in characters])
+
+def forkWorkers(workers: int, target) -> list[int]:
+    '''Ogni worker scrive la propria USS su una pipe; il padre le raccoglie'''
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for index in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            target(index)
+            os.write(write_fd, f"{uniqueMemory()}\n".encode())
+            os._exit(0)
+        pids.append(pid)
+    os.close(write_fd)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        return [int(line) for line in f]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--story", help="story file (default: a generated one)")
+    parser.add_argument("--nodes", type=int, default=20000, help="size of the generated story")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=20000)
+    args = parser.parse_args()
+
+    fileName = args.story
+    if fileName is None:
+        fileName = os.path.join(tempfile.mkdtemp(), "story.json")
+        with open(fileName, 'w', encoding='utf-8') as f:
+            json.dump(generateStory(args.nodes), f)
+    print(f"story: {fileName} ({os.path.getsize(fileName) / 1e6:.1f} MB), {args.workers} workers")
+
+    def independent(index):
+        # Ogni processo legge e analizza la storia per conto proprio
+        SingletonMeta._instances = {}
+        collection, characters = StoryCache().load(fileName)
+        walk(collection, characters, args.steps, index)
+
+    def shared(compiled):
+        def run(index):
+            read_fd, write_fd = os.pipe()
+            def worker(i, story, characters):
+                walk(story, characters, args.steps, i)
+                os.write(write_fd, f"{uniqueMemory()}\n".encode())
+            preforkWorkers(fileName, args.workers, worker, compiled=compiled)
+            os.close(write_fd)
+            with os.fdopen(read_fd) as f:
+                print(f"{'prefork + ' + ('compiled' if compiled else 'frozen dict'):<26}", summary([int(line) for line in f]))
+        return run
+
+    def summary(values):
+        return f"USS per worker: mean {sum(values) / len(values) / 1e6:7.2f} MB   max {max(values) / 1e6:7.2f} MB"
+
+    print(f"{'independent processes':<26}", summary(forkWorkers(args.workers, independent)))
+    # Ogni modalità gira in un processo separato per partire da un padre pulito
+    for compiled in (False, True):
+        forkWorkers(1, shared(compiled))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import time
+from model import GameSession, parseScelte, parseCharacters
+from eventlog import EventLog, ReplayEngine, splitSessions
+from storygen import generateStory
+from test_eventlog import play
+
+# Eventi rigiocati al secondo: GameSession.choose evento per evento contro ReplayEngine
+
+def naive(collection, characters, events) -> float:
+    '''Rigioca con GameSession come farebbe il gioco, ricreando la sessione a ogni S'''
+    start = time.perf_counter()
+    for session in splitSessions(events):
+        game, iterator = GameSession(collection, [c.clone() for c in characters]), iter(collection)
+        for event in session[1:]:
+            if event[0] == "C":
+                game.choose(("left", "right")[event[1]], iterator)
+    return len(events) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--choices", type=int, default=200_000)
+    args = parser.parse_args()
+
+    data = generateStory(args.nodes)
+    collection = parseScelte(data["nodes"], data["level_introductions"])
+    characters = parseCharacters(data["characters"])
+    log = EventLog()
+    play(collection, characters, log, args.choices, seed=0)
+    engine = ReplayEngine(collection)
+
+    start = time.perf_counter()
+    divergences = engine.validate(log.events)
+    rate = len(log.events) / (time.perf_counter() - start)
+    assert not divergences
+    print(f"generated {args.nodes}: {len(log.events)} events, {len(splitSessions(log.events))} sessions")
+    print(f"  GameSession.choose  {naive(collection, characters, log.events) / 1e6:8.2f} M events/s")
+    print(f"  ReplayEngine        {rate / 1e6:8.2f} M events/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import random
+import time
+from model import StoryCache, parseScelte, parseCharacters
+from savecodec import SaveCodec
+from storygen import generateStory
+
+# Dimensione e tempo di lettura di saves.json: JSON con indent=4 contro il formato binario di SaveCodec
+
+def profile(collection, characters, rng: random.Random) -> dict:
+    '''Un profilo plausibile: metà dei finali sbloccati e tre slot occupati'''
+    endings = [key for key, scelta in collection._collection.items() if scelta.is_end]
+    nodes = list(collection._collection)
+    items = sorted({item for scelta in collection._collection.values() for item in scelta.leftObjects + scelta.rightObjects})
+    data = {"unlocked_endings": rng.sample(endings, len(endings) // 2)}
+    for slot in ("1", "2", "3"):
+        data[slot] = {"name": f"saveGame{slot}", "node": rng.choice(nodes), "turn": rng.randrange(len(characters))}
+        for i in range(len(characters)):
+            data[slot][f"p{i + 1}_abilities"] = rng.sample(items, min(len(items), 6))
+    return data
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--story", default="storia.json")
+    parser.add_argument("--generated", type=int, default=2000, help="nodi della storia generata (0 per saltarla)")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    stories = [(args.story, *StoryCache().load(args.story))]
+    if args.generated:
+        data = generateStory(args.generated)
+        stories.append((f"generated {args.generated}", parseScelte(data["nodes"], data["level_introductions"]), parseCharacters(data["characters"])))
+
+    for label, collection, characters in stories:
+        codec = SaveCodec.fromCollection(collection, characters)
+        data = profile(collection, characters, random.Random(0))
+        text = json.dumps(data, indent=4).encode("utf-8")
+        binary = codec.encode(data)
+        assert codec.load(binary) == data
+        jsonTime = timed(lambda: json.loads(text.decode("utf-8")), args.repeat)
+        binaryTime = timed(lambda: codec.load(binary), args.repeat)
+        print(f"{label}")
+        print(f"  json indent=4  {len(text):7d} bytes  {jsonTime * 1e6:8.2f} us/load")
+        print(f"  SaveCodec      {len(binary):7d} bytes  {binaryTime * 1e6:8.2f} us/load  ({len(text) / len(binary):.1f}x smaller)")
+
+if __name__ == "__main__":
+    main()
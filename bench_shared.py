@@ -0,0 +1,65 @@
+import argparse
+import multiprocessing
+import pickle
+import random
+import time
+from compiled import CompiledStory, SharedStory, initSharedWorker, sharedWorkerStory
+from model import parseScelte, parseCharacters
+from storygen import generateStory
+
+# Consegna della storia a un Pool avviato con spawn: collezione serializzata
+# con pickle in ogni worker, contro una vista senza copie sulla memoria condivisa.
+
+_collection = None
+
+def initPickledWorker(collection):
+    global _collection
+    _collection = collection
+
+def walkShared(seed: int) -> int:
+    story = sharedWorkerStory()
+    rng, node, inventory, visited = random.Random(seed), 0, 0, 0
+    for _ in range(10000):
+        side = rng.randrange(2)
+        inventory |= story.grant[node * 2 + side]
+        node = story.step(node, side, inventory)
+        if node < 0 or story.isEnd(node):
+            node, inventory = 0, 0
+        visited += 1
+    return visited
+
+def walkPickled(seed: int) -> int:
+    compiled = CompiledStory.fromCollection(_collection)
+    rng, node, inventory, visited = random.Random(seed), 0, 0, 0
+    for _ in range(10000):
+        side = rng.randrange(2)
+        inventory |= compiled.grant[node * 2 + side]
+        node = compiled.step(node, side, inventory)
+        if node < 0 or compiled.isEnd(node):
+            node, inventory = 0, 0
+        visited += 1
+    return visited
+
+def run(label, initializer, initargs, task, workers):
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(workers, initializer, initargs) as pool:
+        pool.map(task, range(workers))
+    print(f"{label:<22} {time.perf_counter() - start:6.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    data = generateStory(args.nodes)
+    collection = parseScelte(data["nodes"], data["level_introductions"])
+    story = CompiledStory.fromCollection(collection, parseCharacters(data["characters"]))
+    with SharedStory(story) as shared:
+        print(f"pickled collection: {len(pickle.dumps(collection)) / 1e6:.1f} MB per worker, "
+              f"shared handle: {len(pickle.dumps(shared.handle))} bytes, shared block: {story.nbytes() / 1e6:.1f} MB")
+        run("pickled collection", initPickledWorker, (collection,), walkPickled, args.workers)
+        run("shared memory", initSharedWorker, (shared.handle,), walkShared, args.workers)
+
+if __name__ == "__main__":
+    main()
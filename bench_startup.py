@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import os
+
+# Misura il tempo di import a freddo dei moduli del gioco, ognuno in un processo separato
+MODULES = ["model", "validator", "view", "controller"]
+RUNS = 5
+# Limite per i moduli che non devono caricare pygame (secondi, miglior tempo su RUNS avvii)
+MODEL_MODULES = ["model", "validator", "solver", "savecodec", "eventlog"]
+MODEL_BUDGET = 0.5
+
+SNIPPET = """
+import sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+mixer = sys.modules.get("pygame.mixer")
+print(elapsed, "pygame" in sys.modules, bool(mixer and mixer.get_init()))
+"""
+
+def measure(module: str, runs: int = RUNS):
+    '''Restituisce (tempo minimo in secondi, pygame importato, mixer inizializzato)'''
+    best = None
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module=module)],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"},
+        ).stdout.split()[-3:]
+        elapsed = float(out[0])
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out[1] == "True", out[2] == "True"
+
+if __name__ == "__main__":
+    slow = []
+    for module in dict.fromkeys(MODULES + MODEL_MODULES):
+        elapsed, pygame_loaded, mixer_ready = measure(module)
+        over = module in MODEL_MODULES and elapsed > MODEL_BUDGET
+        if over:
+            slow.append(module)
+        print(f"{module:<12} {elapsed * 1000:8.1f} ms   pygame={pygame_loaded!s:<5}  mixer={mixer_ready}"
+              + ("   OVER BUDGET" if over else ""))
+    if slow:
+        sys.exit(f"Import slower than {MODEL_BUDGET * 1000:.0f} ms: {', '.join(slow)}")
@@ -0,0 +1,291 @@
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+import json
+from model import Character, Scelta, ScelteCollection, ScelteIterator
+
+# Identificativi speciali per le destinazioni delle opzioni
+EXIT_ID = -1     # "EXIT": torna al menu principale
+MISSING_ID = -2  # chiave non presente nella storia (vedi validator.py)
+STUCK_ID = -3    # nessuna opzione soddisfatta (getLeft/getRight solleverebbero ValueError)
+
+LEFT, RIGHT = 0, 1
+SIDES = {"left": LEFT, "right": RIGHT}
+
+FLAG_END = 1        # il nodo è un finale
+FLAG_HAS_TITLE = 2  # ending_title è presente (None altrimenti)
+
+# Stringhe di ogni nodo, nell'ordine in cui sono salvate
+NODE_STRINGS = ("key", "text", "leftText", "rightText", "ending_title")
+MAX_ITEMS = 64  # gli inventari sono maschere di bit a 64 bit
+WARM_NODES = 16  # scelte materializzate in anticipo (vedi prefetch) tenute in memoria
+
+# Tabelle che compongono una storia compilata: (nome, typecode di array)
+TABLES = (
+    ("turn",      "i"),  # per nodo
+    ("level",     "i"),  # per nodo
+    ("flags",     "B"),  # per nodo
+    ("optStart",  "i"),  # per (nodo, lato): inizio delle opzioni in optMask/optNext, 2N+1 valori
+    ("optMask",   "Q"),  # per opzione: oggetti richiesti
+    ("optNext",   "i"),  # per opzione: nodo di destinazione
+    ("grant",     "Q"),  # per (nodo, lato): oggetti ottenuti
+    ("strOffset", "q"),  # inizio di ogni stringa in strings, più la fine dell'ultima
+    ("strings",   "B"),  # testo UTF-8 di tutte le stringhe concatenate
+)
+
+class CompiledStory:
+    ''' Storia compilata in tabelle piatte; espone la stessa interfaccia di ScelteCollection '''
+    def __init__(self, tables: dict):
+        for name, _ in TABLES:
+            setattr(self, name, tables[name])
+        self.nodeCount = len(self.turn)
+        # Dopo le stringhe dei nodi ci sono i nomi degli oggetti e le introduzioni dei livelli
+        self.itemCount = len(self.strOffset) - 1 - self.nodeCount * len(NODE_STRINGS) - 1
+        self.generation = 0
+        self.transitionCache = None
+        self._index = None
+        self._items = None
+        self._itemIds = None
+        self._intros = None
+        self._shm = None  # blocco di memoria condivisa, se la storia è una vista (vedi attachStory)
+        self._warm = {}   # chiave -> Scelta già costruita, dalla meno recente
+
+    @classmethod
+    def fromCollection(cls, collection: ScelteCollection, characters: list[Character] = None) -> CompiledStory:
+        '''Compila una collezione (e le abilità iniziali dei personaggi) in tabelle piatte'''
+        nodes = collection._collection
+        ids = {key: i for i, key in enumerate(nodes)}
+        items = {}
+
+        def mask(objects) -> int:
+            value = 0
+            for obj in objects:
+                if obj not in items:
+                    if len(items) == MAX_ITEMS:
+                        raise ValueError(f"Stories with more than {MAX_ITEMS} distinct objects cannot be compiled")
+                    items[obj] = len(items)
+                value |= 1 << items[obj]
+            return value
+
+        for character in characters or []:
+            mask(character.abilities)
+
+        turn, level, flags = array("i"), array("i"), array("B")
+        optStart, optMask, optNext, grant = array("i"), array("Q"), array("i"), array("Q")
+        strings = []
+        for key, scelta in nodes.items():
+            turn.append(scelta.turn or 0)
+            level.append(scelta.level)
+            flags.append((FLAG_END if scelta.is_end else 0) | (FLAG_HAS_TITLE if scelta.ending_title is not None else 0))
+            for options, objects in ((scelta.nextLeft, scelta.leftObjects), (scelta.nextRight, scelta.rightObjects)):
+                optStart.append(len(optMask))
+                grant.append(mask(objects))
+                for required_objects, next_key in options:
+                    optMask.append(mask(required_objects))
+                    optNext.append(EXIT_ID if next_key == "EXIT" else ids.get(next_key, MISSING_ID))
+            strings.extend(getattr(scelta, field) or "" for field in NODE_STRINGS)
+        optStart.append(len(optMask))
+        strings.extend(items)
+        strings.append(json.dumps(collection.level_introductions))
+
+        blob, strOffset = bytearray(), array("q")
+        for value in strings:
+            strOffset.append(len(blob))
+            blob += value.encode("utf-8")
+        strOffset.append(len(blob))
+
+        return cls({
+            "turn": turn, "level": level, "flags": flags,
+            "optStart": optStart, "optMask": optMask, "optNext": optNext, "grant": grant,
+            "strOffset": strOffset, "strings": bytes(blob),
+        })
+
+    def tables(self) -> dict:
+        return {name: getattr(self, name) for name, _ in TABLES}
+
+    def close(self):
+        '''Rilascia le viste sulla memoria condivisa (nessun effetto per le storie in memoria locale)'''
+        if self._shm is None:
+            return
+        for name, _ in TABLES:
+            getattr(self, name).release()
+        self._shm.close()
+        self._shm = None
+
+    def nbytes(self) -> int:
+        '''Memoria occupata dalle tabelle'''
+        return sum(len(memoryview(table).cast("B")) for table in self.tables().values())
+
+    # ---- stringhe, nodi e oggetti
+
+    def string(self, index: int) -> str:
+        return bytes(self.strings[self.strOffset[index]:self.strOffset[index + 1]]).decode("utf-8")
+
+    def nodeString(self, node: int, field: str) -> str:
+        return self.string(node * len(NODE_STRINGS) + NODE_STRINGS.index(field))
+
+    def key(self, node: int) -> str:
+        return self.string(node * len(NODE_STRINGS))
+
+    def buildIndex(self) -> CompiledStory:
+        '''Costruisce subito gli indici chiave -> nodo e oggetto -> bit (altrimenti creati al primo uso)'''
+        if self._index is None:
+            self._index = {self.key(node): node for node in range(self.nodeCount)}
+        if self._itemIds is None:
+            self._itemIds = {name: i for i, name in enumerate(self.items())}
+        return self
+
+    def nodeId(self, key: str) -> int:
+        if self._index is None:
+            self.buildIndex()
+        return self._index[key]
+
+    def items(self) -> list[str]:
+        if self._items is None:
+            base = self.nodeCount * len(NODE_STRINGS)
+            self._items = [self.string(base + i) for i in range(self.itemCount)]
+        return self._items
+
+    def itemMask(self, objects) -> int:
+        '''Maschera di bit degli oggetti; quelli sconosciuti alla storia vengono ignorati'''
+        if self._itemIds is None:
+            self.buildIndex()
+        value = 0
+        for obj in objects:
+            bit = self._itemIds.get(obj)
+            if bit is not None:
+                value |= 1 << bit
+        return value
+
+    def itemNames(self, mask: int) -> list[str]:
+        return [name for i, name in enumerate(self.items()) if mask >> i & 1]
+
+    def isEnd(self, node: int) -> bool:
+        return bool(self.flags[node] & FLAG_END)
+
+    @property
+    def level_introductions(self) -> dict[str, str]:
+        if self._intros is None:
+            self._intros = json.loads(self.string(len(self.strOffset) - 2))
+        return self._intros
+
+    # ---- transizioni
+
+    def step(self, node: int, side: int, inventory: int) -> int:
+        '''Prima destinazione di (nodo, lato) i cui requisiti sono contenuti nell'inventario'''
+        slot = node * 2 + side
+        for option in range(self.optStart[slot], self.optStart[slot + 1]):
+            if self.optMask[option] & ~inventory == 0:
+                return self.optNext[option]
+        raise ValueError(f"The no-objets path is not available for the {'left' if side == LEFT else 'right'} of Scelta key " + self.key(node))
+
+    def _options(self, node: int, side: int) -> list[tuple[list[str], str]]:
+        slot = node * 2 + side
+        options = []
+        for option in range(self.optStart[slot], self.optStart[slot + 1]):
+            next_id = self.optNext[option]
+            next_key = "EXIT" if next_id == EXIT_ID else "<missing>" if next_id == MISSING_ID else self.key(next_id)
+            options.append((self.itemNames(self.optMask[option]), next_key))
+        return options
+
+    # ---- interfaccia di ScelteCollection
+
+    def __getScelta__(self, key: str) -> Scelta:
+        scelta = self._warm.get(key)
+        if scelta is not None:
+            return scelta
+        return self._buildScelta(key)
+
+    def prefetch(self, keys) -> list[Scelta]:
+        '''Costruisce in anticipo le scelte dei nodi indicati, così __getScelta__ non deve decodificarle'''
+        scelte = []
+        for key in keys:
+            try:
+                scelta = self.__getScelta__(key)
+            except KeyError:
+                continue  # destinazione mancante: la segnala il validatore
+            self._warm.pop(key, None)
+            if len(self._warm) >= WARM_NODES:
+                del self._warm[next(iter(self._warm))]
+            self._warm[key] = scelta
+            scelte.append(scelta)
+        return scelte
+
+    def _buildScelta(self, key: str) -> Scelta:
+        node = self.nodeId(key)
+        flags = self.flags[node]
+        return Scelta(
+            key=key,
+            nextRight=self._options(node, RIGHT),
+            nextLeft=self._options(node, LEFT),
+            text=self.nodeString(node, "text"),
+            rightText=self.nodeString(node, "rightText"),
+            leftText=self.nodeString(node, "leftText"),
+            rightObjects=self.itemNames(self.grant[node * 2 + RIGHT]),
+            leftObjects=self.itemNames(self.grant[node * 2 + LEFT]),
+            turn=self.turn[node],
+            is_end=bool(flags & FLAG_END),
+            level=self.level[node],
+            ending_title=self.nodeString(node, "ending_title") if flags & FLAG_HAS_TITLE else None,
+        )
+
+    def __iter__(self) -> ScelteIterator:
+        return ScelteIterator(self)
+
+    def __len__(self) -> int:
+        return self.nodeCount
+
+
+# ---- memoria condivisa per i processi avviati con spawn
+
+@dataclass(frozen=True)
+class SharedStoryHandle:
+    ''' Descrittore serializzabile di una storia in memoria condivisa: è tutto ciò che va passato ai worker '''
+    name:     str                                   # nome del blocco shared_memory
+    sections: tuple[tuple[str, str, int, int], ...] # (tabella, typecode, offset, lunghezza in byte)
+
+class SharedStory:
+    ''' Copia delle tabelle di una CompiledStory in un unico blocco shared_memory, posseduta dal processo padre '''
+    def __init__(self, story: CompiledStory):
+        sections, size = [], 0
+        for name, code in TABLES:
+            raw = memoryview(getattr(story, name)).cast("B")
+            size = (size + 7) // 8 * 8  # allineamento a 8 byte per le tabelle "Q" e "q"
+            sections.append((name, code, size, len(raw)))
+            size += len(raw)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, _, offset, length) in sections:
+            self._shm.buf[offset:offset + length] = memoryview(getattr(story, name)).cast("B")
+        self.handle = SharedStoryHandle(self._shm.name, tuple(sections))
+
+    def close(self, unlink: bool = True):
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+    def __enter__(self) -> SharedStory:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def attachStory(handle: SharedStoryHandle) -> CompiledStory:
+    '''Vista senza copie sulla storia condivisa; chiamare close() sulla storia prima di terminare'''
+    shm = shared_memory.SharedMemory(name=handle.name)
+    tables = {name: shm.buf[offset:offset + length].cast(code) for name, code, offset, length in handle.sections}
+    story = CompiledStory(tables)
+    story._shm = shm
+    return story
+
+# Storia del worker corrente, per Pool(initializer=initSharedWorker, initargs=(handle,))
+_workerStory = None
+
+def initSharedWorker(handle: SharedStoryHandle):
+    global _workerStory
+    _workerStory = attachStory(handle)
+
+def sharedWorkerStory() -> CompiledStory:
+    if _workerStory is None:
+        raise RuntimeError("initSharedWorker() has not been called in this process")
+    return _workerStory
@@ -3,23 +3,46 @@ import os
 import sys
 from model import *
 from view import *
+from solver import ReachabilityIndex, solveStory
+from savecodec import SaveCodec, isBinarySave
+from eventlog import EventLog, newLogFile
 import view 
 
+AUTOSAVE_FILE = "autosave.json"
+EVENT_LOG_DIR = "logs"
+IDLE_WAIT_MS = 250  # senza animazioni il ciclo dorme fino al prossimo evento, svegliandosi al più ogni 250 ms
 
 class MainController:
-    def __init__(self):
+    def __init__(self, compactSaves: bool = False, windowSize=None, fullscreen: bool = False, showStats: bool = False):
         self.fileManager = FileManager()
-        self.view = GameView()
+        # La scena è sempre 800x600: windowSize e fullscreen decidono solo la finestra in cui viene scalata
+        self.view = GameView(window_size=windowSize, fullscreen=fullscreen)
         self.session = None
         self.iterator = None
         self.running = False
         self.is_saved = True 
+        # In binario si scrive solo con compactSaves, ma un saves.json già binario si legge comunque
+        if compactSaves or isBinarySave("saves.json"):
+            self.fileManager.registerCodec("saves.json", SaveCodec.fromStoryFile("storia.json", self.fileManager), write=compactSaves)
         self.save_data = self.fileManager.loadSaves()
         self.selected_slot = None
         self.temp_name = ""
         self.gallery_page = 0
         self.quit_after_save = False
         self.audio = AudioManager()
+        self.storyFile = "storia.json"
+        self.storyCharacters = []  # personaggi come descritti nel file di storia, prima di ogni scelta
+        self.solutions = None
+        self.hints = None
+        self.autosave = AutosaveWriter(AUTOSAVE_FILE, self.fileManager)
+        self.eventLog = EventLog(newLogFile(EVENT_LOG_DIR), self.fileManager)
+        self.history = SessionHistory()
+        self.pendingEvents = []  # eventi già tolti dalla coda di pygame mentre il ciclo attendeva
+        self.prepared = {}  # scene costruite in anticipo (vedi prepareScenes)
+        self.preparedState = None
+        self.successors = None  # nodi raggiungibili dalla scelta attuale, già caricati (vedi prefetchSuccessors)
+        self.showStats = showStats
+        self.frameStats = FrameStats()
 
     # =====================
     # MUSICA
@@ -57,59 +80,125 @@ class MainController:
         elif self.view.current_scene == "INFO":
             self.showInfoMenu()
     
+    # =====================
+    # SCENE PREPARATE
+    # =====================
+    # Scene raggiungibili con un click da quella attuale: mentre il giocatore legge vengono costruite
+    # e composte fuori schermo, così al click basta scambiarle
+    PREDICTED_SCENES = {
+        "GAME": ("left", "right", "INFO"),
+        "LEVEL_INTRO": ("GAME",),
+        "INFO": ("GAME", "MENU"),
+    }
+
+    def sceneState(self):
+        # Le scene preparate valgono finché non cambiano scena, sessione o volume
+        return (self.view.current_scene, self.session.snapshot() if self.session else None, self.audio.volume_index)
+
+    def prepareScenes(self) -> bool:
+        '''Prepara la prossima scena prevedibile; False se sono già tutte pronte'''
+        if self.session is None:
+            return False
+        state = self.sceneState()
+        if state != self.preparedState:
+            self.prepared, self.preparedState, self.successors = {}, state, None
+        if self.view.current_scene == "GAME" and self.successors is None:
+            self.successors = self.prefetchSuccessors()
+            return True
+        for key in self.PREDICTED_SCENES.get(self.view.current_scene, ()):
+            if key not in self.prepared:
+                self.prepared[key] = self.prepareScene(key)
+                return True
+        return False
+
+    def prepareScene(self, key):
+        if key == "INFO":
+            return self.view.prepareScene("INFO", self.buildInfoObjects())
+        if key == "MENU":
+            return self.view.prepareScene("MENU", self.buildMainMenuObjects())
+        if key == "GAME":
+            return self.view.prepareScene("GAME", self.buildGameObjects())
+        # Scelta: la si applica alla sessione, si costruisce la scena che ne risulta e si ripristina lo stato
+        snapshot = self.session.snapshot()
+        try:
+            try:
+                next_s = self.session.choose(key, self.iterator)
+            except (KeyError, ValueError):
+                # Lato che porta a un nodo mancante o senza opzioni percorribili: resta da costruire al click
+                return None
+            if next_s.key == "EXIT":
+                return self.view.prepareScene("MENU", self.buildMainMenuObjects())
+            if self.session.needsLevelIntro(next_s):
+                return self.view.prepareScene("LEVEL_INTRO", self.buildLevelIntroObjects(next_s.level))
+            return self.view.prepareScene("GAME", self.buildGameObjects(rewindable=True))
+        finally:
+            self.session.restore(snapshot)
+            self.iterator._position = snapshot.sceltaId
+
+    def prefetchSuccessors(self):
+        '''Risolve i nodi a cui portano le due scelte e ne carica in anticipo scelta, ritratto e musica'''
+        # Il testo viene impaginato subito dopo, costruendo le scene delle due scelte (vedi prepareScene)
+        session = self.session
+        keys = [key for key in session.successors(self.iterator).values() if key != "EXIT"]
+        scelte = session.scelteCollection.prefetch(keys)
+        for scelta in scelte:
+            scenes = ("LEVEL_INTRO", "GAME") if session.needsLevelIntro(scelta) else ("GAME",)
+            for scene in scenes:
+                path = self.audio.music_for(scene, scelta.level)
+                if isinstance(path, str):
+                    self.audio.preload_music(path)
+            if 0 <= scelta.turn < len(session.characters) and session.characters[scelta.turn].image_path:
+                try:
+                    load_image(session.characters[scelta.turn].image_path)
+                except Exception:
+                    pass  # l'errore viene segnalato quando si costruisce la scena
+        return scelte
+
+    def takePrepared(self, key):
+        '''La scena preparata per key, se lo stato non è cambiato da quando è stata costruita'''
+        if not self.prepared or self.sceneState() != self.preparedState:
+            return None
+        return self.prepared.get(key)
+
+    def showPrepared(self, prepared, scene) -> bool:
+        if prepared is None or prepared.scene != scene:
+            return False
+        self.view.showPrepared(prepared)
+        self.prepared, self.preparedState = {}, None
+        return True
+
     # =====================
     # FILE DI GIOCO
     # =====================
     def parseScelteData(self, sceltaData, intros=None):
-        scelte = {}
-        for key, data in sceltaData.items():
-            scelte[key] = Scelta(
-                key=key,
-                text=data.get("text", ""),
-                nextRight=data.get("nextRight", []),
-                nextLeft=data.get("nextLeft", []),
-                rightText=data.get("rightText", ""),
-                leftText=data.get("leftText", ""),
-                rightObjects=data.get("rightObjects", []),
-                leftObjects=data.get("leftObjects", []),
-                turn=data.get("turn", 0),
-                is_end=data.get("is_end", False),
-                level=data.get("level", 1),
-                ending_title=data.get("ending_title")
-            )
-        return ScelteCollection(scelte, intros)
+        return parseScelte(sceltaData, intros)
 
     def parseCharactersData(self, charactersData):
-        characters = []
-        for char_id_str in charactersData:
-            data = charactersData[char_id_str]
-            characters.append(
-                Character(
-                    int(char_id_str),
-                    data.get("nickname"),
-                    data.get("abilities", []),
-                    image_path=data.get("image")
-                )
-            )
-        return characters
+        return parseCharacters(charactersData)
 
     def readGameFile(self, fileName="storia.json", show_intro=True):
-        scelteData, charactersData, intros = self.fileManager.loadFile(fileName)
-        self.session = GameSession(
-            self.parseScelteData(scelteData, intros),
-            self.parseCharactersData(charactersData),
-        )
+        # La collezione è condivisa tra le partite, i personaggi vengono copiati dal modello
+        collection, characters = StoryCache().load(fileName, self.fileManager)
+        if fileName != self.storyFile:
+            self.storyFile, self.solutions = fileName, None
+        self.storyCharacters = characters
+        self.buildHints(collection, characters)
+        self.session = GameSession(collection, [character.clone() for character in characters])
         self.iterator = iter(self.session.scelteCollection)
         if show_intro:
             self.showLevelIntro(1)
+        self.history.reset(self.session.snapshot())
 
     # =====================
     # MENU
     # =====================
-    def showMainMenu(self):
-        self.view.setScene("MENU")
+    def showMainMenu(self, prepared=None):
+        if not self.showPrepared(prepared, "MENU"):
+            self.view.setScene("MENU")
+            self.view.setSceneObjects(self.buildMainMenuObjects())
         self.play_menu_music()
 
+    def buildMainMenuObjects(self):
         title = Text((-1, 80), "The Adventures of Lulucia", (255, 255, 0), font_size=FONT_SIZE_TITLE, is_title=True)
 
         btn_new = Button((250, 220), (300, 60), "New Game", icon_path="assets/icons/play.png", icon_size=48)
@@ -117,7 +206,7 @@ class MainController:
         btn_vol = self.make_volume_button(position=(250, 380))
         btn_end = Button((250, 460), (300, 60), "Endings Gallery", action_id="INFO_ENDINGS")
 
-        self.view.setSceneObjects([title, btn_new, btn_load, btn_vol, btn_end])
+        return [title, btn_new, btn_load, btn_vol, btn_end]
 
     def showLoadMenu(self):
         prev_scene = self.view.current_scene
@@ -139,6 +228,9 @@ class MainController:
             name = self.save_data.get(slot_key, {}).get("name", "Empty Slot")
             btn = Button(positions[i-1], (300, 60), f"Slot {i}: {name}", action_id=f"LOAD_SLOT_{i}")
             objects.append(btn)
+
+        if self.autosave.latest is not None or os.path.exists(AUTOSAVE_FILE):
+            objects.append(Button((250, 420), (300, 60), "Autosave", action_id="LOAD_AUTOSAVE"))
             
         self.view.setSceneObjects(objects)
 
@@ -150,9 +242,12 @@ class MainController:
                     return val
         return None
 
-    def showInfoMenu(self):
-        self.view.setScene("INFO")
+    def showInfoMenu(self, prepared=None):
+        if not self.showPrepared(prepared, "INFO"):
+            self.view.setScene("INFO")
+            self.view.setSceneObjects(self.buildInfoObjects())
 
+    def buildInfoObjects(self):
         players = self._get_players_list()
         p1_name, p1_abilities = "P1", "None"
         p2_name, p2_abilities = "P2", "None"
@@ -177,16 +272,51 @@ class MainController:
         p2_stats = MultiLineText((-1, 150), f"{p2_name}: {p2_abilities}", 600, (255, 255, 255), font_size=FONT_SIZE_NORMAL)
 
         # Buttons
-        btn_endings = Button((250, 220), (300, 50), "Endings", action_id="INFO_ENDINGS")
-        btn_save = Button((250, 280), (300, 50), "Save game", action_id="INFO_SAVE")
-        btn_load = Button((250, 340), (300, 50), "Load game", action_id="INFO_LOAD")
-        btn_vol  = self.make_volume_button(position=(250, 400), size=(300, 50))
-        btn_main_menu = Button((250, 460), (300, 50), "Main Menu", action_id="GO_MAIN_MENU")
+        btn_endings = Button((250, 200), (300, 50), "Endings", action_id="INFO_ENDINGS")
+        btn_hint = Button((250, 255), (300, 50), "Hint", action_id="INFO_HINT")
+        btn_save = Button((250, 310), (300, 50), "Save game", action_id="INFO_SAVE")
+        btn_load = Button((250, 365), (300, 50), "Load game", action_id="INFO_LOAD")
+        btn_vol  = self.make_volume_button(position=(250, 420), size=(300, 50))
+        btn_main_menu = Button((250, 475), (300, 50), "Main Menu", action_id="GO_MAIN_MENU")
+
+        return [
+            title, p1_stats, p2_stats, back_arrow,
+            btn_endings, btn_hint, btn_save, btn_load, btn_vol, btn_main_menu
+        ]
 
-        self.view.setSceneObjects([
-            title, back_arrow, p1_stats, p2_stats, 
-            btn_endings, btn_save, btn_load, btn_vol, btn_main_menu
-        ])
+    # =====================
+    # SUGGERIMENTI
+    # =====================
+    def buildHints(self, collection, characters):
+        # L'indice si costruisce una volta per storia caricata: al click basta una ricerca nel dizionario
+        if self.hints is None or self.hints.collection is not collection:
+            self.hints = ReachabilityIndex.fromCollection(collection, characters)
+
+    def getHint(self):
+        scelta = self.session.scelteCollection.__getScelta__(self.session.currentSceltaId)
+        if scelta.is_end:
+            return "You reached an ending: start a new adventure to look for the others."
+
+        self.buildHints(self.session.scelteCollection, self.storyCharacters)
+        unlocked = set(self.save_data.get("unlocked_endings", []))
+        left, right = self.hints.endingsBySide(scelta.key, [c.abilities for c in self.session.characters])
+        left = [key for key in left if key not in unlocked]
+        right = [key for key in right if key not in unlocked]
+
+        if left and right:
+            return "Both choices can still lead to endings you have not found yet."
+        if left:
+            return f'Choosing "{scelta.leftText}" can still lead to an ending you have not found yet.'
+        if right:
+            return f'Choosing "{scelta.rightText}" can still lead to an ending you have not found yet.'
+        return "Neither choice leads to an ending you have not found yet. Try a different path next time!"
+
+    def showHint(self):
+        self.view.setScene("HINT")
+        title = Text((-1, 40), "HINT", (255, 255, 255), font_size=FONT_SIZE_TITLE, is_title=False)
+        back_arrow = Button((20, 20), (45, 45), text="", icon_path="assets/icons/back.png", icon_size=35, action_id="INFO_MENU")
+        hint = MultiLineText((-1, 200), self.getHint(), 600, (255, 255, 255), font_size=FONT_SIZE_NORMAL)
+        self.view.setSceneObjects([title, back_arrow, hint])
 
     def showSaveSlots(self):
         prev_scene = self.view.current_scene
@@ -247,6 +377,7 @@ class MainController:
         
         self.save_data[str(self.selected_slot)] = save_entry
         self.fileManager.saveFile("saves.json", self.save_data)
+        self.eventLog.save(self.selected_slot, self.temp_name)
         self.is_saved = True
         
         if self.quit_after_save:
@@ -259,17 +390,24 @@ class MainController:
         slot_key = str(slot)
         if slot_key not in self.save_data:
             return
-            
-        data = self.save_data[slot_key]
-        self.readGameFile(show_intro=False)
-        
-        self.session.currentSceltaId = data["node"]
-        scelta = self.session.scelteCollection.__getScelta__(data["node"])
-        self.session.last_viewed_level = scelta.level
-        self.session.currentPlayerId = data["turn"]
-        self.session.characters[0].abilities = data["p1_abilities"]
-        self.session.characters[1].abilities = data["p2_abilities"]
-        
+        self.restoreSaveEntry(self.save_data[slot_key])
+
+    def loadAutosave(self):
+        # L'ultima fotografia di questa esecuzione potrebbe non essere ancora su disco
+        data = self.autosave.latestEntry() or self.fileManager.loadSaves(AUTOSAVE_FILE)
+        if data:
+            self.restoreSaveEntry(data)
+
+    def restoreSaveEntry(self, data):
+        # La storia è già in memoria dopo la prima partita: basta scambiare lo stato
+        if self.session is None:
+            self.readGameFile(show_intro=False)
+        snapshot = SessionSnapshot.fromSaveEntry(data, self.session.scelteCollection)
+        self.session.restore(snapshot)
+        self.history.reset(snapshot)
+        self.eventLog.load(snapshot)
+        if self.iterator is None:
+            self.iterator = iter(self.session.scelteCollection)
         self.iterator._position = data["node"]
         
         self.is_saved = True
@@ -288,6 +426,10 @@ class MainController:
 
         if self.session is None:
             self.readGameFile()
+        if self.solutions is None:
+            # Percorsi più brevi verso i finali, in cache per contenuto del file di storia
+            self.solutions = solveStory(self.session.scelteCollection, self.storyCharacters,
+                                        self.fileManager.hashFile(self.storyFile), fileManager=self.fileManager)
         
         title = Text((-1, 40), "ENDINGS GALLERY", font_size=FONT_SIZE_TITLE, is_title=False)
         objects = [title]
@@ -329,6 +471,8 @@ class MainController:
                 else:
                     color = (100, 100, 100)
                     display_text = "• ???????????????"
+                    if end_node.key in self.solutions:
+                        display_text += f"  ({len(self.solutions[end_node.key])} choices)"
                 obj = Text((80, y_offset), display_text, color, font_size=FONT_SIZE_NORMAL)
                 objects.append(obj)
             y_offset += 42
@@ -344,18 +488,22 @@ class MainController:
 
         self.view.setSceneObjects(objects)
 
-    def showLevelIntro(self, level):
-        self.view.setScene("LEVEL_INTRO")
+    def showLevelIntro(self, level, prepared=None):
+        if not self.showPrepared(prepared, "LEVEL_INTRO"):
+            self.view.setScene("LEVEL_INTRO")
+            self.view.setSceneObjects(self.buildLevelIntroObjects(level))
+        self.session.last_viewed_level = level
+
+    def buildLevelIntroObjects(self, level):
         intro_text = self.session.scelteCollection.level_introductions.get(str(level), "Your journey continues...")
         
-        bg_modal = Button((100, 80), (600, 420), text="", color=(30, 30, 30), hover_color=(30, 30, 30))
+        bg_modal = Panel((100, 80), (600, 420), color=(30, 30, 30))
         
         title = Text((-1, 150), f"LEVEL {level}", font_size=FONT_SIZE_TITLE, is_title=False)
-        desc = MultiLineText((-1, 230), intro_text, 500, font_size=FONT_SIZE_NORMAL)
+        desc = MultiLineText((-1, 230), intro_text, 500, font_size=FONT_SIZE_NORMAL, reveal_speed=REVEAL_SPEED)
         btn_continue = Button((250, 430), (300, 60), "Continue", action_id="LEVEL_CONTINUE")
         
-        self.view.setSceneObjects([bg_modal, title, desc, btn_continue])
-        self.session.last_viewed_level = level
+        return [bg_modal, title, desc, btn_continue]
 
     def showExitConfirm(self):
         self.view.setScene("EXIT_CONFIRM")
@@ -372,17 +520,30 @@ class MainController:
     # =====================
     # GIOCO
     # =====================
-    def updateView(self):
+    def showGame(self):
+        '''Torna alla scena di gioco, usando quella preparata se c'è'''
+        prepared = self.takePrepared("GAME")
+        if prepared is None:
+            self.view.setScene("GAME")
+        self.updateView(prepared)
+
+    def updateView(self, prepared=None, transition=False):
+        # Una scelta sfuma sempre sul nodo nuovo, che la scena fosse già pronta o no
+        if not self.showPrepared(prepared, "GAME"):
+            if transition:
+                self.view.startTransition()
+            self.view.setSceneObjects(self.buildGameObjects())
+
+    def buildGameObjects(self, rewindable=None):
         current = self.session.currentSceltaId
         scelta = self.session.scelteCollection.__getScelta__(current)
         player = self.session.getCurrentPlayer()
 
         abilities_str = ", ".join(item.replace("_", " ") for item in player.abilities) if player.abilities else "None"
         
+        # Prima gli oggetti statici, che finiscono nello strato in cache, poi il testo che si rivela
         objects = [
             Text((50, 20), f"Level: {scelta.level}", (200, 200, 0), font_size=FONT_SIZE_BUTTON),
-            MultiLineText((50, 80), scelta.text, 700, font_size=FONT_SIZE_NORMAL),
-            
             Text((150, 20), f"Turn: {player.nickname}", (200, 200, 0), font_size=FONT_SIZE_BUTTON),
             MultiLineText((350, 20), f"Abilities: {abilities_str}", 700, (200, 200, 0), font_size=FONT_SIZE_BUTTON),
         ]
@@ -396,6 +557,8 @@ class MainController:
             except Exception as e:
                 print(f"[View] Errore nel caricamento dell'immagine del personaggio {player.id}: {e}")
 
+        objects.append(MultiLineText((50, 80), scelta.text, 700, font_size=FONT_SIZE_NORMAL, reveal_speed=REVEAL_SPEED))
+
         if scelta.leftText:
             objects.append(Button((50, 420), (320, 80), scelta.leftText, action_id="CHOICE_LEFT"))
         if scelta.rightText:
@@ -403,6 +566,8 @@ class MainController:
             if btn_text.lower() in ("exit", "quit"):
                 btn_text = "Main Menu"
             objects.append(Button((430, 420), (320, 80), btn_text, action_id="CHOICE_RIGHT"))
+        if (self.history.steps > 0 if rewindable is None else rewindable):
+            objects.append(Button((325, 520), (150, 50), "Rewind", icon_path="assets/icons/back.png", icon_size=28, action_id="REWIND"))
 
         objects.append(
             Button(
@@ -413,41 +578,35 @@ class MainController:
                 action_id="INFO_MENU",
             )
         )
-
-        self.view.setSceneObjects(objects)
+        return objects
 
     def nextScelta(self, direction):
-        self.iterator._position = self.session.currentSceltaId
-        player = self.session.getCurrentPlayer()
+        if not self.history:
+            self.history.reset(self.session.snapshot())
+        prepared = self.takePrepared(direction)
         scelta = self.session.scelteCollection.__getScelta__(self.session.currentSceltaId)
-
-        if direction == "left":
-            if scelta.leftObjects:
-                player.updateAbilities(scelta.leftObjects)
-            next_s = self.iterator.getLeft(player.abilities)
-        else:
-            if scelta.rightObjects:
-                player.updateAbilities(scelta.rightObjects)
-            next_s = self.iterator.getRight(player.abilities)
+        next_s = self.session.choose(direction, self.iterator)
+        self.eventLog.choice(direction, scelta, next_s.key)
 
         if next_s.key == "EXIT":
-            self.showMainMenu()
+            self.showMainMenu(prepared)
             return
 
-        # Check for new level (or restart of Level 1)
+        self.is_saved = False # Segniamo come non salvato al momento di prendere una decisione
+
         # Se il livello cambia o se si torna al livello 1 venendo da un livello superiore (riavvio)
-        if next_s.level > self.session.last_viewed_level or (next_s.level == 1 and self.session.last_viewed_level > 1):
-            self.session.updateCurrentScelta(next_s.key)
-            self.session.switchTurn(forced_turn=next_s.turn)
-            self.is_saved = False
-            self.showLevelIntro(next_s.level)
+        show_intro = self.session.needsLevelIntro(next_s)
+        if show_intro:
+            self.showLevelIntro(next_s.level, prepared)
+
+        # La fotografia condivide con la precedente le abilità non cambiate: serve sia per tornare indietro
+        # sia al salvataggio automatico, che la scrive sul suo thread
+        snapshot = self.session.snapshot(self.history.latest())
+        self.history.push(snapshot)
+        self.autosave.submit(snapshot)
+        if show_intro:
             return
 
-        self.session.updateCurrentScelta(next_s.key)
-        # Applichiamo il turno indicato dal nuovo nodo
-        self.session.switchTurn(forced_turn=next_s.turn)
-        self.is_saved = False # Segniamo come non salvato al momento di prendere una decisione
-        
         # Se è un finale, lo salviamo nella lista globale dei sbloccati
         if next_s.is_end:
             self.save_data = self.fileManager.loadSaves()
@@ -457,13 +616,31 @@ class MainController:
                 self.save_data["unlocked_endings"].append(next_s.key)
                 self.fileManager.saveFile("saves.json", self.save_data)
 
+        self.updateView(prepared, transition=True)
+
+    def rewind(self, steps=1):
+        # Lo stato precedente è già in memoria: niente letture da disco né ricostruzione della storia
+        snapshot = self.history.rewind(steps)
+        if snapshot is None:
+            return
+        self.session.restore(snapshot)
+        self.iterator._position = snapshot.sceltaId
+        self.is_saved = False
+        self.eventLog.rewind(snapshot)
+        self.autosave.submit(snapshot)
+        self.view.setScene("GAME")
         self.updateView()
 
     # =====================
     # EVENTI
     # =====================
+    def updateMusic(self):
+        # La musica segue scena e livello; i brani arrivano già decodificati dal thread audio
+        self.audio.update_music(self.view.current_scene, self.session.last_viewed_level if self.session else None)
+
     def handleEvents(self):
-        for event in pygame.event.get():
+        events, self.pendingEvents = self.pendingEvents + pygame.event.get(), []
+        for event in events:
             if event.type == pygame.QUIT:
                 if not self.is_saved and self.view.current_scene in ("GAME", "INFO"):
                     self.showExitConfirm()
@@ -471,6 +648,10 @@ class MainController:
                     self.running = False
 
             if event.type == pygame.KEYDOWN:
+                # Un tasto qualsiasi completa il testo che si sta rivelando
+                if self.view.current_scene in ("GAME", "LEVEL_INTRO") and self.view.skipReveal():
+                    continue
+
                 if self.view.current_scene == "NAMING":
                     if event.key == pygame.K_RETURN:
                         if self.temp_name.strip():
@@ -484,10 +665,11 @@ class MainController:
                             self.showNamingScreen()
 
                 elif event.key == pygame.K_i and self.view.current_scene == "GAME":
-                    self.showInfoMenu()
+                    self.showInfoMenu(self.takePrepared("INFO"))
                 elif event.key == pygame.K_i and self.view.current_scene == "INFO":
-                    self.view.setScene("GAME")
-                    self.updateView()
+                    self.showGame()
+                elif event.key == pygame.K_BACKSPACE and self.view.current_scene == "GAME":
+                    self.rewind()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 clicks = self.view.checkClick(event.pos)
@@ -501,16 +683,15 @@ class MainController:
                             continue
 
                         if action == "INFO_MENU":
-                            self.showInfoMenu()
+                            self.showInfoMenu(self.takePrepared("INFO"))
                             continue
 
                         if action == "INFO_BACK":
-                            self.view.setScene("GAME")
-                            self.updateView()
+                            self.showGame()
                             continue
 
                         if action == "GO_MAIN_MENU":
-                            self.showMainMenu()
+                            self.showMainMenu(self.takePrepared("MENU"))
                             continue
 
                         if action == "CHOICE_LEFT":
@@ -521,10 +702,18 @@ class MainController:
                             self.nextScelta("right")
                             continue
 
+                        if action == "REWIND":
+                            self.rewind()
+                            continue
+
                         if action == "INFO_ENDINGS":
                             self.showEndingsMenu()
                             continue
 
+                        if action == "INFO_HINT":
+                            self.showHint()
+                            continue
+
                         if action == "GALLERY_NEXT":
                             self.gallery_page += 1
                             self.showEndingsMenu()
@@ -569,9 +758,12 @@ class MainController:
                             self.loadGame(slot)
                             continue
 
+                        if action == "LOAD_AUTOSAVE":
+                            self.loadAutosave()
+                            continue
+
                         if action == "LEVEL_CONTINUE":
-                            self.view.setScene("GAME")
-                            self.updateView()
+                            self.showGame()
                             continue
 
                         if action == "EXIT_YES":
@@ -604,6 +796,7 @@ class MainController:
                     if self.view.current_scene == "MENU":
                         if "New Game" in msg:
                             self.readGameFile()
+                            self.eventLog.start(self.session)
                             self.is_saved = True # La nuova partita inizia come "salvata" (senza modifiche)
                             self.view.setScene("GAME")
                             self.updateView()
@@ -629,13 +822,30 @@ class MainController:
     def gameLoop(self):
         self.view.initScreen()
         self.running = True
+        self.audio.set_music(self.fileManager.loadMusic(self.storyFile))
         self.showMainMenu()
 
         clock = pygame.time.Clock()
+        drawn = False
         while self.running:
+            if drawn and not self.view.isAnimating():
+                # Nessuna animazione: il tempo libero serve a preparare le prossime scene,
+                # poi si attende il prossimo evento invece di ridisegnare la stessa scena
+                event = pygame.event.poll() if self.prepareScenes() else pygame.event.wait(IDLE_WAIT_MS)
+                if event.type == pygame.NOEVENT:
+                    self.updateMusic()
+                    continue
+                self.pendingEvents.append(event)
             self.handleEvents()
+            self.updateMusic()
             self.view.render()
+            drawn = True
+            stats = self.frameStats.tick()
+            if stats and self.showStats:
+                print(f"[Loop] {stats[0]:.1f} fps, CPU {stats[1]:.1f}%")
             clock.tick(60)
 
+        self.autosave.close(timeout=2.0)
+        self.eventLog.close(timeout=2.0)
         pygame.quit()
         sys.exit()
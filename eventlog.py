@@ -0,0 +1,299 @@
+from __future__ import annotations
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from model import Character, FileManager, GameSession, Scelta, ScelteCollection, SessionSnapshot, StoryCache
+from compiled import CompiledStory, EXIT_ID, MISSING_ID, STUCK_ID, SIDES
+
+# Registro degli eventi: una riga JSON compatta per evento, solo in coda
+#   ["S", nodo, turno, abilità, livello]   nuova partita (stato iniziale completo)
+#   ["L", nodo, turno, abilità, livello]   partita caricata (stato completo)
+#   ["R", nodo, turno, abilità, livello]   scelte annullate: si torna allo stato indicato
+#   ["C", lato, nodo raggiunto, oggetti?]  scelta: 0 sinistra, 1 destra; gli oggetti ottenuti solo se ci sono
+#   ["W", slot, nome]                      salvataggio nello slot indicato
+# "abilità" è una lista di liste, una per personaggio. Ogni S, L o R apre un nuovo tratto da rigiocare.
+EVENT_START = "S"
+EVENT_LOAD = "L"
+EVENT_CHOICE = "C"
+EVENT_SAVE = "W"
+EVENT_REWIND = "R"
+STATE_EVENTS = (EVENT_START, EVENT_LOAD, EVENT_REWIND)
+
+# Ogni avvio del gioco scrive un proprio registro nella cartella; si tengono solo gli ultimi LOG_RUNS
+LOG_DIR = "logs"
+LOG_RUNS = 20
+
+def newLogFile(directory: str = LOG_DIR, keep: int = LOG_RUNS) -> str:
+    '''Percorso del registro di questo avvio; i registri più vecchi oltre keep vengono cancellati'''
+    old = logFiles(directory)
+    for name in old[:max(len(old) - keep + 1, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+    return os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.log")
+
+def logFiles(directory: str = LOG_DIR) -> list[str]:
+    '''Registri della cartella, dal più vecchio (i nomi iniziano con data e ora)'''
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+
+class EventLog:
+    ''' Registro append-only delle azioni di una sessione; gli eventi vengono scritti in coda al file da un thread separato '''
+    def __init__(self, fileName: str = None, fileManager: FileManager = None, delay: float = 0.25):
+        self.fileName = fileName  # None: il registro resta solo in memoria
+        self.fileManager = fileManager or FileManager()
+        self.delay = delay        # attesa prima di scrivere, per raccogliere gli eventi ravvicinati in una scrittura
+        self.events = []
+        self.writes = 0
+        self._pending = []        # righe non ancora su disco
+        self._writing = False
+        self._flushing = 0
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def start(self, session: GameSession):
+        self._append([EVENT_START, *self._state(session.snapshot())])
+
+    def load(self, snapshot: SessionSnapshot):
+        self._append([EVENT_LOAD, *self._state(snapshot)])
+
+    def rewind(self, snapshot: SessionSnapshot):
+        self._append([EVENT_REWIND, *self._state(snapshot)])
+
+    def choice(self, direction: str, scelta: Scelta, nextKey: str):
+        '''scelta è il nodo da cui si parte: i suoi oggetti del lato scelto vanno al giocatore di turno'''
+        objects = scelta.leftObjects if direction == "left" else scelta.rightObjects
+        event = [EVENT_CHOICE, SIDES[direction], nextKey]
+        if objects:
+            event.append(list(objects))
+        self._append(event)
+
+    def save(self, slot, name: str):
+        self._append([EVENT_SAVE, str(slot), name])
+
+    def _state(self, snapshot: SessionSnapshot) -> list:
+        return [snapshot.sceltaId, snapshot.playerId, [list(abilities) for abilities in snapshot.abilities], snapshot.lastViewedLevel]
+
+    def _append(self, event: list):
+        self.events.append(event)
+        if self.fileName is None:
+            return
+        # Non blocca il thread della UI: la riga viene scritta insieme alle altre in attesa
+        with self._cond:
+            if self._closed:
+                return
+            self._pending.append(json.dumps(event, separators=(",", ":")))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="eventlog", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.delay
+                while not self._closed and not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                lines, self._pending = self._pending, []
+                self._writing = True
+            try:
+                # La cartella dei registri nasce con il primo evento, non a ogni avvio
+                os.makedirs(os.path.dirname(self.fileName) or ".", exist_ok=True)
+                self.fileManager.appendLines(self.fileName, lines)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self.writes += 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        '''Attende che gli eventi registrati siano su disco; False se il timeout scade prima'''
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout: float = None):
+        '''Scrive ciò che resta in attesa e ferma il thread'''
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+def readEvents(fileName: str) -> list[list]:
+    '''Legge un registro; un'ultima riga troncata (scrittura interrotta) viene ignorata'''
+    events = []
+    if not os.path.exists(fileName):
+        return events
+    with open(fileName, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return events
+
+def splitSessions(events: list[list]) -> list[list[list]]:
+    '''Divide il registro in tratti che iniziano con uno stato completo (S, L o R); gli eventi prima del primo vengono scartati'''
+    sessions = []
+    for event in events:
+        if event[0] in STATE_EVENTS:
+            sessions.append([event])
+        elif sessions:
+            sessions[-1].append(event)
+    return sessions
+
+@dataclass(frozen=True)
+class Divergence:
+    ''' Primo punto di un tratto in cui la storia non si comporta come registrato '''
+    session: int   # indice del tratto (vedi splitSessions)
+    index: int     # indice dell'evento nel tratto (nel registro completo per replay)
+    recorded: str  # nodo registrato (o oggetti, per reason == "objects")
+    replayed: str  # nodo calcolato con la storia attuale
+    reason: str    # "node", "objects", "missing" (nodo di partenza assente), "stuck" (nessuna opzione)
+
+class ReplayError(ValueError):
+    def __init__(self, divergence: Divergence):
+        super().__init__(f"Replay diverges at event {divergence.index} ({divergence.reason}): recorded {divergence.recorded}, story gives {divergence.replayed}")
+        self.divergence = divergence
+
+class ReplayEngine:
+    ''' Rigioca i registri sulle tabelle compilate della storia: inventari come maschere di bit, liste solo quando cambiano '''
+    def __init__(self, collection: ScelteCollection):
+        self.collection = collection
+        self.story = story = CompiledStory.fromCollection(collection)
+        self.keys = list(collection._collection)
+        self.ids = {key: i for i, key in enumerate(self.keys)}
+        self.ids["EXIT"] = EXIT_ID
+        # Oggetti di ogni (nodo, lato) nell'ordine della storia, come li aggiunge Character.updateAbilities
+        self.grants = []
+        for scelta in collection._collection.values():
+            self.grants.append(list(scelta.leftObjects))
+            self.grants.append(list(scelta.rightObjects))
+        # Tabelle compilate copiate in liste Python: nel ciclo di replay l'accesso è più rapido che su array
+        self.grantMask = list(story.grant)
+        self.turnOf = list(story.turn)
+        self.levelOf = list(story.level)
+        self.options = []
+        self.direct = []  # destinazione della prima opzione se non ha requisiti, altrimenti None
+        for slot in range(2 * story.nodeCount):
+            options = tuple(zip(story.optMask[story.optStart[slot]:story.optStart[slot + 1]], story.optNext[story.optStart[slot]:story.optStart[slot + 1]]))
+            self.options.append(options)
+            self.direct.append(options[0][1] if options and options[0][0] == 0 else None if options else STUCK_ID)
+
+    @classmethod
+    def fromStoryFile(cls, fileName: str = "storia.json", fileManager: FileManager = None) -> ReplayEngine:
+        return cls(StoryCache().load(fileName, fileManager)[0])
+
+    def replay(self, events: list[list], upTo: int = None) -> SessionSnapshot:
+        '''Stato dopo i primi upTo eventi (tutti se None); solleva ReplayError se la storia non segue il registro'''
+        events = events if upTo is None else events[:upTo]
+        start = max((i for i, event in enumerate(events) if event[0] in STATE_EVENTS), default=None)
+        if start is None:
+            raise ValueError("The log has no start or load event")
+        snapshot, divergence = self._run(events[start:], 0, start)
+        if divergence is not None:
+            raise ReplayError(divergence)
+        return snapshot
+
+    def rebuild(self, events: list[list], upTo: int = None, characters: list[Character] = None) -> GameSession:
+        '''GameSession pronta a continuare dallo stato ricostruito; characters fornisce nomi e immagini dei personaggi'''
+        snapshot = self.replay(events, upTo)
+        if characters:
+            characters = [character.clone() for character in characters]
+        else:
+            characters = [Character(i) for i in range(len(snapshot.abilities))]
+        session = GameSession(self.collection, characters)
+        session.restore(snapshot)
+        return session
+
+    def validate(self, events: list[list]) -> list[Divergence]:
+        '''Rigioca ogni tratto del registro e restituisce il primo punto di divergenza di ciascuno'''
+        divergences = []
+        for i, session in enumerate(splitSessions(events)):
+            divergence = self._run(session, i)[1]
+            if divergence is not None:
+                divergences.append(divergence)
+        return divergences
+
+    def _run(self, events: list[list], session: int, offset: int = 0) -> tuple[SessionSnapshot, Divergence]:
+        ids, keys, grants, grantMask = self.ids, self.keys, self.grants, self.grantMask
+        direct, options, turnOf, levelOf = self.direct, self.options, self.turnOf, self.levelOf
+        _, key, turn, abilities, lastViewed = events[0]
+        node = ids.get(key)
+        if node is None or node < 0:
+            return None, Divergence(session, offset, key, "<missing>", "missing")
+        abilities = [list(items) for items in abilities]
+        masks = [self.story.itemMask(items) for items in abilities]
+
+        for index, event in enumerate(events):
+            if event[0] != EVENT_CHOICE:
+                continue
+            slot = node * 2 + event[1]
+            objects = grants[slot]
+            if len(event) > 3 or objects:
+                recordedObjects = event[3] if len(event) > 3 else []
+                if objects != recordedObjects:
+                    return None, Divergence(session, offset + index, ",".join(recordedObjects), ",".join(objects), "objects")
+                # Il giocatore di turno ottiene gli oggetti prima che si valutino i requisiti
+                grant = grantMask[slot]
+                if grant & ~masks[turn]:
+                    abilities[turn] = abilities[turn] + objects
+                    masks[turn] |= grant
+            following = direct[slot]
+            if following is None:
+                # Prima opzione i cui requisiti sono contenuti nell'inventario, come in getLeft/getRight
+                inventory, following = masks[turn], STUCK_ID
+                for required, target in options[slot]:
+                    if required & inventory == required:
+                        following = target
+                        break
+            if following != ids.get(event[2]):
+                return None, Divergence(session, offset + index, event[2], self._name(following), "stuck" if following == STUCK_ID else "node")
+            if following >= 0:
+                node, turn = following, turnOf[following]
+                # Come nel controller: l'introduzione di un nuovo livello (o del ritorno al primo) viene mostrata
+                level = levelOf[following]
+                if level > lastViewed or (level == 1 and lastViewed > 1):
+                    lastViewed = level
+
+        return SessionSnapshot(keys[node], turn, tuple(tuple(items) for items in abilities), lastViewed), None
+
+    def _name(self, node: int) -> str:
+        return "EXIT" if node == EXIT_ID else "<missing>" if node == MISSING_ID else "<stuck>" if node == STUCK_ID else self.keys[node]
+
+def validateLog(logFile: str, storyFile: str = "storia.json") -> list[Divergence]:
+    return ReplayEngine.fromStoryFile(storyFile).validate(readEvents(logFile))
+
+if __name__ == "__main__":
+    # Uso: python eventlog.py [registro] [storia]; senza registro si usa l'ultimo della cartella LOG_DIR
+    if len(sys.argv) > 1:
+        logFile = sys.argv[1]
+    elif logFiles():
+        logFile = os.path.join(LOG_DIR, logFiles()[-1])
+    else:
+        sys.exit(f"No event logs in {LOG_DIR}/")
+    storyFile = sys.argv[2] if len(sys.argv) > 2 else "storia.json"
+    events = readEvents(logFile)
+    divergences = ReplayEngine.fromStoryFile(storyFile).validate(events)
+    print(f"{len(splitSessions(events))} sessions, {len(events)} events, {len(divergences)} diverging")
+    for d in divergences:
+        print(f"[Replay] session {d.session} event {d.index} {d.reason}: recorded {d.recorded}, story gives {d.replayed}")
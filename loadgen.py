@@ -0,0 +1,86 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# Generatore di carico locale per server.py: molti client in parallelo, ognuno
+# invia una richiesta alla volta e misura il tempo fino alla risposta.
+
+async def runClient(connect, requests: int, latencies: list[float], seed: int):
+    rng = random.Random(seed)
+    reader, writer = await connect()
+
+    async def call(request: dict) -> dict:
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        return response
+
+    await call({"cmd": "new"})
+    for _ in range(requests - 1):
+        response = await call({"cmd": "choose", "dir": rng.choice(("left", "right"))})
+        if not response["ok"]:
+            await call({"cmd": "new"})
+    writer.close()
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+async def run(args, connect) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(runClient(connect, args.requests, latencies, i) for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": args.clients,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to a Unix socket")
+    parser.add_argument("--spawn", action="store_true", help="start a local server.py on a temporary Unix socket")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        args.unix = os.path.join(tempfile.mkdtemp(), "lulucia.sock")
+        # Profili in memoria: si misura il server, non il disco
+        server = subprocess.Popen([sys.executable, "server.py", "--unix", args.unix, "--saves", ""],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.PIPE, text=True)
+        server.stdout.readline()  # "[Server] listening on ..."
+
+    if args.unix:
+        connect = lambda: asyncio.open_unix_connection(args.unix, limit=1 << 20)
+    else:
+        connect = lambda: asyncio.open_connection(args.host, args.port, limit=1 << 20)
+    try:
+        stats = asyncio.run(run(args, connect))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{stats['clients']} clients, {stats['requests']} requests in {stats['seconds']:.2f}s")
+    print(f"throughput {stats['throughput']:.0f} req/s   p50 {stats['p50_ms']:.2f} ms   p99 {stats['p99_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
-from controller import *
+import sys
+from validator import validateStoryFile
 
 if __name__ == "__main__":
-    app = MainController()
-    app.gameLoop()
\ No newline at end of file
+    # La validazione non richiede pygame: il controller (e quindi pygame) si importa solo per giocare
+    for issue in validateStoryFile("storia.json"):
+        print(f"[Story] {issue.kind} {issue.key}: {issue.message}")
+
+    # --window=1920x1080 scala la scena in una finestra di quelle dimensioni, --fullscreen a tutto schermo
+    window = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--window=")), None)
+    windowSize = tuple(int(v) for v in window.lower().split("x")) if window else None
+
+    from controller import MainController
+    app = MainController(compactSaves="--compact-saves" in sys.argv, windowSize=windowSize, fullscreen="--fullscreen" in sys.argv,
+                         showStats="--stats" in sys.argv)
+    app.gameLoop()
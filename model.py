@@ -1,9 +1,15 @@
 from __future__ import annotations
+from collections import OrderedDict, deque
 from collections.abc import Iterable, Iterator
 from typing import Any
 from dataclasses import dataclass
+import hashlib
 import json
 import os
+import shutil
+import tempfile
+import threading
+import time
 
 @dataclass
 class Scelta:
@@ -21,36 +27,79 @@ class Scelta:
     level:        int = 1                      # Livello a cui appartiene il nodo
     ending_title: str = None                   # Titolo del finale (se is_end è True)
 
+class TransitionCache:
+    ''' Cache LRU limitata delle transizioni (nodo, direzione, inventario) -> chiave successiva '''
+    def __init__(self, maxSize: int = 4096):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.generation = None  # generazione della collezione a cui si riferiscono le voci
+        self._entries = OrderedDict()
+    def get(self, key: tuple) -> str | None:
+        next_key = self._entries.get(key)
+        if next_key is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return next_key
+    def put(self, key: tuple, next_key: str):
+        self._entries[key] = next_key
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+    def invalidate(self):
+        self._entries.clear()
+    def hitRate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    def __len__(self) -> int:
+        return len(self._entries)
+
 class ScelteIterator(Iterator):
     ''' Iteratore per la collezione di scelte '''
     _position: str = "0"
     _reverse: bool = False
-    def __init__(self, collection: ScelteCollection):
+    def __init__(self, collection: ScelteCollection, cache: TransitionCache = None):
         self._collection = collection
         self._reverse =    False
         self._position =   "0"
+        self._cache =      cache if cache is not None else getattr(collection, "transitionCache", None)
+    def resolve(self, side: str, objects: list[str], position: str = None) -> str:
+        '''Chiave della prima opzione soddisfatta dagli oggetti, senza spostare la posizione'''
+        position = self._position if position is None else position
+        next_key = None
+        if self._cache is not None:
+            if self._cache.generation != self._collection.generation:
+                self._cache.invalidate()
+                self._cache.generation = self._collection.generation
+            cache_key = (position, side, frozenset(objects))
+            next_key = self._cache.get(cache_key)
+        if next_key is None:
+            scelta = self._collection.__getScelta__(position)
+            options = scelta.nextLeft if side == "left" else scelta.nextRight
+            for required_objects, option_key in options:
+                if all(obj in objects for obj in required_objects):
+                    next_key = option_key
+                    break
+            if next_key is None:
+                raise ValueError(f"The no-objets path is not available for the {side} of Scelta key " + position)
+            if self._cache is not None:
+                self._cache.put(cache_key, next_key)
+        return next_key
+    def _move(self, side: str, objects: list[str]) -> Scelta:
+        '''Risolve la prima opzione soddisfatta dagli oggetti e sposta la posizione'''
+        next_key = self.resolve(side, objects)
+        self._position = next_key
+        if next_key == "EXIT":
+            return Scelta(key="EXIT", nextRight=[], nextLeft=[], text="", rightText="", leftText="", rightObjects=[], leftObjects=[])
+        return self._collection.__getScelta__(next_key)
     def getLeft(self, objects: list[str]) -> Scelta:
         '''Restituisce la scelta a sinistra'''
-        options = self._collection.__getScelta__(self._position).nextLeft
-        for option in options:
-            required_objects, next_key = option
-            if all(obj in objects for obj in required_objects):
-                self._position = next_key
-                if next_key == "EXIT":
-                    return Scelta(key="EXIT", nextRight=[], nextLeft=[], text="", rightText="", leftText="", rightObjects=[], leftObjects=[])
-                return self._collection.__getScelta__(next_key)
-        raise ValueError("The no-objets path is not available for the left of Scelta key " + self._position)
+        return self._move("left", objects)
     def getRight(self, objects: list[str]) -> Scelta:
         '''Restituisce la scelta a destra'''
-        options = self._collection.__getScelta__(self._position).nextRight
-        for option in options:
-            required_objects, next_key = option
-            if all(obj in objects for obj in required_objects):
-                self._position = next_key
-                if next_key == "EXIT":
-                    return Scelta(key="EXIT", nextRight=[], nextLeft=[], text="", rightText="", leftText="", rightObjects=[], leftObjects=[])
-                return self._collection.__getScelta__(next_key)
-        raise ValueError("The no-objets path is not available for the right of Scelta key " + self._position)
+        return self._move("right", objects)
     def hasMore(self) -> bool:
         '''Restituisce True se ci sono altre scelte da processare'''
         current_scelta = self._collection.__getScelta__(self._position)
@@ -65,14 +114,69 @@ class ScelteCollection(Iterable):
     def __init__(self, collection: dict[Scelta], level_introductions: dict[str, str] = None):
         self._collection = collection or {}
         self.level_introductions = level_introductions or {}
+        self.generation = 0          # incrementata a ogni ricaricamento
+        self.transitionCache = None  # cache condivisa dagli iteratori (opzionale)
+
+    def enableTransitionCache(self, maxSize: int = 4096) -> TransitionCache:
+        '''Attiva una cache delle transizioni condivisa da tutti i nuovi iteratori'''
+        self.transitionCache = TransitionCache(maxSize)
+        return self.transitionCache
+
+    def reload(self, collection: dict[Scelta], level_introductions: dict[str, str] = None):
+        '''Sostituisce il contenuto della collezione invalidando le transizioni in cache'''
+        self._collection = collection or {}
+        self.level_introductions = level_introductions or {}
+        self.generation += 1
+        if self.transitionCache is not None:
+            self.transitionCache.invalidate()
  
     def __getScelta__(self, key: str) -> Scelta:
         return self._collection[key]
+
+    def prefetch(self, keys) -> list[Scelta]:
+        '''Scelte dei nodi indicati (le chiavi sconosciute sono ignorate); qui sono già tutte in memoria'''
+        return [self._collection[key] for key in keys if key in self._collection]
     
     def __iter__(self) -> ScelteIterator:
         return ScelteIterator(self)
 
 
+def parseScelte(sceltaData: dict, intros: dict = None) -> ScelteCollection:
+    '''Costruisce la collezione di scelte a partire dai nodi del file di storia'''
+    scelte = {}
+    for key, data in sceltaData.items():
+        scelte[key] = Scelta(
+            key=key,
+            text=data.get("text", ""),
+            nextRight=data.get("nextRight", []),
+            nextLeft=data.get("nextLeft", []),
+            rightText=data.get("rightText", ""),
+            leftText=data.get("leftText", ""),
+            rightObjects=data.get("rightObjects", []),
+            leftObjects=data.get("leftObjects", []),
+            turn=data.get("turn", 0),
+            is_end=data.get("is_end", False),
+            level=data.get("level", 1),
+            ending_title=data.get("ending_title")
+        )
+    return ScelteCollection(scelte, intros)
+
+def parseCharacters(charactersData: dict) -> list[Character]:
+    '''Costruisce la lista dei personaggi a partire dal file di storia'''
+    characters = []
+    for char_id_str in charactersData:
+        data = charactersData[char_id_str]
+        characters.append(
+            Character(
+                int(char_id_str),
+                data.get("nickname"),
+                data.get("abilities", []),
+                image_path=data.get("image")
+            )
+        )
+    return characters
+
+
 # Singleton FileManager
 
 class SingletonMeta(type):
@@ -85,6 +189,19 @@ class SingletonMeta(type):
         return cls._instances[cls]
 
 class FileManager(metaclass=SingletonMeta):
+    def __init__(self):
+        self._codecs = {}  # nome file -> (codec dei salvataggi, se usarlo anche per scrivere)
+
+    def registerCodec(self, fileName: str, codec, write: bool = True):
+        '''Da qui in poi il file viene letto con codec.load e, se write, scritto con codec.encode'''
+        self._codecs[os.path.abspath(fileName)] = (codec, write)
+
+    def _codec(self, fileName: str, writing: bool = False):
+        if not self._codecs:
+            return None
+        codec, write = self._codecs.get(os.path.abspath(fileName), (None, False))
+        return codec if write or not writing else None
+
     def loadFile(self, fileName: str):
         try:
             with open(fileName, 'r', encoding='utf-8') as f:
@@ -98,22 +215,132 @@ class FileManager(metaclass=SingletonMeta):
         except json.JSONDecodeError:
             raise
 
+    def loadMusic(self, fileName: str) -> dict:
+        '''Sezione "music" del file di storia; {} se manca o il file non si può leggere'''
+        try:
+            with open(fileName, 'r', encoding='utf-8') as f:
+                music = json.load(f).get("music", {})
+            return music if isinstance(music, dict) else {}
+        except Exception:
+            return {}
+
     def saveFile(self, fileName: str, data: dict):
+        codec = self._codec(fileName, writing=True)
         try:
+            if codec is not None:
+                with open(fileName, 'wb') as f:
+                    f.write(codec.encode(data))
+                return
             with open(fileName, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=4)
         except Exception as e:
             print(f"Error saving file {fileName}: {e}")
 
+    def saveFileAtomic(self, fileName: str, data: dict):
+        '''Scrive su un file temporaneo nella stessa cartella e lo sostituisce all'originale: chi legge trova sempre un file completo'''
+        try:
+            fd, tmpName = tempfile.mkstemp(prefix=f".{os.path.basename(fileName)}.", dir=os.path.dirname(os.path.abspath(fileName)))
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmpName, fileName)
+            except BaseException:
+                os.unlink(tmpName)
+                raise
+        except Exception as e:
+            print(f"Error saving file {fileName}: {e}")
+
+    def appendLines(self, fileName: str, lines: list[str]):
+        '''Aggiunge righe in coda al file senza riscriverlo'''
+        try:
+            with open(fileName, 'a', encoding='utf-8') as f:
+                f.write("".join(line + "\n" for line in lines))
+        except Exception as e:
+            print(f"Error saving file {fileName}: {e}")
+
+    def hashFile(self, fileName: str) -> str:
+        '''Restituisce l'hash SHA-256 del contenuto del file'''
+        with open(fileName, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
     def loadSaves(self, fileName: str = "saves.json"):
         try:
             if not os.path.exists(fileName):
                 return {}
-            with open(fileName, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            codec = self._codec(fileName)
+            if codec is None:
+                try:
+                    with open(fileName, 'r', encoding='utf-8') as f:
+                        return json.load(f)
+                except ValueError as e:
+                    # Non è JSON (per esempio un salvataggio binario senza codec): lo si conserva prima che venga sovrascritto
+                    self._keepAside(fileName, e)
+                    return {}
+            with open(fileName, 'rb') as f:
+                raw = f.read()
+            try:
+                # Il codec riconosce da solo il formato binario e il vecchio JSON
+                return codec.load(raw)
+            except ValueError as e:
+                # Salvataggi di un'altra versione della storia: si mette da parte il file prima che venga sovrascritto
+                self._keepAside(fileName, e)
+                return {}
         except Exception:
             return {}
 
+    def _keepAside(self, fileName: str, error: Exception):
+        print(f"Error loading saves {fileName}: {error} (kept as {fileName}.bak)")
+        shutil.copyfile(fileName, f"{fileName}.bak")
+
+# StoryCache: storie già lette e analizzate, condivise da tutto il processo
+
+class StoryCache(metaclass=SingletonMeta):
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fileKey(self, fileName: str):
+        '''Identifica il contenuto del file tramite data di modifica e dimensione'''
+        try:
+            stat = os.stat(fileName)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, fileName: str):
+        '''Restituisce (collezione, personaggi modello) se il file non è cambiato, altrimenti None'''
+        path = os.path.abspath(fileName)
+        entry = self._entries.get(path)
+        if entry is None or entry[0] is None or entry[0] != self._fileKey(fileName):
+            return None
+        return entry[1], entry[2]
+
+    def put(self, fileName: str, collection: ScelteCollection, characters: list[Character]):
+        self._entries[os.path.abspath(fileName)] = (self._fileKey(fileName), collection, characters)
+
+    def load(self, fileName: str, fileManager: FileManager = None):
+        '''Restituisce la storia dalla cache, leggendola e analizzandola solo se necessario'''
+        cached = self.get(fileName)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        scelteData, charactersData, intros = (fileManager or FileManager()).loadFile(fileName)
+        collection = parseScelte(scelteData, intros)
+        characters = parseCharacters(charactersData)
+        self.put(fileName, collection, characters)
+        return collection, characters
+
+    def invalidate(self, fileName: str = None):
+        '''Dimentica un file o, senza argomenti, tutte le storie in cache'''
+        if fileName is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(os.path.abspath(fileName), None)
+
 # Character: rappresenta un personaggio del gioco
 
 class Character():
@@ -124,11 +351,156 @@ class Character():
         self.abilities = abilities
         self.image_path = image_path
     
+    def clone(self) -> Character:
+        '''Copia indipendente del personaggio (le abilità non vengono condivise)'''
+        return Character(self.id, self.nickname, list(self.abilities), self.image_path)
+
     def updateAbilities(self, newAbilities: list):
         for ability in newAbilities:
             if ability not in self.abilities:
                 self.abilities = self.abilities + newAbilities
 
+# SessionSnapshot: stato immutabile di una partita, condivisibile senza copie
+
+@dataclass(frozen=True)
+class SessionSnapshot:
+    ''' Fotografia immutabile dello stato di una GameSession '''
+    sceltaId:        str                          # chiave della scelta corrente
+    playerId:        int                          # ID del personaggio che ha il turno
+    abilities:       tuple[tuple[str, ...], ...]  # abilità di ogni personaggio, nell'ordine della sessione
+    lastViewedLevel: int = -1                     # ultimo livello di cui è stata mostrata l'introduzione
+
+    @classmethod
+    def fromSaveEntry(cls, entry: dict, scelteCollection: ScelteCollection) -> SessionSnapshot:
+        '''Converte uno slot di saves.json nel formato a due personaggi'''
+        return cls(
+            sceltaId=entry["node"],
+            playerId=entry["turn"],
+            abilities=(tuple(entry["p1_abilities"]), tuple(entry["p2_abilities"])),
+            lastViewedLevel=scelteCollection.__getScelta__(entry["node"]).level,
+        )
+
+    def toSaveEntry(self, name: str) -> dict:
+        '''Converte la fotografia nel formato degli slot di saves.json'''
+        entry = {"name": name, "node": self.sceltaId, "turn": self.playerId}
+        for i, abilities in enumerate(self.abilities):
+            entry[f"p{i + 1}_abilities"] = list(abilities)
+        return entry
+
+# SessionHistory: le fotografie delle ultime scelte, per tornare indietro senza rileggere nulla
+
+class SessionHistory:
+    ''' Fotografie consecutive di una partita; ognuna condivide con la precedente le abilità non cambiate '''
+    def __init__(self, maxSteps: int = 500):
+        self._snapshots = deque(maxlen=maxSteps + 1)  # le più vecchie escono da sole
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    @property
+    def steps(self) -> int:
+        '''Quante scelte si possono annullare'''
+        return max(len(self._snapshots) - 1, 0)
+
+    def reset(self, snapshot: SessionSnapshot = None):
+        self._snapshots.clear()
+        if snapshot is not None:
+            self._snapshots.append(snapshot)
+
+    def push(self, snapshot: SessionSnapshot):
+        self._snapshots.append(snapshot)
+
+    def latest(self) -> SessionSnapshot | None:
+        return self._snapshots[-1] if self._snapshots else None
+
+    def rewind(self, steps: int = 1) -> SessionSnapshot | None:
+        '''Scarta le ultime scelte (al massimo fino alla più vecchia) e restituisce lo stato a cui si torna'''
+        steps = min(steps, self.steps)
+        if steps <= 0:
+            return None
+        for _ in range(steps):
+            self._snapshots.pop()
+        return self._snapshots[-1]
+
+# AutosaveWriter: scrive il salvataggio automatico su un thread separato
+
+class AutosaveWriter:
+    ''' Tiene solo l'ultima fotografia ricevuta e la scrive in background, in modo atomico '''
+    def __init__(self, fileName: str = "autosave.json", fileManager: FileManager = None, delay: float = 0.25):
+        self.fileName = fileName
+        self.fileManager = fileManager or FileManager()
+        self.delay = delay      # attesa prima di scrivere, per raccogliere le scelte ravvicinate
+        self.latest = None      # ultima fotografia ricevuta, anche se non ancora su disco
+        self.submitted = 0
+        self.written = 0
+        self._name = "Autosave"
+        self._pending = None
+        self._writing = False
+        self._flushing = 0
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def submit(self, snapshot: SessionSnapshot, name: str = "Autosave"):
+        '''Non blocca mai: la fotografia sostituisce quella eventualmente ancora in attesa'''
+        with self._cond:
+            if self._closed:
+                return
+            self.latest, self._name = snapshot, name
+            self._pending = (snapshot, name)
+            self.submitted += 1
+            # Il thread parte alla prima fotografia
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def latestEntry(self) -> dict | None:
+        return self.latest.toSaveEntry(self._name) if self.latest is not None else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                deadline = time.monotonic() + self.delay
+                while not self._closed and not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                snapshot, name = self._pending
+                self._pending = None
+                self._writing = True
+            try:
+                self.fileManager.saveFileAtomic(self.fileName, snapshot.toSaveEntry(name))
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self.written += 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        '''Attende che l'ultima fotografia sia su disco; False se il timeout scade prima'''
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self._pending is None and not self._writing, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout: float = None):
+        '''Scrive ciò che resta in attesa e ferma il thread'''
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
 # GameSession: rappresenta lo stato della partita in corso
 
 class GameSession():
@@ -150,3 +522,64 @@ class GameSession():
     
     def updateCurrentScelta(self, newSceltaId):
         self.currentSceltaId = newSceltaId
+
+    def choose(self, direction: str, iterator: ScelteIterator) -> Scelta:
+        '''Applica una scelta: il giocatore di turno ottiene gli oggetti e la sessione passa al nodo successivo'''
+        iterator._position = self.currentSceltaId
+        player = self.getCurrentPlayer()
+        scelta = self.scelteCollection.__getScelta__(self.currentSceltaId)
+
+        if direction == "left":
+            if scelta.leftObjects:
+                player.updateAbilities(scelta.leftObjects)
+            next_s = iterator.getLeft(player.abilities)
+        else:
+            if scelta.rightObjects:
+                player.updateAbilities(scelta.rightObjects)
+            next_s = iterator.getRight(player.abilities)
+
+        # "EXIT" non è un nodo della storia: la sessione resta dov'è
+        if next_s.key != "EXIT":
+            self.updateCurrentScelta(next_s.key)
+            # Applichiamo il turno indicato dal nuovo nodo
+            self.switchTurn(forced_turn=next_s.turn)
+        return next_s
+
+    def successors(self, iterator: ScelteIterator = None) -> dict[str, str]:
+        '''Chiavi dei nodi a cui porterebbero le due scelte, con gli oggetti che il giocatore otterrebbe; non modifica la sessione'''
+        iterator = iterator if iterator is not None else iter(self.scelteCollection)
+        abilities = self.getCurrentPlayer().abilities
+        scelta = self.scelteCollection.__getScelta__(self.currentSceltaId)
+        successors = {}
+        for side, granted in (("left", scelta.leftObjects), ("right", scelta.rightObjects)):
+            # Come updateAbilities: gli oggetti si aggiungono solo se almeno uno è nuovo
+            objects = abilities + granted if any(obj not in abilities for obj in granted) else abilities
+            try:
+                successors[side] = iterator.resolve(side, objects, self.currentSceltaId)
+            except ValueError:
+                pass  # lato senza opzioni percorribili: choose solleverebbe lo stesso errore
+        return successors
+
+    def needsLevelIntro(self, scelta: Scelta) -> bool:
+        '''True se il nodo apre un nuovo livello o si ricomincia dal livello 1 venendo da uno superiore'''
+        return scelta.level > self.last_viewed_level or (scelta.level == 1 and self.last_viewed_level > 1)
+
+    def snapshot(self, previous: SessionSnapshot = None) -> SessionSnapshot:
+        '''Restituisce lo stato attuale; le abilità invariate rispetto a previous vengono condivise'''
+        abilities = []
+        for i, character in enumerate(self.characters):
+            if previous is not None and i < len(previous.abilities) and list(previous.abilities[i]) == character.abilities:
+                abilities.append(previous.abilities[i])
+            else:
+                abilities.append(tuple(character.abilities))
+        return SessionSnapshot(self.currentSceltaId, self.currentPlayerId, tuple(abilities), self.last_viewed_level)
+
+    def restore(self, snapshot: SessionSnapshot):
+        '''Ripristina uno stato salvato senza ricaricare la storia'''
+        if len(snapshot.abilities) != len(self.characters):
+            raise ValueError(f"Snapshot has {len(snapshot.abilities)} characters, session has {len(self.characters)}")
+        self.currentSceltaId = snapshot.sceltaId
+        self.currentPlayerId = snapshot.playerId
+        self.last_viewed_level = snapshot.lastViewedLevel
+        for character, abilities in zip(self.characters, snapshot.abilities):
+            character.abilities = list(abilities)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+import gc
+import os
+import signal
+import traceback
+from compiled import CompiledStory
+from model import StoryCache
+
+# Modalità pre-fork: il processo padre legge e compila la storia una volta sola,
+# poi i worker creati con fork() ne condividono le pagine in copy-on-write.
+
+def uniqueMemory(pid: int | str = "self") -> int:
+    '''Memoria privata del processo (USS) in byte; 0 se /proc non è disponibile'''
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return 0
+    return sum(int(fields.get(name, "0 kB").split()[0]) for name in ("Private_Clean", "Private_Dirty")) * 1024
+
+def loadFrozenStory(fileName: str = "storia.json", compiled: bool = True):
+    '''Carica la storia nel processo padre e congela gli oggetti già allocati'''
+    collection, characters = StoryCache().load(fileName)
+    story = CompiledStory.fromCollection(collection, characters).buildIndex() if compiled else collection
+    # Gli oggetti congelati non vengono più visitati dal GC: i figli non sporcano le loro pagine
+    gc.collect()
+    gc.freeze()
+    return story, characters
+
+def preforkWorkers(fileName: str, workers: int, target, compiled: bool = True) -> list[int]:
+    '''Esegue target(indice, storia, personaggi) in `workers` processi figli e ne restituisce i codici di uscita'''
+    if not hasattr(os, "fork"):
+        raise OSError("Pre-fork mode requires os.fork()")
+    story, characters = loadFrozenStory(fileName, compiled)
+    pids = []
+    try:
+        for index in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    target(index, story, characters)
+                except BaseException:
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        return [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) for pid in pids]
+    except BaseException:
+        # Se il padre viene interrotto non lasciamo worker orfani
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        raise
+    finally:
+        gc.unfreeze()
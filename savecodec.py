@@ -0,0 +1,209 @@
+from __future__ import annotations
+import hashlib
+import json
+import sys
+from array import array as Array
+from model import Character, FileManager, ScelteCollection, StoryCache
+
+# Formato binario dei salvataggi:
+#   MAGIC, versione, dimensione delle parole (1, 2 o 4 byte), primi 8 byte dell'hash delle tabelle,
+#   numero di parole (uint32), le parole little-endian, le stringhe proprie del file in UTF-8
+# Parole, in ordine:
+#   stringhe proprie:  n, lunghezza di ognuna in caratteri
+#   finali sbloccati:  n, riferimenti
+#   slot:              n, poi per ogni slot chiave, nome, nodo, turno + 1 (0 = None),
+#                      personaggi e per ognuno n, riferimenti a oggetti; infine i campi extra in JSON (testo + 1, 0 = nessuno)
+#   campi extra del file in JSON (testo + 1, 0 = nessuno)
+# Chiavi e nomi degli slot sono indici nelle stringhe proprie del file. Un riferimento è un indice nelle
+# stringhe della storia (nodi, poi oggetti) seguite da quelle proprie del file, usate per i valori che la storia non conosce.
+# Le parole si leggono con una sola chiamata a array.frombytes, senza decodificare campo per campo.
+MAGIC = b"LSv"
+SAVE_FORMAT_VERSION = 1
+HASH_BYTES = 8
+HEADER_BYTES = len(MAGIC) + 2 + HASH_BYTES + 4
+
+SLOT_FIELDS = ("name", "node", "turn")
+
+def abilityFields(characters: int) -> tuple[str, ...]:
+    return tuple(f"p{i + 1}_abilities" for i in range(characters))
+
+ABILITY_FIELDS = [abilityFields(n) for n in range(5)]
+
+def isBinarySave(fileName: str) -> bool:
+    '''True se il file esiste ed è nel formato binario (serve il codec per leggerlo)'''
+    try:
+        with open(fileName, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+class SaveFormatError(ValueError):
+    ''' Il contenuto non è un salvataggio binario leggibile da questo codec '''
+
+class IncompatibleSaveError(SaveFormatError):
+    ''' Il salvataggio è stato scritto per un'altra versione della storia '''
+
+def migrateJsonLayout(data: dict) -> dict:
+    '''Layout di saves.json (versione 0): completa i campi mancanti degli slot e dei finali sbloccati'''
+    migrated = {}
+    for key, value in data.items():
+        if key == "unlocked_endings":
+            migrated[key] = [str(ending) for ending in value]
+        elif isinstance(value, dict) and "node" in value:
+            slot = dict(value)
+            slot.setdefault("name", f"Slot {key}")
+            slot.setdefault("turn", 0)
+            for field in ("p1_abilities", "p2_abilities"):
+                slot.setdefault(field, [])
+            migrated[key] = slot
+        else:
+            migrated[key] = value
+    migrated.setdefault("unlocked_endings", [])
+    return migrated
+
+# Versione di partenza -> funzione che porta il contenuto alla versione successiva
+MIGRATIONS = {0: migrateJsonLayout}
+
+def upgrade(data: dict, version: int) -> dict:
+    '''Applica in ordine le migrazioni dalla versione indicata a quella corrente'''
+    while version < SAVE_FORMAT_VERSION:
+        data = MIGRATIONS[version](data)
+        version += 1
+    return data
+
+class SaveCodec:
+    ''' Codifica compatta di saves.json: nodi e oggetti sono indici nelle tabelle della storia '''
+    def __init__(self, nodeKeys: list[str], items: list[str]):
+        known = set(nodeKeys)
+        self._strings = list(nodeKeys) + [item for item in items if item not in known]
+        self._ids = {value: i for i, value in enumerate(self._strings)}
+        # Solo le tabelle a cui puntano i riferimenti: correggere i testi della storia non invalida i salvataggi
+        self._hash = hashlib.sha256("\n".join(self._strings).encode("utf-8")).digest()[:HASH_BYTES]
+
+    @classmethod
+    def fromCollection(cls, collection: ScelteCollection, characters: list[Character]) -> SaveCodec:
+        items = {}
+        for character in characters:
+            items.update(dict.fromkeys(character.abilities))
+        for scelta in collection._collection.values():
+            items.update(dict.fromkeys(scelta.leftObjects))
+            items.update(dict.fromkeys(scelta.rightObjects))
+        return cls(list(collection._collection), list(items))
+
+    @classmethod
+    def fromStoryFile(cls, fileName: str = "storia.json", fileManager: FileManager = None) -> SaveCodec:
+        fileManager = fileManager or FileManager()
+        collection, characters = StoryCache().load(fileName, fileManager)
+        return cls.fromCollection(collection, characters)
+
+    def detect(self, raw: bytes) -> bool:
+        return raw[:len(MAGIC)] == MAGIC
+
+    # ---- scrittura
+
+    def encode(self, data: dict) -> bytes:
+        data = migrateJsonLayout(data)
+        texts, textIds = [], {}
+        def text(value: str) -> int:
+            id = textIds.get(value)
+            if id is None:
+                id = textIds[value] = len(texts)
+                texts.append(value)
+            return id
+        def ref(value: str) -> int:
+            id = self._ids.get(value)
+            return id if id is not None else len(self._strings) + text(value)
+
+        unlocked = data["unlocked_endings"]
+        words = [len(unlocked)] + [ref(key) for key in unlocked]
+        slots = {key: value for key, value in data.items() if isinstance(value, dict) and "node" in value}
+        words.append(len(slots))
+        for key, slot in slots.items():
+            characters = 0
+            while f"p{characters + 1}_abilities" in slot:
+                characters += 1
+            words += (text(key), text(slot["name"]), ref(slot["node"]), 0 if slot["turn"] is None else slot["turn"] + 1, characters)
+            for i in range(characters):
+                abilities = slot[f"p{i + 1}_abilities"]
+                words.append(len(abilities))
+                words += [ref(item) for item in abilities]
+            extra = {k: v for k, v in slot.items() if k not in SLOT_FIELDS and not (k.startswith("p") and k.endswith("_abilities"))}
+            words.append(text(json.dumps(extra)) + 1 if extra else 0)
+        extra = {k: v for k, v in data.items() if k != "unlocked_endings" and k not in slots}
+        words.append(text(json.dumps(extra)) + 1 if extra else 0)
+
+        # Le stringhe nuove vanno in coda, precedute dalle loro lunghezze
+        words = [len(texts)] + [len(text) for text in texts] + words
+        largest = max(words)
+        typecode = "B" if largest < 0x100 else "H" if largest < 0x10000 else "I"
+        array = Array(typecode, words)
+        if sys.byteorder == "big" and array.itemsize > 1:
+            array.byteswap()
+        header = MAGIC + bytes((SAVE_FORMAT_VERSION, array.itemsize)) + self._hash + len(words).to_bytes(4, "little")
+        return header + array.tobytes() + "".join(texts).encode("utf-8")
+
+    # ---- lettura
+
+    def load(self, raw: bytes) -> dict:
+        '''Legge sia il formato binario sia il vecchio saves.json, portandoli alla versione corrente'''
+        if raw[:len(MAGIC)] == MAGIC:
+            return self.decode(raw)
+        return upgrade(json.loads(raw.decode("utf-8")), 0)
+
+    def decode(self, raw: bytes) -> dict:
+        if raw[:len(MAGIC)] != MAGIC:
+            raise SaveFormatError("Not a binary save file")
+        if len(raw) < HEADER_BYTES:
+            raise SaveFormatError("Truncated save file")
+        version, itemsize = raw[len(MAGIC)], raw[len(MAGIC) + 1]
+        if version > SAVE_FORMAT_VERSION:
+            raise SaveFormatError(f"Save format version {version} is newer than supported ({SAVE_FORMAT_VERSION})")
+        if raw[len(MAGIC) + 2:len(MAGIC) + 2 + HASH_BYTES] != self._hash:
+            raise IncompatibleSaveError("Save file was written for a different version of the story")
+        count = int.from_bytes(raw[HEADER_BYTES - 4:HEADER_BYTES], "little")
+        end = HEADER_BYTES + count * itemsize
+        try:
+            words = Array({1: "B", 2: "H", 4: "I"}[itemsize])
+            words.frombytes(raw[HEADER_BYTES:end])
+            if sys.byteorder == "big" and itemsize > 1:
+                words.byteswap()
+            words = words.tolist()
+
+            # Stringhe proprie del file: nomi, chiavi e valori che la storia non conosce
+            texts, own, offset = words[0], [], 0
+            blob = raw[end:].decode("utf-8")
+            for length in words[1:texts + 1]:
+                own.append(blob[offset:offset + length])
+                offset += length
+            strings = self._strings
+            lookup = strings.__getitem__
+            def refs(ids: list[int]) -> list[str]:
+                # Quasi sempre sono tutte stringhe della storia: basta una map, senza controlli per elemento
+                try:
+                    return list(map(lookup, ids))
+                except IndexError:
+                    return [strings[id] if id < len(strings) else own[id - len(strings)] for id in ids]
+            pos = texts + 1
+
+            n = words[pos]
+            data = {"unlocked_endings": refs(words[pos + 1:pos + 1 + n])}
+            pos += 1 + n
+            slots = words[pos]
+            pos += 1
+            for _ in range(slots):
+                key, name, node, turn, characters = words[pos:pos + 5]
+                slot = {"name": own[name], "node": strings[node] if node < len(strings) else own[node - len(strings)], "turn": turn - 1 if turn else None}
+                pos += 5
+                for field in ABILITY_FIELDS[characters] if characters < len(ABILITY_FIELDS) else abilityFields(characters):
+                    n = words[pos]
+                    slot[field] = refs(words[pos + 1:pos + 1 + n])
+                    pos += 1 + n
+                if words[pos]:
+                    slot.update(json.loads(own[words[pos] - 1]))
+                data[own[key]] = slot
+                pos += 1
+            if words[pos]:
+                data.update(json.loads(own[words[pos] - 1]))
+        except (IndexError, KeyError, ValueError) as e:
+            raise SaveFormatError(f"Corrupted save file: {e}") from None
+        return upgrade(data, version)
@@ -0,0 +1,304 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.parse
+from model import FileManager, GameSession, SessionSnapshot, StoryCache
+from prefork import preforkWorkers
+
+# Protocollo: una richiesta JSON per riga, una risposta JSON per riga.
+#   {"cmd": "new", "player": "alice"}          nuova partita (player opzionale)
+#   {"cmd": "choose", "dir": "left"|"right"}   applica una scelta
+#   {"cmd": "state"}                           stato corrente
+#   {"cmd": "save", "slot": "1"}               salva lo stato nello slot del giocatore
+#   {"cmd": "load", "slot": "1"}               ripristina uno slot
+#   {"cmd": "endings"}                         finali della storia e quelli sbloccati
+# Ogni risposta contiene "ok"; in caso di errore anche "error". Una riga più lunga di MAX_LINE chiude la connessione.
+# Slot e finali sbloccati sono un profilo per giocatore nel formato di saves.json, tenuto in memoria.
+# Con una cartella di salvataggi (--saves) ogni giocatore con nome ha il proprio file: viene letto quando
+# il giocatore si presenta (anche su un altro worker) e riscritto da ProfileWriter, fuori dal ciclo asyncio.
+# I profili degli ospiti (connessioni senza "new" con player) restano solo in memoria.
+
+MAX_LINE = 1 << 16  # byte per richiesta
+
+class ProfileWriter:
+    ''' Scrive i profili modificati su un thread separato; le modifiche ravvicinate di un profilo diventano una scrittura '''
+    def __init__(self, fileManager: FileManager = None, delay: float = 0.25):
+        self.fileManager = fileManager or FileManager()
+        self.delay = delay   # attesa prima di scrivere, per raccogliere le modifiche ravvicinate
+        self.written = 0
+        self._pending = {}   # file -> ultimo contenuto da scrivere
+        self._inflight = ()  # file in scrittura in questo momento
+        self._writing = False
+        self._flushing = 0
+        self._closed = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def submit(self, fileName: str, profile: dict):
+        '''Non blocca: il contenuto sostituisce quello dello stesso file ancora in attesa'''
+        with self._cond:
+            if self._closed:
+                return
+            self._pending[fileName] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiles", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.delay
+                while not self._closed and not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                pending, self._pending = self._pending, {}
+                self._inflight = pending.keys()
+                self._writing = True
+            try:
+                for fileName, profile in pending.items():
+                    self.fileManager.saveFileAtomic(fileName, profile)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._inflight = ()
+                    self.written += len(pending)
+                    self._cond.notify_all()
+
+    def isPending(self, fileName: str) -> bool:
+        '''True se il file ha modifiche non ancora su disco'''
+        with self._cond:
+            return fileName in self._pending or fileName in self._inflight
+
+    def flush(self, timeout: float = None) -> bool:
+        '''Attende che i profili in attesa siano su disco; False se il timeout scade prima'''
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout: float = None):
+        '''Scrive ciò che resta in attesa e ferma il thread'''
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+class ClientSession:
+    ''' Stato di una connessione: una GameSession sulla storia condivisa dal server '''
+    def __init__(self, server: GameServer, player: str, guest: bool = False):
+        self.server = server
+        self.player = player
+        self.guest = guest  # gli ospiti non hanno un profilo su disco
+        if not guest:
+            server.loadProfile(player)
+        self.newGame()
+
+    def newGame(self):
+        self.session = GameSession(self.server.collection, [c.clone() for c in self.server.characters])
+        self.iterator = iter(self.server.collection)
+        self.session.last_viewed_level = 1
+
+    def handle(self, request: dict) -> dict:
+        '''Esegue un comando e restituisce la risposta da inviare al client'''
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Request must be a JSON object"}
+        cmd = request.get("cmd")
+        if cmd == "new":
+            if "player" in request:
+                self.player, self.guest = str(request["player"]), False
+                self.server.loadProfile(self.player)
+            self.newGame()
+            response = self.state()
+            response["intro"] = self.server.collection.level_introductions.get("1", "Your journey continues...")
+            return response
+        if cmd == "choose":
+            return self.choose(request.get("dir"))
+        if cmd == "state":
+            return self.state()
+        if cmd == "save":
+            slot = str(request.get("slot", "1"))
+            entry = self.session.snapshot().toSaveEntry(f"Slot {slot}")
+            def store(profile):
+                profile[slot] = entry
+            self.server.updateProfile(self.player, store, persist=not self.guest)
+            return {"ok": True}
+        if cmd == "load":
+            entry = self.server.profile(self.player).get(str(request.get("slot", "1")))
+            if not isinstance(entry, dict):
+                return {"ok": False, "error": "Empty slot"}
+            snapshot = SessionSnapshot.fromSaveEntry(entry, self.server.collection)
+            self.session.restore(snapshot)
+            return self.state()
+        if cmd == "endings":
+            unlocked = set(self.server.profile(self.player).get("unlocked_endings", []))
+            return {"ok": True, "endings": [
+                {"key": key, "title": title, "level": level, "unlocked": key in unlocked}
+                for key, title, level in self.server.endings
+            ]}
+        return {"ok": False, "error": f"Unknown command {cmd!r}"}
+
+    def choose(self, direction: str) -> dict:
+        if direction not in ("left", "right"):
+            return {"ok": False, "error": "dir must be 'left' or 'right'"}
+        next_s = self.session.choose(direction, self.iterator)
+        if next_s.key == "EXIT":
+            self.newGame()
+            response = self.state()
+            response["exit"] = True
+            return response
+
+        response = self.state()
+        if self.session.needsLevelIntro(next_s):
+            self.session.last_viewed_level = next_s.level
+            response["intro"] = self.server.collection.level_introductions.get(str(next_s.level), "Your journey continues...")
+        if next_s.is_end:
+            def unlock(profile):
+                if next_s.key not in profile["unlocked_endings"]:
+                    profile["unlocked_endings"].append(next_s.key)
+            self.server.updateProfile(self.player, unlock, persist=not self.guest)
+        return response
+
+    def state(self) -> dict:
+        scelta = self.session.scelteCollection.__getScelta__(self.session.currentSceltaId)
+        player = self.session.getCurrentPlayer()
+        return {
+            "ok": True,
+            "node": scelta.key,
+            "level": scelta.level,
+            "text": scelta.text,
+            "left": scelta.leftText,
+            "right": scelta.rightText,
+            "turn": player.id,
+            "player": player.nickname,
+            "abilities": list(player.abilities),
+            "is_end": scelta.is_end,
+            "ending_title": scelta.ending_title,
+        }
+
+class GameServer:
+    ''' Server asyncio che ospita molte partite su una sola ScelteCollection in sola lettura '''
+    def __init__(self, fileName: str = "storia.json", cacheSize: int = 4096, savesDir: str = None):
+        self.collection, self.characters = StoryCache().load(fileName)
+        # Tutte le sessioni percorrono gli stessi nodi: la cache delle transizioni è condivisa
+        self.collection.enableTransitionCache(cacheSize)
+        self.endings = [
+            (key, scelta.ending_title, scelta.level)
+            for key, scelta in self.collection._collection.items() if scelta.is_end
+        ]
+        self.savesDir = savesDir  # None: profili solo in memoria, validi per un singolo processo
+        self.fileManager = FileManager()
+        self.profiles: dict[str, dict] = {}
+        self.writer = ProfileWriter(self.fileManager)
+        if savesDir:
+            os.makedirs(savesDir, exist_ok=True)
+        self.activeSessions = 0
+        self._ids = itertools.count(1)
+
+    def profileFile(self, player: str) -> str:
+        return os.path.join(self.savesDir, urllib.parse.quote(player, safe="") + ".json")
+
+    def loadProfile(self, player: str):
+        '''Rilegge il profilo del giocatore dal suo file: un altro worker può averlo modificato'''
+        if not self.savesDir:
+            return
+        fileName = self.profileFile(player)
+        if self.writer.isPending(fileName):
+            return  # il profilo in memoria è più recente del file
+        profile = self.fileManager.loadSaves(fileName)
+        if profile:
+            self.profiles[player] = profile
+
+    def profile(self, player: str) -> dict:
+        '''Slot e finali sbloccati del giocatore, come in saves.json'''
+        return self.profiles.get(player, {})
+
+    def updateProfile(self, player: str, change, persist: bool = True):
+        '''Applica change al profilo in memoria; con una cartella di salvataggi la scrittura avviene in background'''
+        profile = self.profiles.setdefault(player, {})
+        profile.setdefault("unlocked_endings", [])
+        change(profile)
+        if persist and self.savesDir:
+            self.writer.submit(self.profileFile(player), copy.deepcopy(profile))
+
+    def close(self, timeout: float = None):
+        '''Scrive i profili ancora in attesa'''
+        self.writer.close(timeout)
+
+    async def handleClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = ClientSession(self, f"guest-{next(self._ids)}", guest=True)
+        self.activeSessions += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Riga oltre MAX_LINE: non si sa dove inizi la richiesta successiva, si risponde e si chiude
+                    writer.write(json.dumps({"ok": False, "error": f"Request longer than {MAX_LINE} bytes"}).encode() + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    response = client.handle(json.loads(line))
+                except (ValueError, KeyError) as e:
+                    # Richiesta malformata o nodo non raggiungibile con l'inventario attuale
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.activeSessions -= 1
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, unixPath: str = None, reusePort: bool = False) -> asyncio.AbstractServer:
+        if unixPath:
+            return await asyncio.start_unix_server(self.handleClient, path=unixPath, backlog=4096, limit=MAX_LINE)
+        return await asyncio.start_server(self.handleClient, host, port, backlog=4096, reuse_port=reusePort or None, limit=MAX_LINE)
+
+async def serve(args):
+    server = GameServer(args.story, savesDir=args.saves or None)
+    listener = await server.start(args.host, args.port, args.unix, reusePort=args.workers > 1)
+    where = args.unix or f"{args.host}:{listener.sockets[0].getsockname()[1]}"
+    print(f"[Server] listening on {where}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close(timeout=2.0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-session server for The Adventures of Lulucia")
+    parser.add_argument("--story", default="storia.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=1, help="pre-fork N processes sharing the loaded story (TCP only)")
+    parser.add_argument("--saves", default="server_saves", help="folder with one profile per named player, shared by all workers ('' keeps them in memory)")
+    args = parser.parse_args()
+    try:
+        if args.workers > 1:
+            # I figli trovano la storia già nella StoryCache ereditata dal padre
+            preforkWorkers(args.story, args.workers, lambda index, story, characters: asyncio.run(serve(args)), compiled=False)
+        else:
+            asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
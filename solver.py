@@ -0,0 +1,293 @@
+from __future__ import annotations
+import sys
+from model import Character, FileManager, ScelteCollection, StoryCache
+from compiled import CompiledStory, LEFT, RIGHT, STUCK_ID
+
+# Versione dell'algoritmo: cambiandola si invalidano le soluzioni in cache
+SOLVER_VERSION = 1
+SOLUTIONS_CACHE_FILE = "solutions_cache.json"
+
+DIRECTIONS = ("left", "right")  # indicizzato da LEFT/RIGHT
+MAX_STATES = 1_000_000           # stati (nodo, inventari) memorizzati al massimo durante la visita
+INDEX_MAX_STATES = 200_000       # stati indicizzati per i suggerimenti, costruiti durante il caricamento
+
+class StorySolver:
+    ''' Visita in ampiezza dello spazio degli stati (nodo, inventari): percorso più breve verso ogni finale '''
+    def __init__(self, story: CompiledStory, characters: list[Character] = None, startKey: str = "0", maxStates: int = MAX_STATES):
+        self._story = story
+        self._maxStates = maxStates
+        self._maxStatesPerClass = max(1, maxStates // max(story.nodeCount, 1))
+        self._start = story.nodeId(startKey)
+        inventories = [story.itemMask(c.abilities) for c in characters or []]
+        self._characters = max(len(inventories), max(story.turn, default=0) + 1)
+        # Stato codificato in un solo intero: nodo nei bit bassi, poi un inventario per personaggio
+        self._nodeBits = max(story.nodeCount.bit_length(), 1)
+        self._itemBits = max(story.itemCount, 1)
+        self._localMask, self._stateMask = self._requirementMasks()
+        self._initial = self.encode(self._start, inventories)
+        self.explored = 0
+        self.exact = True
+
+    @classmethod
+    def fromCollection(cls, collection: ScelteCollection, characters: list[Character] = None, startKey: str = "0", maxStates: int = MAX_STATES) -> StorySolver:
+        return cls(CompiledStory.fromCollection(collection, characters), characters, startKey, maxStates)
+
+    def _inventoryShift(self, character: int) -> int:
+        return self._nodeBits + character * self._itemBits
+
+    def encode(self, node: int, inventories: list[int]) -> int:
+        '''Stato del nodo con gli inventari dati, ridotto agli oggetti che contano da lì in avanti'''
+        state = node
+        for character, mask in enumerate(inventories[:self._characters]):
+            state |= mask << self._inventoryShift(character)
+        return state & self._stateMask[node]
+
+    def transition(self, state: int, side: int) -> tuple[int, int]:
+        '''(nodo di destinazione, stato successivo) per un lato; il nodo è STUCK_ID se nessuna opzione è soddisfatta'''
+        story = self._story
+        node = state & (1 << self._nodeBits) - 1
+        shift = self._inventoryShift(story.turn[node])
+        slot = node * 2 + side
+        inventory = (state >> shift & (1 << self._itemBits) - 1) | story.grant[slot]
+        for option in range(story.optStart[slot], story.optStart[slot + 1]):
+            if story.optMask[option] & ~inventory == 0:
+                target = story.optNext[option]
+                break
+        else:
+            return STUCK_ID, -1
+        if target < 0:
+            return target, -1
+        child = (state & ~((1 << self._nodeBits) - 1) & ~((1 << self._itemBits) - 1 << shift)) | inventory << shift | target
+        return target, child & self._stateMask[target]
+
+    def _requirementMasks(self) -> tuple[list[int], list[int]]:
+        '''Per ogni nodo, i bit dello stato letti nel nodo stesso e quelli che possono ancora influire da lì in avanti'''
+        story = self._story
+        nodeMask = (1 << self._nodeBits) - 1
+        # Un oggetto conta solo se è richiesto, al personaggio di turno, in un nodo raggiungibile (finali esclusi)
+        local = [0] * story.nodeCount
+        predecessors = [[] for _ in range(story.nodeCount)]
+        for node in range(story.nodeCount):
+            if story.isEnd(node):
+                continue
+            shift = self._inventoryShift(story.turn[node])
+            for option in range(story.optStart[node * 2], story.optStart[node * 2 + 2]):
+                local[node] |= story.optMask[option] << shift
+                if story.optNext[option] >= 0:
+                    predecessors[story.optNext[option]].append(node)
+        downstream = list(local)
+        pending = list(range(story.nodeCount))
+        while pending:
+            node = pending.pop()
+            for previous in predecessors[node]:
+                combined = downstream[previous] | downstream[node]
+                if combined != downstream[previous]:
+                    downstream[previous] = combined
+                    pending.append(previous)
+        return [mask | nodeMask for mask in local], [mask | nodeMask for mask in downstream]
+
+    def solve(self) -> dict[str, list[str]]:
+        '''Sequenza di scelte più breve dall'inizio a ogni finale raggiungibile; i finali non si espandono'''
+        story = self._story
+        turn, optStart, optMask, optNext = list(story.turn), list(story.optStart), list(story.optMask), list(story.optNext)
+        grant, stateMask = list(story.grant), self._stateMask
+        isEnd = [story.isEnd(node) for node in range(story.nodeCount)]
+        remaining = sum(isEnd)
+        nodeMask, itemMask = (1 << self._nodeBits) - 1, (1 << self._itemBits) - 1
+        shifts = [self._inventoryShift(character) for character in range(self._characters)]
+
+        # Per ogni stato raggiunto: stato precedente e lato scelto, nello stesso intero
+        parents = {self._initial: -1}
+        # Le combinazioni di inventari crescono in modo esponenziale: oltre il budget si tengono solo i primi stati
+        # raggiunti per ogni classe (nodo, oggetti richiesti nel nodo), e i percorsi restano validi ma non più minimi
+        limit, budget, localMask, statesAt = self._maxStatesPerClass, self._maxStates, self._localMask, {}
+        found = {}
+        frontier = [self._initial]
+        while frontier and remaining:
+            following = []
+            for state in frontier:
+                node = state & nodeMask
+                shift = shifts[turn[node]]
+                held = state >> shift & itemMask
+                base = state & ~nodeMask & ~(itemMask << shift)
+                for side in (LEFT, RIGHT):
+                    slot = node * 2 + side
+                    inventory = held | grant[slot]
+                    for option in range(optStart[slot], optStart[slot + 1]):
+                        if optMask[option] & ~inventory == 0:
+                            target = optNext[option]
+                            break
+                    else:
+                        continue  # nessuna opzione soddisfatta
+                    if target < 0:
+                        continue  # EXIT o chiave mancante
+                    child = (base | inventory << shift | target) & stateMask[target]
+                    if child in parents:
+                        continue
+                    local = child & localMask[target]
+                    count = statesAt.get(local, 0)
+                    if count == limit or len(parents) >= budget:
+                        self.exact = False
+                        continue
+                    statesAt[local] = count + 1
+                    parents[child] = state << 1 | side
+                    if isEnd[target]:
+                        if target not in found:
+                            found[target] = child
+                            remaining -= 1
+                    else:
+                        following.append(child)
+            self.explored += len(frontier)
+            frontier = following
+
+        return {story.key(node): self._path(parents, state) for node, state in found.items()}
+
+    def _path(self, parents: dict[int, int], state: int) -> list[str]:
+        path = []
+        while parents[state] != -1:
+            link = parents[state]
+            path.append(DIRECTIONS[link & 1])
+            state = link >> 1
+        path.reverse()
+        return path
+
+class ReachabilityIndex:
+    ''' Finali ancora raggiungibili da ciascun lato, per ogni stato (nodo, classe di inventario), calcolati al caricamento '''
+    def __init__(self, story: CompiledStory, characters: list[Character] = None, startKey: str = "0", maxStates: int = INDEX_MAX_STATES):
+        self._story = story
+        self.collection = story  # collezione da cui è stato costruito l'indice
+        self._endings = [node for node in range(story.nodeCount) if story.isEnd(node)]
+        self._bits = {node: 1 << i for i, node in enumerate(self._endings)}
+        self._nodeSides = self._graphSides()
+        self._sides = {}
+        self.complete = True
+        try:
+            self._solver = StorySolver(story, characters, startKey, maxStates)
+        except KeyError:
+            # Senza nodo iniziale non c'è nulla da esplorare: restano le risposte per nodo
+            self._solver = None
+        else:
+            self._build(maxStates)
+
+    @classmethod
+    def fromCollection(cls, collection: ScelteCollection, characters: list[Character] = None, startKey: str = "0", maxStates: int = INDEX_MAX_STATES) -> ReachabilityIndex:
+        index = cls(CompiledStory.fromCollection(collection, characters), characters, startKey, maxStates)
+        index.collection = collection
+        return index
+
+    def _graphSides(self) -> list[tuple[int, int]]:
+        '''Finali raggiungibili da ogni lato ignorando i requisiti: risposta prudente per gli stati non indicizzati'''
+        story = self._story
+        reach = [self._bits.get(node, 0) for node in range(story.nodeCount)]
+        changed = True
+        while changed:
+            changed = False
+            for node in reversed(range(story.nodeCount)):
+                if story.isEnd(node):
+                    continue
+                mask = reach[node]
+                for option in range(story.optStart[node * 2], story.optStart[node * 2 + 2]):
+                    if story.optNext[option] >= 0:
+                        mask |= reach[story.optNext[option]]
+                if mask != reach[node]:
+                    reach[node], changed = mask, True
+
+        def side(slot: int) -> int:
+            mask = 0
+            for option in range(story.optStart[slot], story.optStart[slot + 1]):
+                if story.optNext[option] >= 0:
+                    mask |= reach[story.optNext[option]]
+            return mask
+        return [(side(node * 2), side(node * 2 + 1)) for node in range(story.nodeCount)]
+
+    def _build(self, maxStates: int):
+        '''Visita tutti gli stati raggiungibili dall'inizio, poi propaga all'indietro gli insiemi di finali'''
+        solver, bits = self._solver, self._bits
+        nodeMask = (1 << solver._nodeBits) - 1
+        # Archi di ogni stato esplorato: stato successivo, -1 - nodo per i finali, None per EXIT e vicoli ciechi
+        edges = {solver._initial: None}
+        order = [solver._initial]
+        for state in order:
+            targets = []
+            for side in (LEFT, RIGHT):
+                target, child = solver.transition(state, side)
+                if target < 0:
+                    targets.append(None)
+                elif target in bits:
+                    targets.append(-1 - target)
+                else:
+                    targets.append(child)
+                    if child not in edges and len(order) < maxStates:
+                        edges[child] = None
+                        order.append(child)
+            edges[state] = targets
+
+        reach = {}
+
+        def mask(edge) -> int:
+            if edge is None:
+                return 0
+            if edge < 0:
+                return bits[-1 - edge]
+            if edge in edges:
+                return reach.get(edge, 0)
+            # Stato oltre il budget: vale la risposta per nodo
+            self.complete = False
+            left, right = self._nodeSides[edge & nodeMask]
+            return left | right
+
+        # Punto fisso minimo: gli insiemi crescono soltanto, quindi anche i cicli convergono
+        changed = True
+        while changed:
+            changed = False
+            for state in reversed(order):
+                left, right = edges[state]
+                value = mask(left) | mask(right)
+                if reach.get(state, 0) != value:
+                    reach[state], changed = value, True
+        self._sides = {state: (mask(left), mask(right)) for state, (left, right) in edges.items()}
+
+    def endingsBySide(self, key: str, inventories: list[list[str]]) -> tuple[list[str], list[str]]:
+        '''Chiavi dei finali raggiungibili scegliendo a sinistra e a destra, con le abilità attuali di ogni personaggio'''
+        story = self._story
+        node = story.nodeId(key)
+        sides = None
+        if self._solver is not None:
+            sides = self._sides.get(self._solver.encode(node, [story.itemMask(abilities) for abilities in inventories]))
+        if sides is None:
+            sides = self._nodeSides[node]
+        return tuple(self._keys(mask) for mask in sides)
+
+    def _keys(self, mask: int) -> list[str]:
+        keys = []
+        while mask:
+            low = mask & -mask
+            keys.append(self._story.key(self._endings[low.bit_length() - 1]))
+            mask ^= low
+        return keys
+
+def solveStory(collection: ScelteCollection, characters: list[Character], storyHash: str,
+               cacheFile: str = SOLUTIONS_CACHE_FILE, fileManager: FileManager = None) -> dict[str, list[str]]:
+    '''Percorsi più brevi verso i finali, riusando quelli salvati per lo stesso contenuto della storia'''
+    fileManager = fileManager or FileManager()
+    cache_key = f"{SOLVER_VERSION}:{storyHash}"
+    cache = fileManager.loadSaves(cacheFile)
+    if cache_key in cache:
+        return cache[cache_key]
+
+    solutions = StorySolver.fromCollection(collection, characters).solve()
+
+    # Le soluzioni delle versioni precedenti del solutore non servono più
+    cache = {k: v for k, v in cache.items() if k.startswith(f"{SOLVER_VERSION}:")}
+    cache[cache_key] = solutions
+    fileManager.saveFile(cacheFile, cache)
+    return solutions
+
+def solveStoryFile(fileName: str = "storia.json", cacheFile: str = SOLUTIONS_CACHE_FILE, fileManager: FileManager = None) -> dict[str, list[str]]:
+    fileManager = fileManager or FileManager()
+    collection, characters = StoryCache().load(fileName, fileManager)
+    return solveStory(collection, characters, fileManager.hashFile(fileName), cacheFile, fileManager)
+
+if __name__ == "__main__":
+    for key, path in sorted(solveStoryFile(sys.argv[1] if len(sys.argv) > 1 else "storia.json").items(), key=lambda item: len(item[1])):
+        print(f"{key:<28} {len(path):>3} choices: {' '.join(path)}")
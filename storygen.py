@@ -0,0 +1,72 @@
+from __future__ import annotations
+import json
+import random
+import sys
+from model import Scelta
+
+# Generatore di storie sintetiche nel formato di storia.json, per benchmark e test di carico
+
+def generateStory(nodeCount: int = 1000, itemCount: int = 16, characterCount: int = 2,
+                  endingCount: int = None, levels: int = 3, textLength: int = 200, seed: int = 0) -> dict:
+    '''Storia casuale ma valida: ogni lato ha un'opzione senza requisiti e i livelli non tornano indietro'''
+    rng = random.Random(seed)
+    endingCount = endingCount or max(2, nodeCount // 20)
+    choiceCount = nodeCount - endingCount
+    items = [f"item_{i}" for i in range(itemCount)]
+    keys = ["0"] + [f"N{i}" for i in range(1, choiceCount)]
+    endings = [f"END_{i}" for i in range(endingCount)]
+    filler = "lorem ipsum dolor sit amet " * (textLength // 27 + 1)
+
+    def target(i: int) -> str:
+        # Avanti di qualche nodo, oppure (più raramente) verso un finale
+        if i + 1 >= choiceCount or rng.random() < 0.1:
+            return rng.choice(endings)
+        return keys[rng.randint(i + 1, min(choiceCount - 1, i + 5))]
+
+    def options(i: int) -> list:
+        result = [[rng.sample(items, rng.randint(1, 2)), target(i)] for _ in range(rng.randint(0, 2))]
+        result.append([[], target(i)])
+        return result
+
+    nodes = {}
+    for i, key in enumerate(keys):
+        nodes[key] = {
+            "turn": rng.randrange(characterCount),
+            "text": f"{key}: {filler[:textLength]}",
+            "leftText": f"Left from {key}",
+            "rightText": f"Right from {key}",
+            "leftObjects": rng.sample(items, rng.randint(0, 1)),
+            "rightObjects": rng.sample(items, rng.randint(0, 1)),
+            "nextLeft": options(i),
+            "nextRight": options(i),
+            "is_end": False,
+            "level": 1 + i * levels // choiceCount,
+        }
+    for j, key in enumerate(endings):
+        nodes[key] = {
+            "text": f"{key}: {filler[:textLength]}",
+            "leftText": "Restart",
+            "rightText": "Quit",
+            "nextLeft": [[[], "0"]],
+            "nextRight": [[[], "EXIT"]],
+            "is_end": True,
+            "level": levels,
+            "ending_title": f"Ending {j}",
+        }
+    return {
+        "characters": {str(c): {"nickname": f"Player {c}", "abilities": []} for c in range(characterCount)},
+        "level_introductions": {str(l): f"Level {l}" for l in range(1, levels + 1)},
+        "nodes": nodes,
+    }
+
+def edgeCaseNodes() -> dict[str, Scelta]:
+    '''Tre nodi con i casi limite delle tabelle compilate: requisito, oggetto ottenuto, EXIT, destinazione mancante e finale con titolo'''
+    return {
+        "0": Scelta("0", [(["chiave"], "2"), ([], "1")], [([], "1")], "Inizio", "Destra", "Sinistra", ["chiave"], [], turn=0, level=1),
+        "1": Scelta("1", [([], "EXIT")], [([], "MANCANTE")], "Stanza", "R", "L", [], [], turn=1, level=1),
+        "2": Scelta("2", [([], "EXIT")], [([], "0")], "Fine", "R", "L", [], [], is_end=True, level=2, ending_title="La fine"),
+    }
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    json.dump(generateStory(count), sys.stdout)
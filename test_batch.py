@@ -0,0 +1,81 @@
+import unittest
+import random
+from model import Character, ScelteCollection, parseScelte, parseCharacters
+from compiled import CompiledStory, LEFT, RIGHT
+from storygen import edgeCaseNodes, generateStory
+
+try:
+    import numpy as np
+    from batch import BatchEngine
+except ImportError:
+    np = None
+
+@unittest.skipUnless(np is not None, "richiede numpy")
+class TestBatchEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.story = CompiledStory.fromCollection(ScelteCollection(edgeCaseNodes(), {}), [Character(0), Character(1)])
+
+    def test_step_applies_grants_and_requirements(self):
+        """
+        # Test: A destra la sessione 0 ottiene la chiave e arriva al finale, a sinistra si resta senza chiave.
+        """
+        engine = BatchEngine(self.story, 2)
+        engine.step(np.array([RIGHT, LEFT], dtype=np.uint8))
+        self.assertEqual(engine.histogram(), {"2": 1})
+        self.assertEqual(list(engine.node), [0, 1])
+        # La partita conclusa riparte da capo con l'inventario iniziale
+        self.assertEqual(int(engine.inventory[0, 0]), 0)
+        self.assertEqual(engine.transitions, 2)
+
+    def test_exit_and_missing_restart_the_session(self):
+        """
+        # Test: EXIT e le chiavi mancanti chiudono la partita senza contare un finale.
+        """
+        engine = BatchEngine(self.story, 2)
+        engine.node[:] = 1
+        engine.step(np.array([RIGHT, LEFT], dtype=np.uint8))
+        self.assertEqual((engine.exits, engine.broken, engine.histogram()), (1, 1, {}))
+        self.assertEqual(list(engine.node), [0, 0])
+
+    def test_matches_scalar_step(self):
+        """
+        # Test: Su una storia generata il motore vettoriale segue le stesse transizioni di CompiledStory.step.
+        """
+        data = generateStory(300, seed=3)
+        characters = parseCharacters(data["characters"])
+        story = CompiledStory.fromCollection(parseScelte(data["nodes"], data["level_introductions"]), characters)
+        initial = [story.itemMask(c.abilities) for c in characters]
+        engine = BatchEngine(story, 64, initial)
+
+        rng = random.Random(1)
+        nodes = [0] * engine.sessions
+        inventories = [list(initial) for _ in nodes]
+        endings = {}
+        for _ in range(200):
+            choices = [rng.randrange(2) for _ in nodes]
+            engine.step(np.array(choices, dtype=np.uint8))
+            for k, side in enumerate(choices):
+                turn = story.turn[nodes[k]]
+                inventories[k][turn] |= story.grant[nodes[k] * 2 + side]
+                following = story.step(nodes[k], side, inventories[k][turn])
+                if following < 0 or story.isEnd(following):
+                    if following >= 0:
+                        endings[story.key(following)] = endings.get(story.key(following), 0) + 1
+                    following, inventories[k] = 0, list(initial)
+                nodes[k] = following
+            self.assertEqual(list(engine.node), nodes)
+        self.assertEqual(engine.histogram(), endings)
+
+    def test_run_is_reproducible(self):
+        """
+        # Test: Con lo stesso seed le scelte casuali producono lo stesso istogramma.
+        """
+        first, second = BatchEngine(self.story, 100), BatchEngine(self.story, 100)
+        first.run(20, seed=5)
+        second.run(20, seed=5)
+        self.assertEqual(first.histogram(), second.histogram())
+        self.assertEqual(first.transitions, 2000)
+
+if __name__ == "__main__":
+    unittest.main()
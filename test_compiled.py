@@ -0,0 +1,142 @@
+import unittest
+from unittest.mock import patch
+import multiprocessing
+import os
+import pickle
+from model import Character, GameSession, Scelta, ScelteCollection, SingletonMeta, parseScelte
+from compiled import CompiledStory, SharedStory, attachStory, initSharedWorker, sharedWorkerStory, EXIT_ID, MISSING_ID, LEFT, RIGHT
+from prefork import preforkWorkers, uniqueMemory
+from storygen import edgeCaseNodes, generateStory
+
+class TestCompiledStory(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = edgeCaseNodes()
+        self.collection = ScelteCollection(self.nodes, {"1": "Intro"})
+        self.story = CompiledStory.fromCollection(self.collection, [Character(0, abilities=["spada"])])
+
+    def test_tables(self):
+        self.assertEqual(self.story.nodeCount, 3)
+        self.assertEqual(self.story.items(), ["spada", "chiave"])
+        self.assertEqual(list(self.story.turn), [0, 1, 0])
+        self.assertTrue(self.story.isEnd(2))
+        self.assertEqual(self.story.level_introductions, {"1": "Intro"})
+
+    def test_step_follows_requirements(self):
+        chiave = self.story.itemMask(["chiave"])
+        self.assertEqual(self.story.step(0, RIGHT, chiave), 2)
+        self.assertEqual(self.story.step(0, RIGHT, 0), 1)
+        self.assertEqual(self.story.step(1, RIGHT, 0), EXIT_ID)
+        self.assertEqual(self.story.step(1, LEFT, 0), MISSING_ID)
+
+    def test_getScelta_matches_collection(self):
+        for key in ("0", "2"):
+            self.assertEqual(self.story.__getScelta__(key), self.nodes[key])
+
+    def test_works_with_game_session(self):
+        """
+        # Test: La storia compilata si usa al posto di ScelteCollection con GameSession e iteratore.
+        """
+        session = GameSession(self.story, [Character(0, abilities=[])])
+        next_s = session.choose("right", iter(self.story))
+        self.assertEqual(next_s.key, "2")
+        self.assertEqual(next_s.ending_title, "La fine")
+
+    def test_prefetch_warms_successors(self):
+        """
+        # Test: I successori calcolati dalla sessione vengono costruiti in anticipo e riusati da __getScelta__.
+        """
+        session = GameSession(self.story, [Character(0, abilities=[]), Character(1, abilities=[])])
+        successors = session.successors()
+        self.assertEqual(successors, {"left": "1", "right": "2"})
+        warm = self.story.prefetch(list(successors.values()) + ["MANCANTE"])
+        self.assertEqual([s.key for s in warm], ["1", "2"])
+        self.assertIs(self.story.__getScelta__("2"), warm[1])
+        self.assertIs(session.choose("right", iter(self.story)), warm[1])
+
+    def test_generated_story_roundtrip(self):
+        data = generateStory(200)
+        collection = parseScelte(data["nodes"], data["level_introductions"])
+        story = CompiledStory.fromCollection(collection)
+        for key in list(data["nodes"])[:50]:
+            original = collection.__getScelta__(key)
+            compiled = story.__getScelta__(key)
+            self.assertEqual(compiled.text, original.text)
+            self.assertEqual([(sorted(r), k) for r, k in compiled.nextLeft], [(sorted(r), k) for r, k in original.nextLeft])
+
+    def test_too_many_items(self):
+        objects = [f"o{i}" for i in range(65)]
+        collection = ScelteCollection({"0": Scelta("0", [], [], "", "", "", objects, [])})
+        with self.assertRaises(ValueError):
+            CompiledStory.fromCollection(collection)
+
+
+def firstStepFromStart(side):
+    story = sharedWorkerStory()
+    return story.key(story.step(story.nodeId("0"), side, 0))
+
+class TestSharedStory(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        data = generateStory(100)
+        self.collection = parseScelte(data["nodes"], data["level_introductions"])
+        self.story = CompiledStory.fromCollection(self.collection)
+        self.shared = SharedStory(self.story)
+
+    def tearDown(self):
+        self.shared.close()
+
+    def test_attached_view_matches_story(self):
+        """
+        # Test: La vista sulla memoria condivisa espone le stesse scelte della storia originale.
+        """
+        view = attachStory(self.shared.handle)
+        try:
+            self.assertIsInstance(view.turn, memoryview)
+            for key in ("0", "N1", "END_0"):
+                self.assertEqual(view.__getScelta__(key), self.story.__getScelta__(key))
+            self.assertEqual(next(iter(view)).key, self.story.key(self.story.step(0, RIGHT, 0)))
+        finally:
+            view.close()
+
+    def test_handle_is_small(self):
+        self.assertLess(len(pickle.dumps(self.shared.handle)), 1024)
+
+    def test_spawn_pool_workers(self):
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(2, initSharedWorker, (self.shared.handle,)) as pool:
+            results = pool.map(firstStepFromStart, [LEFT, RIGHT])
+        expected = [self.story.key(self.story.step(0, side, 0)) for side in (LEFT, RIGHT)]
+        self.assertEqual(results, expected)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "richiede os.fork")
+class TestPrefork(unittest.TestCase):
+
+    def test_workers_receive_the_story(self):
+        SingletonMeta._instances = {}
+        read_fd, write_fd = os.pipe()
+
+        def worker(index, story, characters):
+            os.write(write_fd, f"{index}:{story.key(story.step(0, LEFT, 0))}\n".encode())
+
+        codes = preforkWorkers("storia.json", 2, worker)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            results = sorted(f.read().split())
+        self.assertEqual(codes, [0, 0])
+        self.assertEqual(results, ["0:1_PIT_ALONE", "1:1_PIT_ALONE"])
+
+    def test_failing_worker_reports_exit_code(self):
+        SingletonMeta._instances = {}
+        with patch("traceback.print_exc"):
+            codes = preforkWorkers("storia.json", 1, lambda index, story, characters: 1 / 0)
+        self.assertEqual(codes, [1])
+
+    @unittest.skipUnless(os.path.exists("/proc/self/smaps_rollup"), "richiede /proc")
+    def test_unique_memory(self):
+        self.assertGreater(uniqueMemory(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
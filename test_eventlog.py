@@ -0,0 +1,141 @@
+import unittest
+import os
+import random
+import tempfile
+from model import Character, GameSession, Scelta, ScelteCollection, SingletonMeta, parseScelte, parseCharacters
+from eventlog import EventLog, ReplayEngine, ReplayError, logFiles, newLogFile, readEvents, splitSessions
+from storygen import generateStory
+
+def play(collection, characters, log: EventLog, choices: int, seed: int) -> GameSession:
+    '''Partita casuale registrata come nel controller; ricomincia dai finali e dalle uscite'''
+    rng = random.Random(seed)
+    session = GameSession(collection, [c.clone() for c in characters])
+    iterator = iter(collection)
+    log.start(session)
+    for _ in range(choices):
+        direction = rng.choice(("left", "right"))
+        scelta = collection.__getScelta__(session.currentSceltaId)
+        next_s = session.choose(direction, iterator)
+        log.choice(direction, scelta, next_s.key)
+        if session.needsLevelIntro(next_s):
+            session.last_viewed_level = next_s.level
+        if next_s.key == "EXIT" or next_s.is_end:
+            session = GameSession(collection, [c.clone() for c in characters])
+            log.start(session)
+    return session
+
+class TestReplayEngine(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        data = generateStory(300, seed=2)
+        self.collection = parseScelte(data["nodes"], data["level_introductions"])
+        self.characters = parseCharacters(data["characters"])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "events.log")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replay_matches_recorded_session(self):
+        """
+        # Test: Rigiocando il registro (anche solo una parte) si ottiene esattamente lo stato della sessione.
+        """
+        log = EventLog()
+        session = play(self.collection, self.characters, log, 500, seed=1)
+        engine = ReplayEngine(self.collection)
+        self.assertEqual(engine.replay(log.events), session.snapshot())
+
+        # Lo stato a metà registro coincide con quello di una partita fermata allo stesso punto
+        partial = EventLog()
+        middle = play(self.collection, self.characters, partial, 250, seed=1)
+        self.assertEqual(engine.replay(log.events, upTo=len(partial.events)), middle.snapshot())
+
+        rebuilt = engine.rebuild(log.events, characters=self.characters)
+        self.assertEqual(rebuilt.snapshot(), session.snapshot())
+        self.assertEqual(rebuilt.characters[0].nickname, self.characters[0].nickname)
+
+    def test_rewind_starts_new_segment(self):
+        """
+        # Test: Dopo un rewind il replay riparte dallo stato registrato nell'evento.
+        """
+        log = EventLog()
+        session = play(self.collection, self.characters, log, 20, seed=5)
+        engine = ReplayEngine(self.collection)
+        earlier = engine.replay(log.events, upTo=5)
+        log.rewind(earlier)
+        self.assertEqual(engine.replay(log.events), earlier)
+        self.assertEqual(engine.validate(log.events), [])
+        self.assertNotEqual(session.snapshot(), earlier)
+
+    def test_log_is_appended_to_file(self):
+        """
+        # Test: Ogni evento è una riga in coda al file; una riga troncata alla fine viene ignorata.
+        """
+        log = EventLog(self.path)
+        play(self.collection, self.characters, log, 50, seed=3)
+        log.save(1, "daniel")
+        log.close(timeout=5)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('["C",0,')
+        self.assertEqual(readEvents(self.path), log.events)
+
+    def test_events_are_written_in_batches(self):
+        """
+        # Test: Gli eventi ravvicinati finiscono su disco con poche scritture, fuori dal thread che li registra.
+        """
+        log = EventLog(self.path, delay=10)
+        play(self.collection, self.characters, log, 200, seed=4)
+        self.assertEqual(log.writes, 0)
+        self.assertTrue(log.flush(timeout=5))
+        self.assertEqual(log.writes, 1)
+        self.assertEqual(readEvents(self.path), log.events)
+        log.close(timeout=5)
+
+    def test_each_run_gets_its_own_file(self):
+        """
+        # Test: Ogni avvio scrive un registro nuovo nella cartella e i più vecchi oltre il limite vengono cancellati.
+        """
+        folder = os.path.join(self.tmp.name, "logs")
+        self.assertEqual(logFiles(folder), [])
+        os.makedirs(folder)
+        for i in range(5):
+            open(os.path.join(folder, f"2026010{i}-000000-1.log"), 'w').close()
+        fileName = newLogFile(folder, keep=3)
+        self.assertEqual(logFiles(folder), ["20260103-000000-1.log", "20260104-000000-1.log"])
+
+        log = EventLog(fileName)
+        play(self.collection, self.characters, log, 10, seed=6)
+        log.close(timeout=5)
+        self.assertEqual(logFiles(folder)[-1], os.path.basename(fileName))
+        self.assertEqual(readEvents(fileName), log.events)
+        self.assertEqual(splitSessions(log.events)[0][0][0], "S")
+
+    def test_validate_reports_changed_story(self):
+        """
+        # Test: Con una nuova versione della storia vengono segnalati solo i tratti che non si possono più rigiocare.
+        """
+        nodes = {
+            "0":   Scelta("0", [([], "END")], [([], "1")], "Inizio", "R", "L", [], [], turn=0, level=1),
+            "1":   Scelta("1", [([], "0")], [([], "END")], "Sala", "R", "L", [], ["chiave"], turn=1, level=1),
+            "END": Scelta("END", [([], "EXIT")], [([], "0")], "Fine", "R", "L", [], [], is_end=True, level=1),
+        }
+        log = EventLog()
+        log.start(GameSession(ScelteCollection(nodes), [Character(0), Character(1)]))
+        log.choice("left", nodes["0"], "1")
+        log.choice("left", nodes["1"], "END")
+        log.start(GameSession(ScelteCollection(nodes), [Character(0), Character(1)]))
+        log.choice("right", nodes["0"], "END")
+
+        self.assertEqual(ReplayEngine(ScelteCollection(nodes)).validate(log.events), [])
+
+        nodes["1"] = Scelta("1", [([], "0")], [([], "0")], "Sala", "R", "L", [], ["chiave"], turn=1, level=1)
+        engine = ReplayEngine(ScelteCollection(nodes))
+        divergences = engine.validate(log.events)
+        self.assertEqual(len(divergences), 1)
+        self.assertEqual((divergences[0].session, divergences[0].index, divergences[0].recorded, divergences[0].replayed), (0, 2, "END", "0"))
+        with self.assertRaises(ReplayError):
+            engine.replay(log.events, upTo=3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
 
 import unittest
 import json
+import os
+import tempfile
+import threading
 from unittest.mock import patch, mock_open
-from model import FileManager, SingletonMeta
+from model import AutosaveWriter, FileManager, SessionSnapshot, SingletonMeta, StoryCache
 
 class TestFileManager(unittest.TestCase):
 
@@ -73,6 +76,18 @@ class TestFileManager(unittest.TestCase):
             with self.assertRaises(json.JSONDecodeError):
                 fm.loadFile("invalid_json.json")
 
+    def test_loadMusic(self):
+        """
+        # Test: La sezione "music" del file di storia; {} se manca, è malformata o il file non esiste.
+        """
+        music = {"scenes": {"GAME": "assets/sounds/game.ogg"}, "levels": {"2": None}}
+        with patch('builtins.open', mock_open(read_data=json.dumps({"nodes": {}, "music": music}))):
+            self.assertEqual(FileManager().loadMusic("storia.json"), music)
+        with patch('builtins.open', mock_open(read_data=json.dumps({"music": ["x"]}))):
+            self.assertEqual(FileManager().loadMusic("storia.json"), {})
+        with patch('builtins.open', side_effect=FileNotFoundError):
+            self.assertEqual(FileManager().loadMusic("storia.json"), {})
+
     def test_loadFile_returns_tuple(self):
         """
         # Test per verificare che il metodo loadFile restituisca una tupla.
@@ -90,5 +105,107 @@ class TestFileManager(unittest.TestCase):
             # Controlliamo se il risultato è una tupla
             self.assertIsInstance(result, tuple, "Il metodo loadFile dovrebbe restituire una tupla.")
 
+
+class TestStoryCache(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "storia.json")
+        self.writeStory("Inizio")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def writeStory(self, text, mtime=None):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"nodes": {"0": {"text": text}}, "characters": {"0": {"nickname": "A", "abilities": ["x"]}}}, f)
+        if mtime is not None:
+            os.utime(self.path, ns=(mtime, mtime))
+
+    def test_second_load_reuses_parsed_story(self):
+        """
+        # Test: La seconda lettura dello stesso file non riapre né rianalizza il file.
+        """
+        cache = StoryCache()
+        collection, characters = cache.load(self.path)
+        with patch.object(FileManager, 'loadFile') as mock_load:
+            again, characters_again = cache.load(self.path)
+            mock_load.assert_not_called()
+        self.assertIs(again, collection)
+        self.assertIs(characters_again, characters)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_changed_file_is_reloaded(self):
+        self.writeStory("Inizio", mtime=1_000_000_000)
+        collection, _ = StoryCache().load(self.path)
+        self.writeStory("Nuovo inizio!", mtime=2_000_000_000)
+        reloaded, _ = StoryCache().load(self.path)
+        self.assertIsNot(reloaded, collection)
+        self.assertEqual(reloaded.__getScelta__("0").text, "Nuovo inizio!")
+
+    def test_invalidate(self):
+        cache = StoryCache()
+        collection, _ = cache.load(self.path)
+        cache.invalidate(self.path)
+        self.assertIsNone(cache.get(self.path))
+        self.assertIsNot(cache.load(self.path)[0], collection)
+
+class TestAutosaveWriter(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "autosave.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def snapshot(self, node):
+        return SessionSnapshot(sceltaId=node, playerId=1, abilities=(("chiave",), ()))
+
+    def test_rapid_changes_are_coalesced(self):
+        """
+        # Test: Molte fotografie ravvicinate producono poche scritture, e su disco resta l'ultima.
+        """
+        writer = AutosaveWriter(self.path, delay=0.2)
+        for i in range(50):
+            writer.submit(self.snapshot(str(i)))
+        self.assertTrue(writer.flush(timeout=5))
+        writer.close()
+
+        self.assertLess(writer.written, 5)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {"name": "Autosave", "node": "49", "turn": 1, "p1_abilities": ["chiave"], "p2_abilities": []})
+        # Nessun file temporaneo rimasto nella cartella
+        self.assertEqual(os.listdir(self.tmp.name), ["autosave.json"])
+
+    def test_submit_does_not_wait_for_the_write(self):
+        """
+        # Test: Anche con il disco bloccato, submit ritorna subito.
+        """
+        fileManager = FileManager()
+        release = threading.Event()
+        with patch.object(fileManager, 'saveFileAtomic', side_effect=lambda *args: release.wait(5)):
+            writer = AutosaveWriter(self.path, fileManager, delay=0)
+            writer.submit(self.snapshot("1"))
+            self.assertFalse(writer.flush(timeout=0.1))
+            writer.submit(self.snapshot("2"))
+            self.assertEqual(writer.latestEntry()["node"], "2")
+            release.set()
+            writer.close(timeout=5)
+        self.assertEqual(writer.written, 2)
+
+    def test_saveFileAtomic_keeps_previous_file_on_error(self):
+        """
+        # Test: Se la serializzazione fallisce il file precedente resta intatto.
+        """
+        fileManager = FileManager()
+        fileManager.saveFileAtomic(self.path, {"node": "1"})
+        fileManager.saveFileAtomic(self.path, {"node": object()})
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {"node": "1"})
+        self.assertEqual(os.listdir(self.tmp.name), ["autosave.json"])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,5 +1,5 @@
 import unittest
-from model import Character, Scelta, GameSession
+from model import Character, Scelta, ScelteCollection, GameSession, SessionSnapshot, SessionHistory
 
 class TestGameSession(unittest.TestCase):
 
@@ -163,5 +163,103 @@ class TestGameSession(unittest.TestCase):
         with self.assertRaises(ZeroDivisionError):
             session_vuota.switchTurn()
 
+    def test_snapshot_restore_roundtrip(self):
+        """
+        Test: Uno snapshot ripristina nodo, turno, abilità e ultimo livello visto.
+        """
+        self.char1.abilities = ["cards"]
+        self.session.last_viewed_level = 1
+        snap = self.session.snapshot()
+
+        self.session.updateCurrentScelta("1_PIT_ALONE")
+        self.session.switchTurn(forced_turn=1)
+        self.char1.updateAbilities(["bow"])
+        self.session.last_viewed_level = 2
+
+        self.session.restore(snap)
+        self.assertEqual(self.session.currentSceltaId, "0")
+        self.assertEqual(self.session.currentPlayerId, 0)
+        self.assertEqual(self.char1.abilities, ["cards"])
+        self.assertEqual(self.session.last_viewed_level, 1)
+
+    def test_snapshot_is_immutable_and_detached(self):
+        """
+        Test: Modificare la sessione non altera uno snapshot già preso.
+        """
+        snap = self.session.snapshot()
+        self.char2.abilities.append("sword")
+        self.assertEqual(snap.abilities[1], ())
+        with self.assertRaises(Exception):
+            snap.sceltaId = "1_PIT_ALONE"
+
+    def test_snapshot_shares_unchanged_abilities(self):
+        """
+        Test: Le abilità invariate vengono condivise con lo snapshot precedente.
+        """
+        first = self.session.snapshot()
+        self.char1.updateAbilities(["cards"])
+        second = self.session.snapshot(previous=first)
+        self.assertIs(second.abilities[1], first.abilities[1])
+        self.assertEqual(second.abilities[0], ("cards",))
+
+    def test_restore_rejects_wrong_character_count(self):
+        snap = SessionSnapshot("0", 0, ((),), -1)
+        with self.assertRaises(ValueError):
+            self.session.restore(snap)
+
+    def test_snapshot_from_save_entry(self):
+        collection = ScelteCollection(self.scelte_dict)
+        entry = {"name": "x", "node": "1_PIT_ALONE", "turn": 1, "p1_abilities": ["cards"], "p2_abilities": []}
+        snap = SessionSnapshot.fromSaveEntry(entry, collection)
+        self.assertEqual(snap, SessionSnapshot("1_PIT_ALONE", 1, (("cards",), ()), 1))
+
+    def test_successors_match_choose(self):
+        """
+        Test: I successori calcolati in anticipo (con gli oggetti che la scelta darebbe) coincidono con quelli di choose, senza modificare la sessione.
+        """
+        nodes = dict(self.scelte_dict)
+        nodes["0"] = Scelta("0", [(["cards"], "1_PIT_ALONE"), ([], "EXIT")], [(["cards"], "EXIT"), ([], "1_PIT_ALONE")],
+                            "Inizio", "R", "L", ["cards"], [], turn=0, level=1)
+        collection = ScelteCollection(nodes)
+        collection.enableTransitionCache()
+        session = GameSession(collection, self.characters)
+        snap = session.snapshot()
+        successors = session.successors()
+        self.assertEqual(successors, {"left": "1_PIT_ALONE", "right": "1_PIT_ALONE"})
+        self.assertEqual(session.snapshot(), snap)
+
+        for side, key in successors.items():
+            self.assertEqual(session.choose(side, iter(collection)).key, key)
+            session.restore(snap)
+
+    def test_history_rewind(self):
+        """
+        Test: Tornando indietro di N scelte si ritrova lo stato di allora; oltre l'inizio ci si ferma al primo.
+        """
+        history = SessionHistory()
+        history.reset(self.session.snapshot())
+        start = history.latest()
+        self.char1.updateAbilities(["cards"])
+        self.session.updateCurrentScelta("1_PIT_ALONE")
+        history.push(self.session.snapshot(history.latest()))
+        self.char2.updateAbilities(["tree_bridge"])
+        history.push(self.session.snapshot(history.latest()))
+
+        # Ogni passo condivide con il precedente le abilità non cambiate
+        self.assertIs(history.latest().abilities[0], history._snapshots[1].abilities[0])
+        self.assertIs(history._snapshots[1].abilities[1], start.abilities[1])
+
+        self.assertEqual(history.steps, 2)
+        self.assertEqual(history.rewind(1).abilities, (("cards",), ()))
+        self.assertIs(history.rewind(5), start)
+        self.assertIsNone(history.rewind())
+
+    def test_history_drops_oldest_steps(self):
+        history = SessionHistory(maxSteps=3)
+        for i in range(10):
+            history.push(SessionSnapshot(str(i), 0, ((),), -1))
+        self.assertEqual(history.steps, 3)
+        self.assertEqual(history.rewind(10).sceltaId, "6")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
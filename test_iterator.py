@@ -1,5 +1,5 @@
 import unittest
-from model import Scelta, ScelteCollection, ScelteIterator
+from model import Scelta, ScelteCollection, ScelteIterator, TransitionCache
 
 class TestScelta(unittest.TestCase):
     """
@@ -108,5 +108,58 @@ class TestScelteIterator(unittest.TestCase):
         next_scelta = self.iterator.getRight(inventory)
         self.assertEqual(next_scelta.key, "2")
 
+
+class TestTransitionCache(unittest.TestCase):
+    """
+    Test per la cache LRU delle transizioni.
+    """
+    def setUp(self):
+        self.scelta_0 = Scelta("0", [(["chiave"], "2"), ([], "1")], [([], "1")], "Inizio", "R", "L", [], [])
+        self.scelta_1 = Scelta("1", [], [], "Stanza 1", "-", "-", [], [])
+        self.scelta_2 = Scelta("2", [], [], "Stanza 2", "-", "-", [], [])
+        self.collection = ScelteCollection({"0": self.scelta_0, "1": self.scelta_1, "2": self.scelta_2})
+        self.cache = self.collection.enableTransitionCache(maxSize=2)
+
+    def test_repeated_transition_hits_cache(self):
+        for _ in range(3):
+            iterator = iter(self.collection)
+            self.assertEqual(iterator.getRight(["chiave"]).key, "2")
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 2)
+        self.assertAlmostEqual(self.cache.hitRate(), 2 / 3)
+
+    def test_inventory_is_part_of_the_key(self):
+        """
+        # Test: Lo stesso nodo con inventari diversi porta a nodi diversi.
+        """
+        self.assertEqual(iter(self.collection).getRight(["chiave"]).key, "2")
+        self.assertEqual(iter(self.collection).getRight([]).key, "1")
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_cache_is_bounded(self):
+        iter(self.collection).getRight(["chiave"])
+        iter(self.collection).getRight([])
+        iter(self.collection).getLeft([])
+        self.assertEqual(len(self.cache), 2)
+
+    def test_reload_invalidates_cache(self):
+        self.assertEqual(iter(self.collection).getRight(["chiave"]).key, "2")
+        nuova_0 = Scelta("0", [([], "1")], [([], "1")], "Inizio", "R", "L", [], [])
+        self.collection.reload({"0": nuova_0, "1": self.scelta_1})
+        self.assertEqual(iter(self.collection).getRight(["chiave"]).key, "1")
+
+    def test_explicit_cache_follows_collection_generation(self):
+        cache = TransitionCache()
+        collection = ScelteCollection({"0": self.scelta_0, "1": self.scelta_1, "2": self.scelta_2})
+        ScelteIterator(collection, cache).getRight(["chiave"])
+        collection.reload({"0": Scelta("0", [([], "1")], [], "", "", "", [], []), "1": self.scelta_1})
+        self.assertEqual(ScelteIterator(collection, cache).getRight(["chiave"]).key, "1")
+
+    def test_missing_requirement_still_raises(self):
+        collection = ScelteCollection({"0": Scelta("0", [(["chiave"], "1")], [], "", "", "", [], []), "1": self.scelta_1})
+        collection.enableTransitionCache()
+        with self.assertRaises(ValueError):
+            iter(collection).getRight([])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
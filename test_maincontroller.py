@@ -3,7 +3,9 @@ from unittest.mock import patch, MagicMock, mock_open
 import json
 import sys
 from model import Character, Scelta, ScelteCollection, GameSession, FileManager, SingletonMeta
+import controller
 from controller import MainController
+from view import PreparedScene
 
 class TestMainController(unittest.TestCase):
 
@@ -38,7 +40,9 @@ class TestMainController(unittest.TestCase):
             patch('controller.Image', MagicMock()),
             patch('controller.MultiLineText', MagicMock()),
             patch('controller.pygame', self.pygame_mock),
-            patch('controller.GameView', return_value=self.view_mock)
+            patch('controller.GameView', return_value=self.view_mock),
+            patch('controller.AutosaveWriter', MagicMock()),
+            patch('controller.EventLog', MagicMock())
         ]
         
         for p in self.obj_patchers:
@@ -186,6 +190,19 @@ class TestMainController(unittest.TestCase):
             self.assertIsInstance(self.controller.session, GameSession)
             self.assertIsNotNone(self.controller.iterator)
 
+    def test_readGameFile_reuses_cached_story(self):
+        with patch.object(self.controller.fileManager, 'loadFile', wraps=self.controller.fileManager.loadFile) as mock_load:
+            self.controller.readGameFile("storia.json", show_intro=False)
+            first = self.controller.session
+            first.characters[0].abilities.append("cards")
+            self.controller.readGameFile("storia.json", show_intro=False)
+            mock_load.assert_called_once()
+
+        # La collezione è condivisa, i personaggi no
+        self.assertIs(self.controller.session.scelteCollection, first.scelteCollection)
+        self.assertIsNot(self.controller.session.characters[0], first.characters[0])
+        self.assertEqual(self.controller.session.characters[0].abilities, [])
+
     def test_readGameFile_file_not_found(self):
         with patch.object(self.controller.fileManager, 'loadFile', side_effect=FileNotFoundError("File not found")):
             with self.assertRaises(FileNotFoundError):
@@ -366,6 +383,300 @@ class TestMainController(unittest.TestCase):
         
         self.assertIn("chiave", character.abilities)
 
+    def test_loadGame_swaps_state_without_reading_story(self):
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[([], "1")], nextRight=[], rightText="", leftText="",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelta_1 = Scelta(
+            key="1", text="Stanza 1", nextLeft=[], nextRight=[], rightText="", leftText="",
+            rightObjects=[], leftObjects=[], turn=1, level=2
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "1": scelta_1})
+        session = GameSession(scelteCollection=scelte_collection, characters=[Character(0, abilities=[]), Character(1, abilities=[])])
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.controller.updateView = MagicMock()
+        self.controller.save_data = {
+            "1": {"name": "Slot", "node": "1", "turn": 1, "p1_abilities": ["chiave"], "p2_abilities": ["spada"]}
+        }
+
+        with patch.object(self.controller, 'readGameFile') as mock_read:
+            self.controller.loadGame(1)
+            mock_read.assert_not_called()
+
+        self.assertIs(self.controller.session, session)
+        self.assertEqual(session.currentSceltaId, "1")
+        self.assertEqual(session.currentPlayerId, 1)
+        self.assertEqual(session.last_viewed_level, 2)
+        self.assertEqual(session.characters[1].abilities, ["spada"])
+        self.assertEqual(self.controller.iterator._position, "1")
+
+    def test_showEndingsMenu_shows_shortest_path_length(self):
+        """
+        # Test: I finali bloccati mostrano quante scelte servono al minimo, calcolate una sola volta.
+        """
+        fine = Scelta(
+            key="FINE", text="Fine", nextLeft=[([], "0")], nextRight=[([], "EXIT")], rightText="", leftText="",
+            rightObjects=[], leftObjects=[], is_end=True, level=1, ending_title="La fine"
+        )
+        collection = ScelteCollection({"FINE": fine})
+        self.controller.session = GameSession(scelteCollection=collection, characters=[Character(0)])
+        self.controller.fileManager.loadSaves = MagicMock(return_value={})
+
+        with patch('controller.solveStory', return_value={"FINE": ["left", "right", "left"]}) as mock_solve, \
+             patch('controller.Text') as MockText:
+            self.controller.showEndingsMenu()
+            self.controller.showEndingsMenu()
+            mock_solve.assert_called_once()
+        texts = [c.args[1] for c in MockText.call_args_list]
+        self.assertIn("• ???????????????  (3 choices)", texts)
+
+    def test_getHint_ignores_unlocked_endings(self):
+        """
+        # Test: Il suggerimento considera solo i finali non ancora sbloccati, con le abilità attuali.
+        """
+        nodes = {
+            "0":    Scelta("0", [([], "1")], [([], "1")], "Inizio", "R", "L", [], ["chiave"], turn=0, level=1),
+            "1":    Scelta("1", [([], "2")], [([], "LOSE")], "Corridoio", "R", "L", [], [], turn=1, level=1),
+            "2":    Scelta("2", [(["chiave"], "WIN"), ([], "LOSE")], [([], "1")], "Porta", "Apri", "Torna", [], [], turn=0, level=1),
+            "WIN":  Scelta("WIN", [([], "EXIT")], [([], "0")], "Vittoria", "R", "L", [], [], is_end=True, level=1, ending_title="Vittoria"),
+            "LOSE": Scelta("LOSE", [([], "EXIT")], [([], "0")], "Sconfitta", "R", "L", [], [], is_end=True, level=1, ending_title="Sconfitta"),
+        }
+        self.controller.session = GameSession(ScelteCollection(nodes), [Character(0, abilities=["chiave"]), Character(1)], currentSceltaId="2")
+        self.controller.storyCharacters = [Character(0), Character(1)]
+
+        self.controller.save_data = {"unlocked_endings": []}
+        self.assertEqual(self.controller.getHint(), "Both choices can still lead to endings you have not found yet.")
+        index = self.controller.hints
+
+        self.controller.save_data = {"unlocked_endings": ["WIN"]}
+        self.assertEqual(self.controller.getHint(), 'Choosing "Torna" can still lead to an ending you have not found yet.')
+        # L'indice non viene ricostruito a ogni richiesta
+        self.assertIs(self.controller.hints, index)
+
+    def test_nextScelta_submits_autosave(self):
+        """
+        # Test: Ogni scelta consegna una fotografia al salvataggio automatico, senza scrivere sul thread della UI.
+        """
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[([], "1")], nextRight=[], rightText="", leftText="",
+            rightObjects=[], leftObjects=["chiave"], turn=0, level=1
+        )
+        scelta_1 = Scelta(
+            key="1", text="Stanza 1", nextLeft=[], nextRight=[], rightText="", leftText="",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "1": scelta_1})
+        session = GameSession(scelteCollection=scelte_collection, characters=[Character(0, abilities=[])])
+        session.last_viewed_level = 1
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.controller.updateView = MagicMock()
+        self.controller.fileManager.saveFile = MagicMock()
+
+        self.controller.nextScelta("left")
+
+        snapshot = self.controller.autosave.submit.call_args.args[0]
+        self.assertEqual((snapshot.sceltaId, snapshot.abilities), ("1", (("chiave",),)))
+        self.controller.fileManager.saveFile.assert_not_called()
+        # La scelta finisce anche nel registro degli eventi, con il nodo di partenza
+        self.controller.eventLog.choice.assert_called_once_with("left", scelta_0, "1")
+
+    def test_rewind_restores_previous_choice(self):
+        """
+        # Test: Rewind riporta alla scelta precedente, con le abilità di allora, senza rileggere la storia.
+        """
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[([], "1")], nextRight=[], rightText="", leftText="Vai",
+            rightObjects=[], leftObjects=["chiave"], turn=0, level=1
+        )
+        scelta_1 = Scelta(
+            key="1", text="Stanza 1", nextLeft=[([], "0")], nextRight=[], rightText="", leftText="Torna",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "1": scelta_1})
+        session = GameSession(scelteCollection=scelte_collection, characters=[Character(0, abilities=[])])
+        session.last_viewed_level = 1
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.controller.fileManager.saveFile = MagicMock()
+
+        self.controller.nextScelta("left")
+        self.controller.nextScelta("left")
+        self.assertEqual(self.controller.history.steps, 2)
+
+        with patch('controller.StoryCache') as MockCache, \
+             patch.object(self.controller.fileManager, 'loadSaves') as mock_load:
+            self.controller.rewind(2)
+            MockCache.assert_not_called()
+            mock_load.assert_not_called()
+
+        self.assertEqual(session.currentSceltaId, "0")
+        self.assertEqual(session.characters[0].abilities, [])
+        self.assertEqual(self.controller.iterator._position, "0")
+        self.controller.eventLog.rewind.assert_called_once()
+        # Dopo il rewind si continua a giocare normalmente
+        self.controller.nextScelta("left")
+        self.assertEqual((session.currentSceltaId, session.characters[0].abilities), ("1", ["chiave"]))
+
+    def test_prepared_scenes_follow_choices(self):
+        """
+        # Test: Nel tempo libero si preparano le scene delle due scelte e del menu INFO senza toccare la sessione; al click si usa quella giusta.
+        """
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[([], "1")], nextRight=[([], "2")], rightText="Destra", leftText="Vai",
+            rightObjects=[], leftObjects=["chiave"], turn=0, level=1
+        )
+        scelta_1 = Scelta(
+            key="1", text="Stanza 1", nextLeft=[([], "0")], nextRight=[], rightText="", leftText="Torna",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelta_2 = Scelta(
+            key="2", text="Livello 2", nextLeft=[([], "0")], nextRight=[], rightText="", leftText="Torna",
+            rightObjects=[], leftObjects=[], turn=0, level=2
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "1": scelta_1, "2": scelta_2})
+        session = GameSession(scelteCollection=scelte_collection, characters=[Character(0, abilities=[])])
+        session.last_viewed_level = 1
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.view_mock.current_scene = "GAME"
+        self.view_mock.prepareScene.side_effect = lambda scene, objects: PreparedScene(scene, objects, None, 0)
+
+        before = session.snapshot()
+        while self.controller.prepareScenes():
+            pass
+        self.assertEqual(session.snapshot(), before)
+        self.assertEqual(self.controller.iterator._position, "0")
+        self.assertEqual({key: p.scene for key, p in self.controller.prepared.items()},
+                         {"left": "GAME", "right": "LEVEL_INTRO", "INFO": "INFO"})
+
+        left = self.controller.prepared["left"]
+        self.view_mock.setSceneObjects.reset_mock()
+        self.controller.nextScelta("left")
+        self.view_mock.showPrepared.assert_called_once_with(left)
+        self.view_mock.setSceneObjects.assert_not_called()
+        self.assertEqual(self.controller.prepared, {})
+
+        # Con lo stato cambiato dopo la preparazione la scena viene ricostruita
+        self.controller.prepareScenes()
+        session.characters[0].abilities.append("mappa")
+        self.controller.nextScelta("left")
+        self.assertEqual(self.view_mock.showPrepared.call_count, 1)
+        self.view_mock.setSceneObjects.assert_called_once()
+
+    def test_unprepared_choice_still_fades(self):
+        """
+        # Test: Una scelta sfuma sul nodo nuovo anche quando la scena non è stata preparata in anticipo.
+        """
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[([], "1")], nextRight=[([], "1")], rightText="Destra", leftText="Sinistra",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelta_1 = Scelta(
+            key="1", text="Stanza", nextLeft=[([], "0")], nextRight=[([], "0")], rightText="Torna", leftText="Torna",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "1": scelta_1})
+        session = GameSession(scelteCollection=scelte_collection, characters=[Character(0, abilities=[])])
+        session.last_viewed_level = 1
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.view_mock.current_scene = "GAME"
+
+        self.controller.nextScelta("left")
+        self.view_mock.showPrepared.assert_not_called()
+        self.assertEqual([c[0] for c in self.view_mock.mock_calls if c[0] in ("startTransition", "setSceneObjects")],
+                         ["startTransition", "setSceneObjects"])
+
+        # Aggiornare la scena senza una scelta (per esempio il volume) non sfuma
+        self.view_mock.startTransition.reset_mock()
+        self.controller.updateView()
+        self.view_mock.startTransition.assert_not_called()
+
+    def test_prepareScenes_skips_broken_sides(self):
+        """
+        # Test: Un lato che porta a un nodo mancante o senza opzioni percorribili non viene preparato e non interrompe il gioco.
+        """
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[([], "1")], nextRight=[(["spada"], "1"), ([], "MANCANTE")], rightText="Attacca", leftText="Vai",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelta_1 = Scelta(
+            key="1", text="Stanza", nextLeft=[(["spada"], "0")], nextRight=[([], "0")], rightText="Torna", leftText="Combatti",
+            rightObjects=[], leftObjects=[], turn=0, level=1
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "1": scelta_1})
+        session = GameSession(scelteCollection=scelte_collection, characters=[Character(0, abilities=[])])
+        session.last_viewed_level = 1
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.controller.audio = MagicMock()
+        self.view_mock.current_scene = "GAME"
+        self.view_mock.prepareScene.side_effect = lambda scene, objects: PreparedScene(scene, objects, None, 0)
+
+        before = session.snapshot()
+        while self.controller.prepareScenes():
+            pass
+        self.assertEqual(session.snapshot(), before)
+        self.assertEqual(self.controller.iterator._position, "0")
+        self.assertIsNone(self.controller.prepared["right"])
+        self.assertEqual(self.controller.prepared["left"].scene, "GAME")
+
+        # Nel nodo "1" il lato sinistro non ha opzioni percorribili senza la spada
+        session.updateCurrentScelta("1")
+        while self.controller.prepareScenes():
+            pass
+        self.assertIsNone(self.controller.prepared["left"])
+        self.assertEqual(self.controller.prepared["right"].scene, "GAME")
+
+    def test_prefetch_successors_while_reading(self):
+        """
+        # Test: Prima delle scene si risolvono i nodi successivi e si caricano ritratto e musica, senza toccare la sessione.
+        """
+        scelta_0 = Scelta(
+            key="0", text="Inizio", nextLeft=[(["chiave"], "2"), ([], "1")], nextRight=[([], "EXIT")], rightText="Esci", leftText="Apri",
+            rightObjects=[], leftObjects=["chiave"], turn=0, level=1
+        )
+        scelta_2 = Scelta(
+            key="2", text="Livello 2", nextLeft=[([], "0")], nextRight=[], rightText="", leftText="Torna",
+            rightObjects=[], leftObjects=[], turn=1, level=2
+        )
+        scelte_collection = ScelteCollection({"0": scelta_0, "2": scelta_2}, {"2": "Secondo livello"})
+        characters = [Character(0, abilities=[]), Character(1, abilities=[], image_path="assets/characters/p2.png")]
+        session = GameSession(scelteCollection=scelte_collection, characters=characters)
+        session.last_viewed_level = 1
+        self.controller.session = session
+        self.controller.iterator = iter(scelte_collection)
+        self.controller.audio = MagicMock()
+        self.controller.audio.music_for.side_effect = lambda scene, level: f"{scene}_{level}.ogg"
+        self.view_mock.current_scene = "GAME"
+
+        before = session.snapshot()
+        with patch('controller.load_image') as mock_load:
+            self.assertTrue(self.controller.prepareScenes())
+            mock_load.assert_called_once_with("assets/characters/p2.png")
+        self.assertEqual(self.controller.successors, [scelta_2])
+        self.view_mock.prepareScene.assert_not_called()
+        self.assertEqual(session.snapshot(), before)
+        self.assertEqual(self.controller.iterator._position, "0")
+
+        controller.MultiLineText.assert_not_called()
+        self.assertEqual([c.args[0] for c in self.controller.audio.preload_music.call_args_list],
+                         ["LEVEL_INTRO_2.ogg", "GAME_2.ogg"])
+
+    def test_loadAutosave_prefers_latest_snapshot(self):
+        """
+        # Test: La fotografia non ancora scritta su disco è la più recente e viene caricata per prima.
+        """
+        self.controller.autosave.latestEntry.return_value = {"name": "Autosave", "node": "1", "turn": 0, "p1_abilities": [], "p2_abilities": []}
+        with patch.object(self.controller, 'restoreSaveEntry') as mock_restore, \
+             patch.object(self.controller.fileManager, 'loadSaves') as mock_load:
+            self.controller.loadAutosave()
+            mock_load.assert_not_called()
+            self.assertEqual(mock_restore.call_args.args[0]["node"], "1")
+
     def test_handleEvents_quit_event(self):
         mock_event_quit = MagicMock()
         mock_event_quit.type = 256
@@ -375,6 +686,22 @@ class TestMainController(unittest.TestCase):
             self.controller.handleEvents()
             self.assertFalse(self.controller.running)
 
+    def test_handleEvents_key_skips_reveal(self):
+        """
+        # Test: Con un testo ancora in rivelazione il tasto lo completa soltanto; altrimenti fa la sua azione.
+        """
+        key_event = MagicMock(type=self.pygame_mock.KEYDOWN, key=self.pygame_mock.K_BACKSPACE)
+        self.controller.view.current_scene = "GAME"
+        self.controller.rewind = MagicMock()
+        with patch('controller.pygame.event.get', return_value=[key_event]):
+            self.controller.view.skipReveal.return_value = True
+            self.controller.handleEvents()
+            self.controller.rewind.assert_not_called()
+
+            self.controller.view.skipReveal.return_value = False
+            self.controller.handleEvents()
+            self.controller.rewind.assert_called_once()
+
     def test_handleEvents_mouse_click_left(self):
         scelta = Scelta(
             key="0", text="Test", nextLeft=[([], "1")], nextRight=[], rightText="", leftText="Left Button",
@@ -496,5 +823,28 @@ class TestMainController(unittest.TestCase):
                         
                         self.view_mock.initScreen.assert_called_once()
 
+    def test_gameLoop_idle_waits_for_events(self):
+        """
+        # Test: Dopo il primo frame, senza animazioni il ciclo dorme su event.wait; il timeout non ridisegna e l'evento che lo sveglia arriva a handleEvents.
+        """
+        click = MagicMock(type=self.pygame_mock.MOUSEBUTTONDOWN)
+        timeout = MagicMock(type=self.pygame_mock.NOEVENT)
+        self.view_mock.isAnimating.return_value = False
+        handled = []
+        def handle():
+            handled.append(list(self.controller.pendingEvents))
+            self.controller.running = len(handled) < 2
+
+        self.controller.audio = MagicMock()
+        self.controller.showMainMenu = MagicMock()
+        self.controller.handleEvents = MagicMock(side_effect=handle)
+        with patch('sys.exit'), patch('controller.pygame.event.wait', side_effect=[timeout, click]) as wait:
+            self.controller.gameLoop()
+
+        wait.assert_called_with(controller.IDLE_WAIT_MS)
+        self.assertEqual(wait.call_count, 2)
+        self.assertEqual(handled, [[], [click]])
+        self.assertEqual(self.view_mock.render.call_count, 2)
+
 if __name__ == '__main__':
     unittest.main()
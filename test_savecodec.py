@@ -0,0 +1,139 @@
+import unittest
+import json
+import os
+import tempfile
+from model import Character, FileManager, Scelta, ScelteCollection, SingletonMeta
+from savecodec import IncompatibleSaveError, SaveCodec, SaveFormatError, isBinarySave
+
+class TestSaveCodec(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        nodes = {
+            "0":   Scelta("0", [([], "1")], [([], "WIN")], "Inizio", "R", "L", [], ["chiave"], turn=0, level=1),
+            "1":   Scelta("1", [(["chiave"], "WIN")], [([], "0")], "Porta", "R", "L", ["spada"], [], turn=1, level=1),
+            "WIN": Scelta("WIN", [([], "EXIT")], [([], "0")], "Vittoria", "R", "L", [], [], is_end=True, level=1, ending_title="Vittoria"),
+        }
+        self.collection = ScelteCollection(nodes)
+        self.characters = [Character(0, abilities=["carte"]), Character(1)]
+        self.codec = SaveCodec.fromCollection(self.collection, self.characters)
+        # Un'altra versione della storia: un nodo rinominato sposta gli indici dei riferimenti
+        renamed = {("VITTORIA" if key == "WIN" else key): scelta for key, scelta in nodes.items()}
+        self.other = SaveCodec.fromCollection(ScelteCollection(renamed), self.characters)
+        self.data = {
+            "unlocked_endings": ["WIN"],
+            "1": {"name": "daniel", "node": "1", "turn": 1, "p1_abilities": ["carte", "chiave"], "p2_abilities": ["spada"]},
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "saves.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        """
+        # Test: Il contenuto codificato torna identico e occupa molto meno del JSON indentato.
+        """
+        raw = self.codec.encode(self.data)
+        self.assertTrue(self.codec.detect(raw))
+        self.assertEqual(self.codec.decode(raw), self.data)
+        self.assertLess(len(raw) * 5, len(json.dumps(self.data, indent=4)))
+
+    def test_unknown_values_and_extra_fields_survive(self):
+        """
+        # Test: Oggetti e nodi che la storia non conosce, e i campi aggiuntivi, restano nel salvataggio.
+        """
+        self.data["1"]["p2_abilities"].append("amuleto")
+        self.data["1"]["node"] = "NODO_RIMOSSO"
+        self.data["1"]["turn"] = None
+        self.data["1"]["difficulty"] = "hard"
+        self.data["profile"] = {"lang": "it"}
+        self.assertEqual(self.codec.decode(self.codec.encode(self.data)), self.data)
+
+    def test_other_story_is_rejected(self):
+        """
+        # Test: Un salvataggio di un'altra versione della storia non viene interpretato.
+        """
+        raw = self.codec.encode(self.data)
+        with self.assertRaises(IncompatibleSaveError):
+            self.other.decode(raw)
+        with self.assertRaises(SaveFormatError):
+            self.codec.decode(raw[:20])
+
+    def test_text_edits_keep_saves(self):
+        """
+        # Test: Correggere i testi della storia non rende illeggibili i salvataggi: conta solo l'elenco di nodi e oggetti.
+        """
+        raw = self.codec.encode(self.data)
+        edited = {key: Scelta(key, s.nextRight, s.nextLeft, s.text + "!", s.rightText, s.leftText, s.rightObjects, s.leftObjects,
+                              turn=s.turn, is_end=s.is_end, level=s.level, ending_title=s.ending_title)
+                  for key, s in self.collection._collection.items()}
+        self.assertEqual(SaveCodec.fromCollection(ScelteCollection(edited), self.characters).decode(raw), self.data)
+
+    def test_json_layout_is_migrated(self):
+        """
+        # Test: Il vecchio saves.json viene letto e completato dei campi mancanti.
+        """
+        old = {"2": {"node": "0", "p1_abilities": ["carte"]}}
+        data = self.codec.load(json.dumps(old).encode("utf-8"))
+        self.assertEqual(data, {
+            "unlocked_endings": [],
+            "2": {"node": "0", "name": "Slot 2", "turn": 0, "p1_abilities": ["carte"], "p2_abilities": []},
+        })
+
+    def test_filemanager_detects_format(self):
+        """
+        # Test: Con il codec registrato il file si scrive in binario, e loadSaves legge sia il binario sia il JSON.
+        """
+        fileManager = FileManager()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=4)
+        fileManager.registerCodec(self.path, self.codec)
+        self.assertEqual(fileManager.loadSaves(self.path), self.data)
+
+        fileManager.saveFile(self.path, self.data)
+        with open(self.path, 'rb') as f:
+            self.assertTrue(self.codec.detect(f.read()))
+        self.assertEqual(fileManager.loadSaves(self.path), self.data)
+
+    def test_binary_file_is_read_without_compact_writes(self):
+        """
+        # Test: Con il codec registrato solo per leggere un saves.json binario viene letto e poi riscritto in JSON, senza perdere dati.
+        """
+        fileManager = FileManager()
+        with open(self.path, 'wb') as f:
+            f.write(self.codec.encode(self.data))
+        fileManager.registerCodec(self.path, self.codec, write=False)
+        data = fileManager.loadSaves(self.path)
+        self.assertEqual(data, self.data)
+
+        fileManager.saveFile(self.path, data)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), self.data)
+
+    def test_binary_file_without_codec_is_kept_aside(self):
+        """
+        # Test: Senza codec un saves.json binario viene riconosciuto e copiato da parte, così il primo salvataggio non lo cancella.
+        """
+        fileManager = FileManager()
+        raw = self.codec.encode(self.data)
+        with open(self.path, 'wb') as f:
+            f.write(raw)
+        self.assertTrue(isBinarySave(self.path))
+        self.assertEqual(fileManager.loadSaves(self.path), {})
+        with open(self.path + ".bak", 'rb') as f:
+            self.assertEqual(f.read(), raw)
+
+    def test_incompatible_file_is_kept_aside(self):
+        """
+        # Test: Se la storia è cambiata loadSaves restituisce un profilo vuoto ma conserva una copia del file.
+        """
+        fileManager = FileManager()
+        with open(self.path, 'wb') as f:
+            f.write(self.codec.encode(self.data))
+        fileManager.registerCodec(self.path, self.other)
+        self.assertEqual(fileManager.loadSaves(self.path), {})
+        self.assertTrue(os.path.exists(self.path + ".bak"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+from model import SingletonMeta
+from server import GameServer, ClientSession, MAX_LINE
+
+class TestClientSession(unittest.TestCase):
+    """
+    Test dei comandi del server senza rete, sulla storia reale (storia.json).
+    """
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        self.server = GameServer("storia.json")
+        self.client = ClientSession(self.server, "alice")
+
+    def test_new_game_state(self):
+        response = self.client.handle({"cmd": "new"})
+        self.assertTrue(response["ok"])
+        self.assertEqual(response["node"], "0")
+        self.assertEqual(response["player"], "The Avenger")
+        self.assertIn("intro", response)
+
+    def test_choose_grants_objects_and_moves(self):
+        response = self.client.handle({"cmd": "choose", "dir": "left"})
+        self.assertEqual(response["node"], "1_PIT_ALONE")
+        self.assertEqual(response["turn"], 1)
+        self.assertEqual(self.client.session.characters[0].abilities, ["cards"])
+
+    def test_sessions_share_the_collection(self):
+        other = ClientSession(self.server, "bob")
+        self.client.handle({"cmd": "choose", "dir": "left"})
+        self.assertIs(other.session.scelteCollection, self.client.session.scelteCollection)
+        self.assertEqual(other.session.characters[0].abilities, [])
+
+    def test_save_and_load(self):
+        self.client.handle({"cmd": "choose", "dir": "right"})
+        self.assertEqual(self.client.handle({"cmd": "save", "slot": "2"}), {"ok": True})
+        self.client.handle({"cmd": "choose", "dir": "right"})
+        response = self.client.handle({"cmd": "load", "slot": "2"})
+        self.assertEqual(response["node"], "1_PIT_GUIDED")
+        self.assertFalse(self.client.handle({"cmd": "load", "slot": "3"})["ok"])
+
+    def test_ending_is_unlocked(self):
+        self.client.handle({"cmd": "choose", "dir": "left"})
+        response = self.client.handle({"cmd": "choose", "dir": "right"})
+        self.assertTrue(response["is_end"])
+        endings = self.client.handle({"cmd": "endings"})["endings"]
+        unlocked = [e["key"] for e in endings if e["unlocked"]]
+        self.assertEqual(unlocked, ["FAIL_JUMP"])
+
+    def test_exit_starts_a_new_game(self):
+        self.client.handle({"cmd": "choose", "dir": "left"})
+        self.client.handle({"cmd": "choose", "dir": "right"})
+        response = self.client.handle({"cmd": "choose", "dir": "right"})
+        self.assertTrue(response["exit"])
+        self.assertEqual(response["node"], "0")
+
+    def test_invalid_commands(self):
+        self.assertFalse(self.client.handle({"cmd": "fly"})["ok"])
+        self.assertFalse(self.client.handle({"cmd": "choose", "dir": "up"})["ok"])
+        for request in ([1], 5, "state", None):
+            self.assertEqual(self.client.handle(request), {"ok": False, "error": "Request must be a JSON object"})
+
+    def test_saves_are_shared_through_the_saves_folder(self):
+        """
+        # Test: Con una cartella di salvataggi slot e finali sbloccati di un giocatore con nome sono visti da ogni processo del server, come dopo una riconnessione.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            server = GameServer("storia.json", savesDir=tmp)
+            first = ClientSession(server, "alice")
+            first.handle({"cmd": "choose", "dir": "right"})
+            first.handle({"cmd": "save", "slot": "2"})
+            first.handle({"cmd": "new"})
+            first.handle({"cmd": "choose", "dir": "left"})
+            first.handle({"cmd": "choose", "dir": "right"})
+            # Le scritture avvengono in background: un profilo per giocatore, una scrittura per le modifiche ravvicinate
+            server.close()
+            self.assertEqual(os.listdir(tmp), ["alice.json"])
+            self.assertEqual(server.writer.written, 1)
+
+            # Un altro worker: stessa cartella, nulla in memoria
+            second = ClientSession(GameServer("storia.json", savesDir=tmp), "guest-1", guest=True)
+            self.assertEqual(second.handle({"cmd": "new", "player": "alice"})["node"], "0")
+            self.assertEqual(second.handle({"cmd": "load", "slot": "2"})["node"], "1_PIT_GUIDED")
+            unlocked = [e["key"] for e in second.handle({"cmd": "endings"})["endings"] if e["unlocked"]]
+            self.assertEqual(unlocked, ["FAIL_JUMP"])
+            self.assertFalse(ClientSession(second.server, "bob").handle({"cmd": "load", "slot": "2"})["ok"])
+
+            # Gli ospiti restano in memoria
+            guest = ClientSession(second.server, "guest-2", guest=True)
+            guest.handle({"cmd": "save", "slot": "1"})
+            second.server.close()
+            self.assertEqual(os.listdir(tmp), ["alice.json"])
+
+
+class TestGameServerProtocol(unittest.TestCase):
+
+    def test_line_delimited_json_over_tcp(self):
+        """
+        # Test: Due client connessi contemporaneamente hanno partite indipendenti.
+        """
+        SingletonMeta._instances = {}
+
+        async def scenario():
+            server = GameServer("storia.json")
+            listener = await server.start("127.0.0.1", 0)
+            port = listener.sockets[0].getsockname()[1]
+
+            async def call(reader, writer, request):
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                return json.loads(await reader.readline())
+
+            r1, w1 = await asyncio.open_connection("127.0.0.1", port)
+            r2, w2 = await asyncio.open_connection("127.0.0.1", port)
+            first = await call(r1, w1, {"cmd": "choose", "dir": "left"})
+            second = await call(r2, w2, {"cmd": "state"})
+            broken = await call(r2, w2, {"cmd": "choose"})
+            notObject = await call(r2, w2, [1])
+            for w in (w1, w2):
+                w.close()
+            listener.close()
+            await listener.wait_closed()
+            return first, second, broken, notObject
+
+        first, second, broken, notObject = asyncio.run(scenario())
+        self.assertEqual(first["node"], "1_PIT_ALONE")
+        self.assertEqual(second["node"], "0")
+        self.assertFalse(broken["ok"])
+        self.assertFalse(notObject["ok"])
+
+    def test_oversized_line_is_a_protocol_error(self):
+        """
+        # Test: Una richiesta oltre MAX_LINE riceve un errore e la connessione si chiude, senza eccezioni nel server.
+        """
+        SingletonMeta._instances = {}
+
+        async def scenario():
+            server = GameServer("storia.json")
+            listener = await server.start("127.0.0.1", 0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"x" * (MAX_LINE + 10) + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            closed = await reader.read() == b""
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+            return response, closed, server.activeSessions
+
+        response, closed, active = asyncio.run(scenario())
+        self.assertFalse(response["ok"])
+        self.assertTrue(closed)
+        self.assertEqual(active, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import tempfile
+from model import Character, GameSession, Scelta, ScelteCollection, SingletonMeta, StoryCache, parseScelte, parseCharacters
+from solver import ReachabilityIndex, StorySolver, solveStoryFile
+from storygen import generateStory
+
+class TestStorySolver(unittest.TestCase):
+
+    def setUp(self):
+        """
+        # La chiave si prende solo andando a sinistra in "0", e serve al personaggio 0 in "2".
+        """
+        self.nodes = {
+            "0":    Scelta("0", [([], "1")], [([], "1")], "Inizio", "R", "L", [], ["chiave"], turn=0, level=1),
+            "1":    Scelta("1", [([], "2")], [([], "LOSE")], "Corridoio", "R", "L", [], [], turn=1, level=1),
+            "2":    Scelta("2", [(["chiave"], "WIN"), ([], "LOSE")], [([], "1")], "Porta", "R", "L", [], [], turn=0, level=1),
+            "WIN":  Scelta("WIN", [([], "EXIT")], [([], "0")], "Vittoria", "R", "L", [], [], is_end=True, level=1, ending_title="Vittoria"),
+            "LOSE": Scelta("LOSE", [([], "EXIT")], [([], "0")], "Sconfitta", "R", "L", [], [], is_end=True, level=1, ending_title="Sconfitta"),
+            "HIDDEN": Scelta("HIDDEN", [([], "EXIT")], [([], "0")], "Mai", "R", "L", [], [], is_end=True, level=1, ending_title="Mai"),
+        }
+        self.characters = [Character(0), Character(1)]
+
+    def test_shortest_paths_respect_requirements(self):
+        """
+        # Test: Per la vittoria bisogna prima prendere la chiave; i finali irraggiungibili non compaiono.
+        """
+        solutions = StorySolver.fromCollection(ScelteCollection(self.nodes), self.characters).solve()
+        self.assertEqual(solutions["LOSE"], ["left", "left"])
+        self.assertEqual(solutions["WIN"], ["left", "right", "right"])
+        self.assertNotIn("HIDDEN", solutions)
+
+    def test_initial_abilities_are_used(self):
+        self.characters[0].abilities = ["chiave"]
+        solutions = StorySolver.fromCollection(ScelteCollection(self.nodes), self.characters).solve()
+        self.assertEqual(len(solutions["WIN"]), 3)
+
+    def test_paths_replay_in_game_session(self):
+        """
+        # Test: Su una storia generata ogni percorso, rigiocato con GameSession, arriva al suo finale.
+        """
+        data = generateStory(200, seed=4)
+        collection = parseScelte(data["nodes"], data["level_introductions"])
+        characters = parseCharacters(data["characters"])
+        solver = StorySolver.fromCollection(collection, characters)
+        solutions = solver.solve()
+        self.assertTrue(solutions)
+        for key, path in solutions.items():
+            session, iterator = GameSession(collection, [c.clone() for c in characters]), iter(collection)
+            for direction in path:
+                reached = session.choose(direction, iterator)
+            self.assertEqual(reached.key, key)
+
+    def test_state_budget_keeps_paths_valid(self):
+        """
+        # Test: Con un budget minimo la visita si ferma presto ma segnala che i risultati non sono garantiti minimi.
+        """
+        data = generateStory(200, seed=4)
+        collection = parseScelte(data["nodes"], data["level_introductions"])
+        solver = StorySolver.fromCollection(collection, parseCharacters(data["characters"]), maxStates=50)
+        solver.solve()
+        self.assertFalse(solver.exact)
+        self.assertLessEqual(solver.explored, 50)
+
+
+class TestReachabilityIndex(unittest.TestCase):
+
+    def setUp(self):
+        """
+        # Stessa storia di TestStorySolver: in "2" la chiave decide tra vittoria e sconfitta.
+        """
+        self.nodes = {
+            "0":    Scelta("0", [([], "1")], [([], "1")], "Inizio", "R", "L", [], ["chiave"], turn=0, level=1),
+            "1":    Scelta("1", [([], "2")], [([], "LOSE")], "Corridoio", "R", "L", [], [], turn=1, level=1),
+            "2":    Scelta("2", [(["chiave"], "WIN"), ([], "LOSE")], [([], "1")], "Porta", "R", "L", [], [], turn=0, level=1),
+            "WIN":  Scelta("WIN", [([], "EXIT")], [([], "0")], "Vittoria", "R", "L", [], [], is_end=True, level=1, ending_title="Vittoria"),
+            "LOSE": Scelta("LOSE", [([], "EXIT")], [([], "0")], "Sconfitta", "R", "L", [], [], is_end=True, level=1, ending_title="Sconfitta"),
+        }
+        self.index = ReachabilityIndex.fromCollection(ScelteCollection(self.nodes), [Character(0), Character(1)])
+
+    def test_answers_depend_on_abilities(self):
+        """
+        # Test: Con la chiave la porta porta alla vittoria, senza alla sconfitta; a sinistra si torna indietro.
+        """
+        self.assertEqual(self.index.endingsBySide("2", [["chiave"], []]), (["WIN", "LOSE"], ["WIN"]))
+        self.assertEqual(self.index.endingsBySide("2", [[], []]), (["LOSE"], ["LOSE"]))
+        self.assertTrue(self.index.complete)
+
+    def test_unindexed_state_uses_story_graph(self):
+        """
+        # Test: Gli stati oltre il budget ricevono la risposta prudente che ignora i requisiti.
+        """
+        index = ReachabilityIndex.fromCollection(ScelteCollection(self.nodes), [Character(0), Character(1)], maxStates=1)
+        self.assertEqual(index.endingsBySide("2", [[], []]), (["WIN", "LOSE"], ["WIN", "LOSE"]))
+        self.assertFalse(index.complete)
+
+    def test_story_without_start(self):
+        del self.nodes["0"]
+        index = ReachabilityIndex.fromCollection(ScelteCollection(self.nodes))
+        self.assertEqual(index.endingsBySide("2", [[]]), (["WIN", "LOSE"], ["WIN", "LOSE"]))
+
+
+class TestSolveStoryFile(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.story = os.path.join(self.tmp.name, "storia.json")
+        self.cache = os.path.join(self.tmp.name, "cache.json")
+        with open(self.story, 'w', encoding='utf-8') as f:
+            json.dump(generateStory(50, seed=1), f)
+
+    def tearDown(self):
+        StoryCache().invalidate()
+        self.tmp.cleanup()
+
+    def test_results_are_cached_by_content(self):
+        """
+        # Test: Il secondo calcolo con lo stesso contenuto usa la cache senza rieseguire la visita.
+        """
+        first = solveStoryFile(self.story, self.cache)
+        self.assertTrue(first)
+
+        with patch('solver.StorySolver') as MockSolver:
+            second = solveStoryFile(self.story, self.cache)
+            MockSolver.assert_not_called()
+        self.assertEqual(first, second)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+from bench_startup import measure
+
+class TestStartup(unittest.TestCase):
+    """
+    Test per l'avvio a freddo: il modello non deve dipendere da pygame
+    e l'audio non deve essere inizializzato all'import.
+    """
+
+    def test_model_imports_without_pygame(self):
+        for module in ("model", "validator", "solver", "savecodec", "eventlog"):
+            # Il tempo di import si controlla in bench_startup.py, qui conta solo cosa viene importato
+            _, pygame_loaded, _ = measure(module, runs=1)
+            self.assertFalse(pygame_loaded, f"{module} importa pygame")
+
+    def test_view_import_does_not_init_mixer(self):
+        _, pygame_loaded, mixer_ready = measure("view", runs=1)
+        self.assertTrue(pygame_loaded)
+        self.assertFalse(mixer_ready, "il mixer viene inizializzato all'import di view")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import patch
+import json
+import os
+import tempfile
+from model import Character, Scelta, ScelteCollection, SingletonMeta
+from validator import StoryValidator, validateStoryFile
+
+class TestStoryValidator(unittest.TestCase):
+
+    def setUp(self):
+        """
+        # Storia minima valida: "0" -> "1" -> finale "END".
+        """
+        self.nodes = {
+            "0":   Scelta("0", [([], "1")], [([], "1")], "Inizio", "R", "L", [], [], turn=0, level=1),
+            "1":   Scelta("1", [(["chiave"], "END"), ([], "END")], [([], "END")], "Stanza", "R", "L", [], [], turn=1, level=2),
+            "END": Scelta("END", [([], "EXIT")], [([], "0")], "Fine", "R", "L", [], [], is_end=True, level=2, ending_title="La fine"),
+        }
+        self.characters = [Character(0), Character(1)]
+
+    def kinds(self):
+        issues = StoryValidator(ScelteCollection(self.nodes), self.characters).validate()
+        return {(issue.kind, issue.key) for issue in issues}
+
+    def test_valid_story(self):
+        """
+        # Test: Una storia corretta non produce problemi (il ritorno a "0" da un finale è ammesso).
+        """
+        self.assertEqual(self.kinds(), set())
+
+    def test_dangling_key(self):
+        self.nodes["1"].nextLeft = [([], "MISSING")]
+        self.assertIn(("DANGLING_KEY", "1"), self.kinds())
+
+    def test_no_fallback(self):
+        """
+        # Test: Se tutte le opzioni richiedono oggetti, getLeft/getRight possono fallire.
+        """
+        self.nodes["1"].nextRight = [(["chiave"], "END")]
+        self.assertIn(("NO_FALLBACK", "1"), self.kinds())
+
+    def test_unreachable_node(self):
+        self.nodes["ORPHAN"] = Scelta("ORPHAN", [([], "END")], [([], "END")], "Orfano", "R", "L", [], [], level=2)
+        self.assertIn(("UNREACHABLE", "ORPHAN"), self.kinds())
+
+    def test_missing_ending_title(self):
+        self.nodes["END"].ending_title = None
+        self.assertIn(("MISSING_ENDING_TITLE", "END"), self.kinds())
+
+    def test_invalid_turn(self):
+        self.nodes["1"].turn = 5
+        self.assertIn(("INVALID_TURN", "1"), self.kinds())
+
+    def test_level_backwards(self):
+        self.nodes["1"].nextLeft = [([], "0")]
+        self.assertIn(("LEVEL_BACKWARDS", "1"), self.kinds())
+
+
+class TestValidateStoryFile(unittest.TestCase):
+
+    def setUp(self):
+        SingletonMeta._instances = {}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.story = os.path.join(self.tmp.name, "storia.json")
+        self.cache = os.path.join(self.tmp.name, "cache.json")
+        with open(self.story, 'w', encoding='utf-8') as f:
+            json.dump({
+                "characters": {"0": {"nickname": "A"}},
+                "nodes": {"0": {"nextLeft": [[[], "NOPE"]], "nextRight": [[[], "EXIT"]]}}
+            }, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_results_are_cached_by_content(self):
+        """
+        # Test: Il secondo avvio con lo stesso contenuto usa la cache senza rileggere la storia.
+        """
+        first = validateStoryFile(self.story, self.cache)
+        self.assertIn("DANGLING_KEY", [issue.kind for issue in first])
+
+        with patch('validator.StoryValidator') as MockValidator:
+            second = validateStoryFile(self.story, self.cache)
+            MockValidator.assert_not_called()
+        self.assertEqual(first, second)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,21 @@
 
 import unittest
+import math
+import time
 from unittest.mock import patch, MagicMock
+import pygame
+import view
 from view import Screen, RenderObject, Text, Image, Button, GameView
 
+def widget_mock(zLayer=0):
+    '''Figlio finto con l'interfaccia di RenderObject: dinamico e disegnato con render'''
+    widget = MagicMock(spec=RenderObject)
+    widget.zLayer = zLayer
+    widget.static = False
+    widget.blitItem.return_value = None
+    return widget
+
+
 class TestRenderObject(unittest.TestCase):
     """
     Test per la classe base RenderObject (Composite Pattern).
@@ -28,7 +41,7 @@ class TestRenderObject(unittest.TestCase):
         # Test: Verifica che il metodo render venga chiamato ricorsivamente sui figli.
         """
         parent = RenderObject()
-        child_mock = MagicMock()
+        child_mock = widget_mock()
         
         # Aggiungiamo un mock come figlio per vedere se viene chiamato
         parent.children.append(child_mock)
@@ -39,6 +52,38 @@ class TestRenderObject(unittest.TestCase):
         
         child_mock.render.assert_called_once_with(dummy_surface)
 
+    def test_children_sorted_by_zLayer(self):
+        """
+        # Test: I figli restano ordinati per zLayer, a parità di livello nell'ordine di inserimento.
+        """
+        parent = RenderObject()
+        top, bottom, first, second = RenderObject(zLayer=5), RenderObject(zLayer=-1), RenderObject(), widget_mock()
+        parent.addChildren([top, first])
+        parent.addChildren([second, bottom])
+        self.assertEqual(parent.children, [bottom, first, second, top])
+
+    def test_render_batches_single_blit_children(self):
+        """
+        # Test: I figli consecutivi disegnabili con un blit vanno in un'unica Surface.blits, senza cambiare l'ordine.
+        """
+        class Sprite(RenderObject):
+            def __init__(self, name):
+                super().__init__()
+                self.name = name
+            def blitItem(self, surface):
+                return self.name, (0, 0)
+
+        parent = RenderObject()
+        widget = widget_mock()
+        parent.addChildren([Sprite("a"), Sprite("b"), widget, Sprite("c")])
+        dummy_surface = MagicMock()
+        dummy_surface.attach_mock(widget.render, "widget_render")
+        parent.render(dummy_surface)
+
+        self.assertEqual([c[0] for c in dummy_surface.mock_calls], ["blits", "widget_render", "blits"])
+        dummy_surface.blits.assert_any_call([("a", (0, 0)), ("b", (0, 0))], doreturn=False)
+        dummy_surface.blits.assert_called_with([("c", (0, 0))], doreturn=False)
+
     def test_check_click_propagation(self):
         """
         # Test: Verifica che il checkClick raccolga i risultati da tutti i figli.
@@ -72,7 +117,13 @@ class TestGUIElements(unittest.TestCase):
         self.pygame_patcher = patch('view.pygame')
         self.mock_pygame = self.pygame_patcher.start()
         self.mock_pygame.mouse.get_pos.return_value = (0, 0)
+        # I bottoni usano l'AudioManager condiviso: ne creiamo uno nuovo con il pygame finto
+        self.instances = patch.dict(view.SingletonMeta._instances)
+        self.instances.start()
+        view.SingletonMeta._instances.pop(view.AudioManager, None)
     def tearDown(self):
+        Screen.active = None
+        self.instances.stop()
         self.pygame_patcher.stop()
 
     def test_screen_initialization(self):
@@ -86,6 +137,28 @@ class TestGUIElements(unittest.TestCase):
         self.mock_pygame.display.set_mode.assert_called_once_with((1024, 768))
         self.mock_pygame.display.set_caption.assert_called_with("The adventures of Lulucia")
 
+    def test_screen_logical_resolution(self):
+        """
+        # Test: In una finestra 1920x1080 la scena 800x600 viene scalata in proporzione e il mouse riportato in coordinate logiche.
+        """
+        self.mock_pygame.Rect = pygame.Rect
+        window = self.mock_pygame.display.set_mode.return_value
+        window.get_size.return_value = (1920, 1080)
+        window.subsurface.side_effect = lambda rect: MagicMock(**{
+            "get_size.return_value": rect.size, "get_abs_offset.return_value": rect.topleft})
+        screen = Screen(800, 600, window_size=(1920, 1080))
+        screen.initScreen()
+
+        self.mock_pygame.display.set_mode.assert_called_once_with((1920, 1080), 0)
+        self.assertIs(screen.screen, self.mock_pygame.Surface.return_value.convert.return_value)
+        self.assertEqual(screen.to_logical((240, 0)), (0, 0))
+        self.assertEqual(screen.to_logical((960, 540)), (400, 300))
+        self.mock_pygame.mouse.get_pos.return_value = (1679, 1079)
+        self.assertEqual(view.get_mouse_pos(), (799, 599))
+
+        screen.present()
+        self.mock_pygame.transform.scale.assert_called_once_with(screen.screen, (1440, 1080), screen._target)
+
     def test_text_initialization_and_render(self):
         """
         # Test: Verifica che Text inizializzi i font e faccia il blit sulla superficie.
@@ -110,6 +183,39 @@ class TestGUIElements(unittest.TestCase):
         mock_font_obj.render.assert_called_with("Hello", True, (255, 255, 255))
         dummy_surface.blit.assert_called_with(mock_rendered_text, (0, 0))
 
+    def test_multiline_reveal_blits_cached_surface(self):
+        """
+        # Test: Le righe si rasterizzano una volta; la rivelazione mostra porzioni della superficie e un tasto la completa.
+        """
+        font = MagicMock()
+        font.size.side_effect = lambda text: (10 * len(text), 20)
+        font.get_linesize.return_value = 20
+        font.render.side_effect = lambda text, aa, color: MagicMock(**{"get_width.return_value": 10 * len(text)})
+        self.mock_pygame.font.Font.return_value = font
+        self.mock_pygame.font.SysFont.return_value = font
+        self.mock_pygame.time.get_ticks.return_value = 1000
+        with patch.dict(view.SingletonMeta._instances):
+            view.SingletonMeta._instances.pop(view.TextLayout, None)
+            txt = view.MultiLineText((10, 50), "abcd efgh", 40, reveal_speed=10)
+            cached = self.mock_pygame.Surface.return_value
+            dummy_surface = MagicMock()
+
+            txt.render(dummy_surface)
+            self.assertEqual(font.render.call_count, 2)
+            dummy_surface.blit.assert_not_called()
+
+            # Dopo 0,6 secondi: la prima riga intera e due caratteri della seconda
+            self.mock_pygame.time.get_ticks.return_value = 1600
+            txt.render(dummy_surface)
+            self.assertEqual(dummy_surface.blit.call_args_list[0].args, (cached, (10, 50), (0, 0, cached.get_width.return_value, 24)))
+            self.assertEqual(dummy_surface.blit.call_args_list[1].args, (cached, (10, 74), (0, 24, 20, 24)))
+
+            self.assertTrue(txt.skip())
+            self.assertFalse(txt.skip())
+            txt.render(dummy_surface)
+            dummy_surface.blit.assert_called_with(cached, (10, 50))
+            self.assertEqual(font.render.call_count, 2)
+
     def test_image_initialization(self):
         """
         # Test: Verifica che Image carichi l'immagine dal percorso specificato.
@@ -119,6 +225,19 @@ class TestGUIElements(unittest.TestCase):
         
         self.mock_pygame.image.load.assert_called_with(path)
 
+    def test_image_loaded_once(self):
+        """
+        # Test: Immagini e icone vengono lette dal disco una sola volta e riusate finché non cambia il display.
+        """
+        first = Image((10, 10), "ritratto.png")
+        second = Image((50, 10), "ritratto.png")
+        self.assertIs(first.image, second.image)
+        self.mock_pygame.image.load.assert_called_once_with("ritratto.png")
+
+        self.mock_pygame.display.get_surface.return_value = MagicMock()
+        Image((10, 10), "ritratto.png")
+        self.assertEqual(self.mock_pygame.image.load.call_count, 2)
+
     def test_button_interaction_hit(self):
         """
         # Test: Verifica che il bottone rilevi il click quando le coordinate sono dentro il rect.
@@ -149,6 +268,195 @@ class TestGUIElements(unittest.TestCase):
         
         self.assertEqual(result, [])
 
+    def test_button_sounds_are_loaded_on_first_play(self):
+        """
+        # Test: Creare un bottone non inizializza l'audio; il primo click carica il suono, poi condiviso da tutti i bottoni.
+        """
+        with patch.dict(view.SingletonMeta._instances):
+            view.SingletonMeta._instances.pop(view.AudioManager, None)
+            self.mock_pygame.mixer.get_num_channels.return_value = 8
+            first = Button((50, 50), (100, 30), "Click Me")
+            second = Button((50, 100), (100, 30), "Click Me too")
+            self.mock_pygame.mixer.init.assert_not_called()
+            self.mock_pygame.mixer.Sound.assert_not_called()
+
+            first.rect.collidepoint.return_value = True
+            second.rect.collidepoint.return_value = True
+            first.checkClick((60, 60))
+            second.checkClick((60, 110))
+            first.checkClick((60, 60))
+        self.assertEqual(self.mock_pygame.mixer.Sound.call_count, 1)
+        self.assertEqual(self.mock_pygame.mixer.Channel.return_value.play.call_count, 3)
+
+
+class TestTextLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.instances = patch.dict(view.SingletonMeta._instances)
+        self.instances.start()
+        view.SingletonMeta._instances.pop(view.TextLayout, None)
+        self.layout = view.TextLayout()
+        # Font a larghezza fissa: 10 pixel per carattere
+        self.font = MagicMock()
+        self.font.size.side_effect = lambda text: (10 * len(text), 20)
+
+    def tearDown(self):
+        self.instances.stop()
+
+    def test_wrap_breaks_on_words_and_newlines(self):
+        """
+        # Test: Le righe vanno a capo sulle parole entro la larghezza e sui \\n; le parole troppo lunghe restano intere.
+        """
+        lines = self.layout.wrap("il gatto nero\nsalta sul muretto altissimo", self.font, 90, (24, False))
+        self.assertEqual(lines, ("il gatto", "nero", "salta sul", "muretto", "altissimo"))
+        self.assertEqual(self.layout.wrap("supercalifragilistico e", self.font, 50, (24, False)), ("supercalifragilistico", "e"))
+        self.assertEqual(self.layout.wrap("", self.font, 50, (24, False)), ("",))
+
+    def test_glyphs_measured_once_and_lines_memoized(self):
+        """
+        # Test: Ogni carattere viene misurato una volta per font e lo stesso testo non viene rispezzato.
+        """
+        text = "abc abc abc " * 50
+        first = self.layout.wrap(text, self.font, 200, (24, False))
+        self.assertEqual(self.font.size.call_count, 4)
+        self.assertIs(self.layout.wrap(text, self.font, 200, (24, False)), first)
+        self.layout.wrap(text, self.font, 300, (24, False))
+        self.assertEqual(self.font.size.call_count, 4)
+        self.layout.wrap(text, self.font, 200, (32, False))
+        self.assertEqual(self.font.size.call_count, 8)
+
+
+class TestGlow(unittest.TestCase):
+    """
+    Test del bagliore dei bottoni con superfici pygame vere (nessuna finestra).
+    """
+
+    def test_frame_matches_direct_drawing(self):
+        """
+        # Test: Il fotogramma in cache dà gli stessi pixel dei tre bordi disegnati direttamente, ed è condiviso tra bottoni uguali.
+        """
+        rect, radius = pygame.Rect(40, 30, 300, 60), 14
+        for phase in (0, 7, view.GLOW_FRAMES // 2, view.GLOW_FRAMES - 1):
+            pulse01 = (math.sin(phase * math.tau / view.GLOW_FRAMES) + 1.0) / 2.0
+            intensity = int(110 + pulse01 * 90)
+            expected = pygame.Surface((400, 140))
+            for i in range(3):
+                expand = 6 + i * 5 + int(pulse01 * 4)
+                pygame.draw.rect(expected, (255, intensity, intensity), rect.inflate(expand, expand), width=2, border_radius=radius)
+
+            actual = pygame.Surface((400, 140))
+            frame = view.get_glow_frame(rect.size, radius, phase)
+            actual.blit(frame, (rect.x - view.GLOW_MARGIN, rect.y - view.GLOW_MARGIN))
+            self.assertEqual(pygame.image.tobytes(actual, "RGB"), pygame.image.tobytes(expected, "RGB"))
+            self.assertIs(view.get_glow_frame((300, 60), radius, phase), frame)
+
+
+class TestAudioManager(unittest.TestCase):
+
+    def setUp(self):
+        self.pygame_patcher = patch('view.pygame')
+        self.mock_pygame = self.pygame_patcher.start()
+        self.mock_pygame.mixer.get_num_channels.return_value = 8
+        self.channels = [MagicMock() for _ in range(view.SFX_CHANNELS + view.MUSIC_CHANNELS)]
+        self.mock_pygame.mixer.Channel.side_effect = lambda i: self.channels[i]
+        self.instances = patch.dict(view.SingletonMeta._instances)
+        self.instances.start()
+        view.SingletonMeta._instances.pop(view.AudioManager, None)
+        self.audio = view.AudioManager()
+
+    def tearDown(self):
+        self.instances.stop()
+        self.pygame_patcher.stop()
+
+    def test_busy_pool_steals_oldest_voice(self):
+        """
+        # Test: Con tutti i canali occupati si interrompe l'effetto partito per primo; un canale libero ha la precedenza.
+        """
+        for channel in self.channels:
+            channel.get_busy.return_value = True
+        for _ in range(view.SFX_CHANNELS + 1):
+            self.audio.play_sfx("assets/sounds/click.wav")
+        self.assertEqual([c.play.call_count for c in self.channels[:view.SFX_CHANNELS]], [2] + [1] * (view.SFX_CHANNELS - 1))
+
+        self.channels[2].get_busy.return_value = False
+        self.audio.play_sfx("assets/sounds/click.wav")
+        self.assertEqual(self.channels[2].play.call_count, 2)
+        self.mock_pygame.mixer.set_reserved.assert_called_once_with(view.SFX_CHANNELS + view.MUSIC_CHANNELS)
+
+    def test_volume_is_applied_on_change_only(self):
+        """
+        # Test: Il volume si imposta sui suoni quando cambia, non a ogni riproduzione.
+        """
+        sound = self.audio.load_sound("assets/sounds/click.wav")
+        sound.set_volume.reset_mock()
+        for _ in range(10):
+            self.audio.play_sfx("assets/sounds/click.wav")
+        sound.set_volume.assert_not_called()
+        for channel in self.channels:
+            channel.set_volume.assert_not_called()
+
+        self.audio.cycle_volume()
+        sound.set_volume.assert_called_once_with(0.0)
+
+    def test_missing_sound_is_not_retried(self):
+        self.mock_pygame.mixer.Sound.side_effect = FileNotFoundError("missing")
+        self.audio.play_sfx("assets/sounds/none.wav")
+        self.audio.play_sfx("assets/sounds/none.wav")
+        self.assertEqual(self.mock_pygame.mixer.Sound.call_count, 1)
+
+    def wait_music(self, scene, level=None):
+        # I brani vengono decodificati sul thread della musica: si chiama update_music come farebbe il gameLoop
+        for _ in range(500):
+            self.audio.update_music(scene, level)
+            if self.audio._wanted is None and not self.audio._requested:
+                return
+            time.sleep(0.002)
+        self.fail("brano non caricato")
+
+    def test_music_follows_scene_and_level(self):
+        """
+        # Test: Ogni scena e ogni livello suonano il proprio brano, con dissolvenza incrociata sui due canali della musica.
+        """
+        self.mock_pygame.mixer.Sound.side_effect = lambda path: MagicMock(name=path)
+        # Senza sezione "music" il gioco resta in silenzio
+        self.audio.set_music(None)
+        self.wait_music("MENU")
+        self.assertIsNone(self.audio.music_path)
+        self.mock_pygame.mixer.Sound.assert_not_called()
+
+        self.audio.set_music({"scenes": {"MENU": "menu.ogg", "GAME": "game.ogg"}, "levels": {"2": "level2.ogg", "3": "level3.ogg"}})
+        music = self.channels[view.SFX_CHANNELS:]
+
+        self.wait_music("MENU")
+        self.assertEqual(self.audio.music_path, "menu.ogg")
+        self.assertEqual(music[1].play.call_args.kwargs, {"loops": -1, "fade_ms": view.CROSSFADE_MS})
+
+        self.wait_music("GAME", 1)
+        self.assertEqual(self.audio.music_path, "game.ogg")
+        music[1].fadeout.assert_called_once_with(view.CROSSFADE_MS)
+        self.assertEqual(music[0].play.call_count, 1)
+
+        # La musica del livello prevale su quella della scena; il livello successivo è già pronto
+        self.wait_music("LEVEL_INTRO", 2)
+        self.assertEqual(self.audio.music_path, "level2.ogg")
+        self.assertIn("level3.ogg", self.audio.tracks)
+
+        # Le scene senza brano mantengono quello in corso
+        self.audio.update_music("SAVE_SLOTS", 2)
+        self.assertEqual(self.audio.music_path, "level2.ogg")
+
+    def test_music_without_mixer_is_silent(self):
+        """
+        # Test: Senza dispositivo audio la musica viene ignorata e il mixer non viene ritentato a ogni frame.
+        """
+        self.mock_pygame.mixer.init.side_effect = Exception("no audio device")
+        self.audio.set_music(MagicMock())
+        for scene in ("MENU", "GAME", "GAME", "LEVEL_INTRO"):
+            self.audio.update_music(scene, 1)
+        self.assertIsNone(self.audio.music_path)
+        self.assertEqual(self.mock_pygame.mixer.init.call_count, 1)
+        self.mock_pygame.mixer.Sound.assert_not_called()
+
 
 class TestGameView(unittest.TestCase):
     """
@@ -197,6 +505,97 @@ class TestGameView(unittest.TestCase):
         # Verifica flip del buffer
         self.mock_pygame.display.flip.assert_called_once()
 
+    def test_static_layer_is_cached(self):
+        """
+        # Test: Sfondo e figli statici iniziali si compongono una volta in un livello; ogni frame è un blit più i figli dinamici.
+        """
+        class Static(RenderObject):
+            static = True
+        gv = GameView()
+        gv.initScreen()
+        panel, title, button = Static(), Static(), widget_mock()
+        panel.render = MagicMock()
+        title.render = MagicMock()
+        gv.setSceneObjects([panel, title, button])
+        layer = self.mock_pygame.Surface.return_value.convert.return_value
+
+        gv.render()
+        gv.render()
+        panel.render.assert_called_once_with(layer)
+        title.render.assert_called_once_with(layer)
+        self.assertEqual(button.render.call_count, 2)
+        gv.screen.screen.blit.assert_called_with(layer, (0, 0))
+
+        gv.setSceneObjects([panel, title])
+        gv.render()
+        self.assertEqual(panel.render.call_count, 2)
+
+    def test_scene_change_fades_previous_frame(self):
+        """
+        # Test: Cambiando scena l'ultimo frame mostrato sfuma sopra quella nuova per TRANSITION_MS, poi la vista torna ferma.
+        """
+        gv = GameView()
+        gv.initScreen()
+        self.mock_pygame.time.get_ticks.return_value = 1000
+        gv.setScene("GAME")
+        self.assertFalse(gv.isAnimating())  # nessun frame ancora mostrato: niente da sfumare
+        gv.render()
+
+        previous = self.mock_pygame.Surface.return_value.convert.return_value
+        gv.setScene("INFO")
+        previous.blit.assert_called_with(gv.screen.screen, (0, 0))
+        self.assertTrue(gv.isAnimating())
+
+        self.mock_pygame.time.get_ticks.return_value = 1000 + view.TRANSITION_MS // 2
+        gv.render()
+        previous.set_alpha.assert_called_with(255 - int(255 * 0.5))
+        gv.screen.screen.blit.assert_called_with(previous, (0, 0))
+
+        self.mock_pygame.time.get_ticks.return_value = 1000 + view.TRANSITION_MS
+        gv.render()
+        self.assertFalse(gv.isAnimating())
+
+    def test_same_scene_rebuild_fades(self):
+        """
+        # Test: Ricostruendo la stessa scena dopo startTransition l'ultimo frame sfuma come con una scena preparata.
+        """
+        gv = GameView()
+        gv.initScreen()
+        self.mock_pygame.time.get_ticks.return_value = 1000
+        gv.setScene("GAME")
+        gv.render()
+
+        previous = self.mock_pygame.Surface.return_value.convert.return_value
+        gv.startTransition()
+        gv.setSceneObjects([RenderObject()])
+        previous.blit.assert_called_with(gv.screen.screen, (0, 0))
+        self.assertEqual(gv.current_scene, "GAME")
+        self.assertTrue(gv.isAnimating())
+
+    def test_prepared_scene_is_swapped_in(self):
+        """
+        # Test: Una scena preparata ha lo strato statico già composto; mostrarla non ridisegna gli oggetti statici.
+        """
+        class Static(RenderObject):
+            static = True
+        gv = GameView()
+        gv.initScreen()
+        gv.transition = None
+        title, button = Static(), widget_mock()
+        title.render = MagicMock()
+        prepared = gv.prepareScene("INFO", [button, title])
+        self.assertEqual(gv.current_scene, "MENU")
+        self.assertEqual(prepared.objects, [button, title])
+        button.preload.assert_called_once()
+
+        prepared = gv.prepareScene("INFO", [title, button])
+        title.render.assert_called_once()
+        gv.showPrepared(prepared)
+        gv.render()
+        self.assertEqual(gv.current_scene, "INFO")
+        title.render.assert_called_once()
+        button.render.assert_called_once_with(gv.screen.screen)
+
     def test_checkClick_delegation(self):
         """
         # Test: Verifica che GameView deleghi il click alla root.
@@ -212,5 +611,37 @@ class TestGameView(unittest.TestCase):
         gv.root.checkClick.assert_called_with((50, 50))
         self.assertEqual(res, ["Event"])
 
+    def test_isAnimating(self):
+        """
+        # Test: La scena è animata solo con un bottone sotto il mouse o un testo ancora in rivelazione.
+        """
+        gv = GameView()
+        self.mock_pygame.Rect.return_value.collidepoint.return_value = False
+        button = Button((0, 0), (100, 50), "Ok")
+        text = RenderObject()
+        gv.setSceneObjects([button, text])
+        self.assertFalse(gv.isAnimating())
+
+        self.mock_pygame.Rect.return_value.collidepoint.return_value = True
+        self.assertTrue(gv.isAnimating())
+        button.display = False
+        self.assertFalse(gv.isAnimating())
+
+        text.isAnimating = MagicMock(return_value=True)
+        self.assertTrue(gv.isAnimating())
+
+    def test_frame_stats(self):
+        """
+        # Test: FrameStats riporta fps e CPU solo a fine periodo e poi ricomincia a contare.
+        """
+        stats = view.FrameStats(period=3600)
+        self.assertIsNone(stats.tick())
+        self.assertEqual(stats.frames, 1)
+        stats.period = 0
+        fps, cpu = stats.tick()
+        self.assertGreater(fps, 0)
+        self.assertGreaterEqual(cpu, 0)
+        self.assertEqual(stats.frames, 0)
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
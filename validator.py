@@ -0,0 +1,94 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, asdict
+import sys
+from model import Character, ScelteCollection, FileManager, parseScelte, parseCharacters
+
+# Versione delle regole di validazione: cambiandola si invalidano i risultati in cache
+VALIDATOR_VERSION = 1
+VALIDATION_CACHE_FILE = "validation_cache.json"
+
+@dataclass(frozen=True)
+class StoryIssue:
+    ''' Rappresenta un problema rilevato nella storia '''
+    kind:    str  # categoria del problema (DANGLING_KEY, NO_FALLBACK, ...)
+    key:     str  # chiave del nodo coinvolto
+    message: str  # descrizione leggibile del problema
+
+class StoryValidator:
+    ''' Analisi statica del grafo delle scelte, lineare nel numero di nodi e archi '''
+    def __init__(self, collection: ScelteCollection, characters: list[Character] = None, startKey: str = "0"):
+        self._collection = collection
+        self._characterIds = {c.id for c in characters} if characters is not None else None
+        self._startKey = startKey
+
+    def validate(self) -> list[StoryIssue]:
+        '''Restituisce la lista di tutti i problemi trovati'''
+        nodes = self._collection._collection
+        issues = []
+        if self._startKey not in nodes:
+            issues.append(StoryIssue("MISSING_START", self._startKey, "Start node is missing"))
+
+        for key, scelta in nodes.items():
+            for side, options in (("left", scelta.nextLeft), ("right", scelta.nextRight)):
+                has_fallback = False
+                for required_objects, next_key in options:
+                    if not required_objects:
+                        has_fallback = True
+                    if next_key != "EXIT" and next_key not in nodes:
+                        issues.append(StoryIssue("DANGLING_KEY", key, f"The {side} option points to missing node '{next_key}'"))
+                        continue
+                    # Dai finali si ricomincia dall'inizio: solo lì il livello può tornare indietro
+                    if next_key != "EXIT" and not scelta.is_end and nodes[next_key].level < scelta.level:
+                        issues.append(StoryIssue("LEVEL_BACKWARDS", key, f"The {side} option goes back from level {scelta.level} to level {nodes[next_key].level}"))
+                if options and not has_fallback:
+                    issues.append(StoryIssue("NO_FALLBACK", key, f"The {side} options have no unconditional fallback"))
+            if not scelta.is_end and not scelta.nextLeft and not scelta.nextRight:
+                issues.append(StoryIssue("DEAD_END", key, "Node is not an ending but has no options"))
+            if scelta.is_end and not scelta.ending_title:
+                issues.append(StoryIssue("MISSING_ENDING_TITLE", key, "Ending has no ending_title"))
+            if self._characterIds is not None and not scelta.is_end and scelta.turn not in self._characterIds:
+                issues.append(StoryIssue("INVALID_TURN", key, f"Turn {scelta.turn} does not match any character"))
+
+        reached = self._reachable(nodes)
+        for key in nodes:
+            if key not in reached:
+                issues.append(StoryIssue("UNREACHABLE", key, "Node cannot be reached from the start"))
+        return issues
+
+    def _reachable(self, nodes: dict) -> set[str]:
+        '''Visita in ampiezza ignorando i requisiti degli oggetti'''
+        reached = set()
+        if self._startKey in nodes:
+            reached.add(self._startKey)
+            queue = deque([self._startKey])
+            while queue:
+                scelta = nodes[queue.popleft()]
+                for _, next_key in scelta.nextLeft + scelta.nextRight:
+                    if next_key in nodes and next_key not in reached:
+                        reached.add(next_key)
+                        queue.append(next_key)
+        return reached
+
+def validateStoryFile(fileName: str = "storia.json", cacheFile: str = VALIDATION_CACHE_FILE) -> list[StoryIssue]:
+    '''Valida il file di storia, riusando i risultati salvati per lo stesso contenuto'''
+    fileManager = FileManager()
+    cache_key = f"{VALIDATOR_VERSION}:{fileManager.hashFile(fileName)}"
+    cache = fileManager.loadSaves(cacheFile)
+    if cache_key in cache:
+        return [StoryIssue(**issue) for issue in cache[cache_key]]
+
+    scelteData, charactersData, intros = fileManager.loadFile(fileName)
+    issues = StoryValidator(parseScelte(scelteData, intros), parseCharacters(charactersData)).validate()
+
+    # I risultati delle versioni precedenti del validatore non servono più
+    cache = {k: v for k, v in cache.items() if k.startswith(f"{VALIDATOR_VERSION}:")}
+    cache[cache_key] = [asdict(issue) for issue in issues]
+    fileManager.saveFile(cacheFile, cache)
+    return issues
+
+if __name__ == "__main__":
+    found = validateStoryFile(sys.argv[1] if len(sys.argv) > 1 else "storia.json")
+    for issue in found:
+        print(f"{issue.kind:<22} {issue.key}: {issue.message}")
+    sys.exit(1 if found else 0)
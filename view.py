@@ -1,13 +1,11 @@
 import os
 import math
+import bisect
+import queue
+import threading
+import time
 import pygame
 
-# Mixer init
-try:
-    pygame.mixer.init()
-except Exception as e:
-    print("[Audio] mixer init failed:", e)
-
 # =====================
 # AUDIO MANAGER
 # =====================
@@ -21,6 +19,18 @@ class SingletonMeta(type):
             cls._instances[cls] = instance
         return cls._instances[cls]
 
+SFX_CHANNELS = 4    # canali riservati agli effetti: la musica e Sound.play() non li usano
+MUSIC_CHANNELS = 2  # due canali per la musica, per la dissolvenza incrociata tra un brano e l'altro
+CROSSFADE_MS = 1200
+MUSIC_CACHE = 4     # brani decodificati tenuti in memoria
+
+# Musica predefinita, integrata dalla sezione "music" del file di storia:
+#   "scenes": scena -> brano (null per il silenzio); le scene non elencate mantengono il brano in corso
+#   "levels": livello -> brano, che nelle scene di gioco prevale su quello della scena
+# Il gioco non include brani: senza sezione "music" si resta in silenzio
+DEFAULT_MUSIC = {"scenes": {}, "levels": {}}
+LEVEL_SCENES = ("GAME", "LEVEL_INTRO")
+
 class AudioManager(metaclass=SingletonMeta):
     def __init__(self):
         self.volume_levels = [("Mute", 0.0), ("Low", 0.25), ("Medium", 0.5), ("High", 1.0)]
@@ -28,41 +38,196 @@ class AudioManager(metaclass=SingletonMeta):
         self.menu_music_base = 0.25
         self.menu_music_playing = False
         self.sfx_volume = 1.0
-        # Apply volume
-        try:
-            pygame.mixer.music.set_volume(self.volume_levels[self.volume_index][1] * self.menu_music_base)
-        except Exception:
-            pass
+        self.mixer_ready = None  # None = non ancora inizializzato, False = audio non disponibile
+        self.sounds = {}         # percorso -> Sound decodificato una sola volta (None se il caricamento è fallito)
+        self.channels = []       # canali riservati agli effetti
+        self._order = []         # indici dei canali, da quello usato meno di recente
+        # Musica: brani decodificati su un thread separato e alternati su due canali
+        self.music = {"scenes": dict(DEFAULT_MUSIC["scenes"]), "levels": {}}
+        self.music_channels = []
+        self.music_path = None   # brano in riproduzione (None = silenzio)
+        self.tracks = {}         # percorso -> Sound pronto (None se non si può caricare), dal meno recente
+        self._wanted = None      # brano richiesto ma non ancora decodificato
+        self._music_key = None   # ultima (scena, livello) vista da update_music
+        self._requested = set()
+        self._loads = None       # percorsi da decodificare (coda del thread)
+        self._loaded = queue.SimpleQueue()
+
+    def ensure_mixer(self):
+        # Il mixer apre il dispositivo audio: lo facciamo alla prima riproduzione, non all'import
+        if self.mixer_ready is None:
+            try:
+                pygame.mixer.init()
+                pygame.mixer.music.set_volume(self.volume_levels[self.volume_index][1] * self.menu_music_base)
+                if pygame.mixer.get_num_channels() < SFX_CHANNELS + MUSIC_CHANNELS:
+                    pygame.mixer.set_num_channels(SFX_CHANNELS + MUSIC_CHANNELS)
+                pygame.mixer.set_reserved(SFX_CHANNELS + MUSIC_CHANNELS)
+                self.channels = [pygame.mixer.Channel(i) for i in range(SFX_CHANNELS)]
+                self._order = list(range(SFX_CHANNELS))
+                self.music_channels = [pygame.mixer.Channel(SFX_CHANNELS + i) for i in range(MUSIC_CHANNELS)]
+                self.mixer_ready = True
+            except Exception as e:
+                print("[Audio] mixer init failed:", e)
+                self.mixer_ready = False
+        return self.mixer_ready
+
+    def load_sound(self, path):
+        '''Restituisce il Sound del file, decodificandolo solo la prima volta'''
+        if path in self.sounds:
+            return self.sounds[path]
+        sound = None
+        if self.ensure_mixer():
+            try:
+                sound = pygame.mixer.Sound(resolve_asset(path))
+                sound.set_volume(self.sfx_volume)
+            except Exception as e:
+                print(f"[Audio] Sound load failed ({path}): {e}")
+        self.sounds[path] = sound
+        return sound
+
+    def play_sfx(self, path):
+        # Percorso veloce (hover, click): una ricerca nel dizionario e un canale del pool, nessuna allocazione
+        sound = self.sounds[path] if path in self.sounds else self.load_sound(path)
+        if sound is None:
+            return
+        order = self._order
+        if not order:
+            return
+        # Il primo canale libero; se sono tutti occupati si ruba quello partito per primo
+        index = order[0]
+        for i in order:
+            if not self.channels[i].get_busy():
+                index = i
+                break
+        order.remove(index)
+        order.append(index)
+        self.channels[index].play(sound)
 
     def cycle_volume(self):
         self.volume_index = (self.volume_index + 1) % len(self.volume_levels)
         self.sfx_volume = self.volume_levels[self.volume_index][1]
-        try:
-            pygame.mixer.music.set_volume(self.sfx_volume * self.menu_music_base)
-        except Exception:
-            pass
-
-    def play_menu_music(self):
-        if self.menu_music_playing:
+        # Il volume resta impostato sui Sound: non serve più applicarlo a ogni riproduzione
+        for sound in self.sounds.values():
+            if sound is not None:
+                sound.set_volume(self.sfx_volume)
+        for sound in self.tracks.values():
+            if sound is not None:
+                sound.set_volume(self.music_volume())
+
+    def music_volume(self):
+        return self.volume_levels[self.volume_index][1] * self.menu_music_base
+
+    # ---- musica
+
+    def set_music(self, config):
+        '''Brani per scena e per livello dalla sezione "music" del file di storia'''
+        config = config if isinstance(config, dict) else {}
+        scenes, levels = config.get("scenes"), config.get("levels")
+        self.music = {
+            "scenes": {**DEFAULT_MUSIC["scenes"], **(scenes if isinstance(scenes, dict) else {})},
+            "levels": {str(level): path for level, path in (levels.items() if isinstance(levels, dict) else ())},
+        }
+        self._music_key = None
+
+    def music_for(self, scene, level=None):
+        '''Brano della scena (o del livello), None per il silenzio, ... se la scena mantiene il brano in corso'''
+        if scene in LEVEL_SCENES and str(level) in self.music["levels"]:
+            return self.music["levels"][str(level)]
+        return self.music["scenes"].get(scene, ...)
+
+    def update_music(self, scene, level=None):
+        # Chiamata a ogni frame: se nulla è cambiato e non si attendono brani costa un confronto
+        key = (scene, level)
+        if key == self._music_key and self._wanted is None and not self._requested:
             return
-        try:
-            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "sounds", "menu_music.mp3")
-            pygame.mixer.music.load(path)
-            pygame.mixer.music.set_volume(self.volume_levels[self.volume_index][1] * self.menu_music_base)
-            pygame.mixer.music.play(-1)
-            self.menu_music_playing = True
-        except Exception as e:
-            print("[Music] Menu music failed:", e)
+        if not self.ensure_mixer():
+            self._music_key = key
+            return
+        self._collect_tracks()
+        if key != self._music_key:
+            self._music_key = key
+            path = self.music_for(scene, level)
+            if path is None:
+                self._wanted = None
+                self.fadeout_music()
+            elif path is not ...:
+                self._wanted = path if path != self.music_path else None
+            # Il brano del livello successivo viene decodificato in anticipo
+            if scene in LEVEL_SCENES and isinstance(level, int):
+                self.preload_music(self.music["levels"].get(str(level + 1)))
+        if self._wanted is None:
+            return
+        if self._wanted in self.tracks:
+            # Il brano è pronto: dissolvenza incrociata senza fermare il frame
+            wanted, self._wanted = self._wanted, None
+            self._crossfade(wanted)
+        else:
+            self.preload_music(self._wanted)
 
-    def fadeout_music(self, ms=1200):
-        if not self.menu_music_playing:
+    def preload_music(self, path):
+        '''Chiede la decodifica del brano sul thread della musica, senza attendere'''
+        if path is None or path in self.tracks or path in self._requested or not self.ensure_mixer():
             return
+        self._requested.add(path)
+        if self._loads is None:
+            self._loads = queue.SimpleQueue()
+            threading.Thread(target=self._load_tracks, name="music", daemon=True).start()
+        self._loads.put(path)
+
+    def _load_tracks(self):
+        while True:
+            path = self._loads.get()
+            try:
+                sound = pygame.mixer.Sound(resolve_asset(path))
+            except Exception as e:
+                print(f"[Music] Track load failed ({path}): {e}")
+                sound = None
+            self._loaded.put((path, sound))
+
+    def _collect_tracks(self):
+        '''Porta nel thread della UI i brani decodificati, scartando i meno recenti oltre MUSIC_CACHE'''
+        while not self._loaded.empty():
+            path, sound = self._loaded.get()
+            self._requested.discard(path)
+            if sound is not None:
+                sound.set_volume(self.music_volume())
+            self.tracks[path] = sound
+        for path in list(self.tracks)[:max(len(self.tracks) - MUSIC_CACHE, 0)]:
+            if path != self.music_path and path != self._wanted:
+                del self.tracks[path]
+
+    def _crossfade(self, path, ms=CROSSFADE_MS):
+        sound = self.tracks.get(path) if path is not None else None
+        current, following = self.music_channels[0], self.music_channels[1]
+        current.fadeout(ms)
+        if sound is not None:
+            # Il brano usato per ultimo va in fondo: è l'ultimo a essere scartato
+            self.tracks[path] = self.tracks.pop(path)
+            following.play(sound, loops=-1, fade_ms=ms)
+        self.music_channels.reverse()
+        self.music_path = path if sound is not None else None
+        self.menu_music_playing = self.music_path is not None
+
+    def play_menu_music(self):
+        self.update_music("MENU")
+
+    def fadeout_music(self, ms=CROSSFADE_MS):
+        if self.music_path is not None and self.music_channels:
+            self._crossfade(None, ms)
+
+def resolve_asset(path):
+    '''Percorso assoluto di un asset relativo alla cartella del gioco; se il file non c'è si cerca ignorando maiuscole e minuscole'''
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    full_path = path if os.path.isabs(path) else os.path.join(base_dir, path)
+    if not os.path.exists(full_path):
+        folder, name = os.path.split(full_path)
         try:
-            pygame.mixer.music.fadeout(ms)
-        except Exception:
-            try: pygame.mixer.music.stop()
-            except Exception: pass
-        self.menu_music_playing = False
+            for entry in os.listdir(folder):
+                if entry.lower() == name.lower():
+                    return os.path.join(folder, entry)
+        except OSError:
+            pass
+    return full_path
 
 def get_sfx_volume():
     return AudioManager().sfx_volume
@@ -77,6 +242,8 @@ FONT_SIZE_BUTTON = 26
 FONT_SIZE_INFO = 22
 FONT_SIZE_SMALL = 20
 
+REVEAL_SPEED = 60  # caratteri al secondo dei testi della storia
+
 def get_font(size, is_title=False):
     base_dir = os.path.dirname(os.path.abspath(__file__))
     f_path = FONT_PATH_TITLE if is_title else FONT_PATH_BODY
@@ -90,36 +257,158 @@ def get_font(size, is_title=False):
     return pygame.font.SysFont("Arial", size, bold=True)
 
 
+# =====================
+# TEXT LAYOUT
+# =====================
+LAYOUT_CACHE = 1024  # testi già spezzati in righe tenuti in memoria
+
+class TextLayout(metaclass=SingletonMeta):
+    '''Divisione in righe condivisa da Text, MultiLineText e Button'''
+
+    def __init__(self):
+        self.advances = {}  # font_key -> {carattere: avanzamento in pixel}
+        self.lines = {}     # (testo, font_key, larghezza) -> righe, dalla meno recente
+
+    def text_width(self, text, font, font_key):
+        # Ogni carattere viene misurato una sola volta per font; la crenatura è trascurata
+        advances = self.advances.get(font_key)
+        if advances is None:
+            advances = self.advances[font_key] = {}
+        width = 0
+        for ch in text:
+            advance = advances.get(ch)
+            if advance is None:
+                advance = advances[ch] = font.size(ch)[0]
+            width += advance
+        return width
+
+    def wrap(self, text, font, max_width, font_key):
+        '''Righe del testo entro max_width pixel: a capo sulle parole e sui \\n'''
+        key = (text, font_key, max_width)
+        lines = self.lines.get(key)
+        if lines is not None:
+            return lines
+        lines = []
+        if not text:
+            lines.append("")
+        space = self.text_width(" ", font, font_key)
+        for paragraph in (text.split("\n") if text else ()):
+            # Greedy lineare: ogni parola è misurata una volta e la riga accumula la propria larghezza
+            line, width = [], 0
+            for word in paragraph.split(" "):
+                w = self.text_width(word, font, font_key)
+                if not line:
+                    line, width = [word], w
+                elif width + space + w <= max_width:
+                    line.append(word)
+                    width += space + w
+                else:
+                    lines.append(" ".join(line))
+                    line, width = [word], w
+            lines.append(" ".join(line))
+        if len(self.lines) >= LAYOUT_CACHE:
+            del self.lines[next(iter(self.lines))]
+        lines = self.lines[key] = tuple(lines)
+        return lines
+
+
 # =====================
 # SCREEN
 # =====================
 class Screen:
-    def __init__(self, width=800, height=600):
+    active = None  # schermo aperto, per riportare il mouse in coordinate logiche
+
+    def __init__(self, width=800, height=600, window_size=None, fullscreen=False):
         self.width = width
         self.height = height
-        self.screen = None
+        self.window_size = window_size  # None = finestra grande quanto la risoluzione logica, (0, 0) = desktop
+        self.fullscreen = fullscreen
+        self.screen = None  # superficie logica su cui si disegna la scena
+        self.window = None
+        self._target = None  # porzione della finestra in cui viene scalata la scena
+        self._scale = 1.0
 
     def initScreen(self):
         pygame.init()
-        self.screen = pygame.display.set_mode((self.width, self.height))
+        if not self.fullscreen and (self.window_size is None or tuple(self.window_size) == (self.width, self.height)):
+            self.screen = pygame.display.set_mode((self.width, self.height))
+            self.window = self.screen
+        else:
+            # Risoluzione logica: la scena resta 800x600 e viene scalata a ogni frame nella finestra,
+            # mantenendo le proporzioni (bande nere ai lati)
+            self.window = pygame.display.set_mode(self.window_size or (0, 0), pygame.FULLSCREEN if self.fullscreen else 0)
+            self.screen = pygame.Surface((self.width, self.height)).convert()
+            win_w, win_h = self.window.get_size()
+            self._scale = min(win_w / self.width, win_h / self.height)
+            target = pygame.Rect(0, 0, int(self.width * self._scale), int(self.height * self._scale))
+            target.center = (win_w // 2, win_h // 2)
+            self.window.fill((0, 0, 0))
+            # Lo scaler scrive direttamente nella finestra: nessuna superficie allocata per frame
+            self._target = self.window.subsurface(target)
+        Screen.active = self
         pygame.display.set_caption("The adventures of Lulucia")
 
+    def present(self):
+        '''Porta la scena logica nella finestra; senza scalatura non fa nulla'''
+        if self._target is not None:
+            pygame.transform.scale(self.screen, self._target.get_size(), self._target)
+
+    def to_logical(self, pos):
+        '''Coordinate della finestra -> coordinate della scena'''
+        if self._target is None:
+            return pos
+        offset_x, offset_y = self._target.get_abs_offset()
+        return (int((pos[0] - offset_x) / self._scale), int((pos[1] - offset_y) / self._scale))
+
+
+def get_mouse_pos():
+    '''Posizione del mouse nella scena logica'''
+    pos = pygame.mouse.get_pos()
+    return Screen.active.to_logical(pos) if Screen.active is not None else pos
+
 
 # =====================
 # RENDER OBJECT
 # =====================
 class RenderObject:
+    static = False  # True se l'aspetto non cambia dopo l'aggiunta alla scena (può finire nel livello in cache)
+
     def __init__(self, zLayer=0, display=True):
         self.zLayer = zLayer
         self.display = display
         self.children = []
 
     def addChildren(self, children_list):
+        # I figli restano ordinati per zLayer (a parità di livello, nell'ordine di inserimento)
         self.children.extend(children_list)
+        self.children.sort(key=lambda child: child.zLayer)
 
     def render(self, surface):
-        for child in self.children:
+        self.renderChildren(surface)
+
+    def renderChildren(self, surface, start=0):
+        # I figli che si disegnano con un solo blit vengono raccolti e passati insieme a Surface.blits
+        batch = []
+        for child in self.children[start:]:
+            item = child.blitItem(surface)
+            if item is not None:
+                batch.append(item)
+                continue
+            if batch:
+                surface.blits(batch, doreturn=False)
+                batch = []
             child.render(surface)
+        if batch:
+            surface.blits(batch, doreturn=False)
+
+    def blitItem(self, surface):
+        '''(superficie, posizione) se l'oggetto si disegna con un solo blit, altrimenti None'''
+        return None
+
+    def preload(self):
+        '''Prepara in anticipo ciò che servirà al primo render (testi rasterizzati, etichette)'''
+        for child in self.children:
+            child.preload()
 
     def checkClick(self, pos):
         results = []
@@ -127,11 +416,17 @@ class RenderObject:
             results.extend(child.checkClick(pos))
         return results
 
+    def isAnimating(self):
+        '''True se il prossimo frame può essere diverso anche senza eventi'''
+        return any(child.isAnimating() for child in self.children)
+
 
 # =====================
 # TEXT
 # =====================
 class Text(RenderObject):
+    static = True
+
     def __init__(self, position, content, color=(255, 255, 255), font_size=FONT_SIZE_NORMAL, is_title=False):
         super().__init__()
         self.position = list(position)
@@ -139,16 +434,25 @@ class Text(RenderObject):
         self.color = color
         pygame.font.init()
         self.font = get_font(font_size, is_title=is_title)
+        self._surface = None
+        self._rendered = None  # (contenuto, colore) della superficie in cache
 
     def render(self, surface):
-        text_surface = self.font.render(self.content, True, self.color)
-        
+        surface.blit(*self.blitItem(surface))
+
+    def blitItem(self, surface):
+        # Il testo viene rasterizzato solo quando cambia, non a ogni frame
+        if self._rendered != (self.content, self.color):
+            self._surface = self.font.render(self.content, True, self.color)
+            self._rendered = (self.content, self.color)
+        text_surface = self._surface
+
         # Centramento automatico se X è -1
         draw_x = self.position[0]
         if draw_x == -1:
             draw_x = (surface.get_width() - text_surface.get_width()) // 2
-            
-        surface.blit(text_surface, (draw_x, self.position[1]))
+
+        return text_surface, (draw_x, self.position[1])
 
     def checkClick(self, pos):
         return []
@@ -158,7 +462,7 @@ class Text(RenderObject):
 # MULTILINE TEXT
 # =====================
 class MultiLineText(RenderObject):
-    def __init__(self, position, content, max_width, color=(255, 255, 255), font_size=FONT_SIZE_NORMAL):
+    def __init__(self, position, content, max_width, color=(255, 255, 255), font_size=FONT_SIZE_NORMAL, reveal_speed=None):
         super().__init__()
         self.position = list(position)
         self.content = content
@@ -166,45 +470,97 @@ class MultiLineText(RenderObject):
         self.color = color
         pygame.font.init()
         self.font = get_font(font_size)
+        self.font_key = (font_size, False)
         self.lines = self._wrap_text()
+        # Rivelazione progressiva: caratteri al secondo, None per mostrare subito tutto il testo
+        self.reveal_speed = reveal_speed
+        self.revealed = reveal_speed is None
+        self.static = self.revealed
+        self._reveal_start = None
+        self._surface = None
 
     def _wrap_text(self):
-        if not self.content:
-            return [""]
-        words = self.content.split(' ')
-        lines = []
-        current_line = []
-
-        for word in words:
-            # Se la parola ha salti di linea interni
-            sub_words = word.split('\n')
-            for i, sw in enumerate(sub_words):
-                if i > 0:
-                    lines.append(' '.join(current_line))
-                    current_line = []
-                
-                test_line = ' '.join(current_line + [sw])
-                w, _ = self.font.size(test_line)
-                if w <= self.max_width:
-                    current_line.append(sw)
-                else:
-                    lines.append(' '.join(current_line))
-                    current_line = [sw]
-        
-        lines.append(' '.join(current_line))
-        return [l for l in lines if l or l == ""]
+        return TextLayout().wrap(self.content, self.font, self.max_width, self.font_key)
+
+    def _build(self):
+        # Tutte le righe vengono rasterizzate una volta sola in un'unica superficie
+        self._step = self.font.get_linesize() + 4
+        line_surfaces = [self.font.render(line, True, self.color) for line in self.lines]
+        width = max([s.get_width() for s in line_surfaces])
+        self._surface = pygame.Surface((width, self._step * len(line_surfaces)), pygame.SRCALPHA)
+        self._surface.fill((*self.color[:3], 0))
+        self._line_x = []
+        for i, line_surf in enumerate(line_surfaces):
+            x = (width - line_surf.get_width()) // 2 if self.position[0] == -1 else 0
+            self._surface.blit(line_surf, (x, i * self._step))
+            self._line_x.append(x)
+        if self.revealed:
+            return
+        # Per la rivelazione: primo carattere di ogni riga e ascissa in cui finisce ogni carattere
+        layout = TextLayout()
+        self._starts, self._ends, total = [], [], 0
+        for line in self.lines:
+            x, ends = 0, []
+            for ch in line:
+                x += layout.text_width(ch, self.font, self.font_key)
+                ends.append(x)
+            self._starts.append(total)
+            self._ends.append(ends)
+            total += len(line)
+        self._length = total
+
+    def isAnimating(self):
+        return not self.revealed
+
+    def preload(self):
+        if self._surface is None:
+            self._build()
+
+    def skip(self):
+        '''Mostra subito tutto il testo; True se era ancora in corso di rivelazione'''
+        if self.revealed:
+            return False
+        self.revealed = True
+        return True
+
+    def blitItem(self, surface):
+        if not self.revealed:
+            return None
+        if self._surface is None:
+            self._build()
+        draw_x = self.position[0]
+        if draw_x == -1:
+            draw_x = (surface.get_width() - self._surface.get_width()) // 2
+        return self._surface, (draw_x, self.position[1])
 
     def render(self, surface):
+        if self._surface is None:
+            self._build()
+        draw_x = self.position[0]
+        if draw_x == -1:
+            draw_x = (surface.get_width() - self._surface.get_width()) // 2
         y = self.position[1]
-        for line in self.lines:
-            text_surf = self.font.render(line, True, self.color)
-            
-            draw_x = self.position[0]
-            if draw_x == -1:
-                draw_x = (surface.get_width() - text_surf.get_width()) // 2
-                
-            surface.blit(text_surf, (draw_x, y))
-            y += self.font.get_linesize() + 4
+        if self.revealed:
+            surface.blit(self._surface, (draw_x, y))
+            return
+
+        # Al più due blit di porzioni della superficie, qualunque sia la lunghezza del testo
+        now = pygame.time.get_ticks()
+        if self._reveal_start is None:
+            self._reveal_start = now
+        shown = (now - self._reveal_start) * self.reveal_speed // 1000
+        if shown >= self._length:
+            self.revealed = True
+            surface.blit(self._surface, (draw_x, y))
+            return
+        line = bisect.bisect_right(self._starts, shown) - 1
+        top = line * self._step
+        if top:
+            surface.blit(self._surface, (draw_x, y), (0, 0, self._surface.get_width(), top))
+        chars = shown - self._starts[line]
+        if chars:
+            x = self._line_x[line]
+            surface.blit(self._surface, (draw_x + x, y + top), (x, top, self._ends[line][chars - 1], self._step))
 
     def checkClick(self, pos):
         return []
@@ -213,19 +569,98 @@ class MultiLineText(RenderObject):
 # =====================
 # IMAGE
 # =====================
+_images = {}  # (percorso, lato) -> superficie già convertita per il display attuale
+_images_display = None
+
+def load_image(path, size=None):
+    '''Immagine convertita (e scalata a size x size) letta dal disco una sola volta'''
+    global _images_display
+    # Le superfici convertite valgono per il formato del display su cui sono state create
+    display = pygame.display.get_surface()
+    if display is not _images_display:
+        _images.clear()
+        _images_display = display
+    key = (path, size)
+    image = _images.get(key)
+    if image is None:
+        image = pygame.image.load(path).convert_alpha()
+        if size:
+            image = pygame.transform.smoothscale(image, (size, size))
+        _images[key] = image
+    return image
+
+
 class Image(RenderObject):
+    static = True
+
     def __init__(self, position, imageLink):
         super().__init__()
         self.position = position
-        self.image = pygame.image.load(imageLink).convert_alpha()
+        self.image = load_image(imageLink)
 
     def render(self, surface):
         surface.blit(self.image, self.position)
 
+    def blitItem(self, surface):
+        return self.image, self.position
+
     def checkClick(self, pos):
         return []
 
 
+# =====================
+# PANEL
+# =====================
+class Panel(RenderObject):
+    '''Riquadro statico con ombra e bordo, come sfondo delle finestre modali'''
+    static = True
+
+    def __init__(self, position, size, color=(30, 30, 30), radius=14, border=(255, 255, 255), zLayer=0):
+        super().__init__(zLayer=zLayer)
+        self.rect = pygame.Rect(position[0], position[1], size[0], size[1])
+        self.color = color
+        self.radius = radius
+        self.border = border
+
+    def render(self, surface):
+        shadow_rect = self.rect.move(3, 3)
+        pygame.draw.rect(surface, (0, 0, 0), shadow_rect, border_radius=self.radius)
+        pygame.draw.rect(surface, self.color, self.rect, border_radius=self.radius)
+        pygame.draw.rect(surface, self.border, self.rect, width=2, border_radius=self.radius)
+
+    def checkClick(self, pos):
+        return []
+
+
+# =====================
+# GLOW
+# =====================
+GLOW_FRAMES = 48   # fotogrammi per un ciclo completo del bagliore
+GLOW_MARGIN = 10   # metà dell'espansione massima dei tre bordi (6 + 2*5 + 4)
+_glow_frames = {}  # (dimensioni, raggio) -> fotogrammi, creati alla prima richiesta
+
+def get_glow_frame(size, radius, phase):
+    '''Fotogramma phase del bagliore pulsante attorno a un bottone di queste dimensioni'''
+    frames = _glow_frames.get((size, radius))
+    if frames is None:
+        frames = _glow_frames[(size, radius)] = [None] * GLOW_FRAMES
+    frame = frames[phase]
+    if frame is None:
+        pulse01 = (math.sin(phase * math.tau / GLOW_FRAMES) + 1.0) / 2.0
+        glow_intensity = int(110 + pulse01 * 90)
+        glow_color = (255, glow_intensity, glow_intensity)
+
+        # I bordi sono opachi: basta un colore trasparente, e con RLE il blit salta i pixel vuoti
+        frame = pygame.Surface((size[0] + 2 * GLOW_MARGIN, size[1] + 2 * GLOW_MARGIN))
+        frame.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        rect = pygame.Rect(GLOW_MARGIN, GLOW_MARGIN, size[0], size[1])
+        for i in range(3):
+            expand = 6 + i * 5 + int(pulse01 * 4)
+            pygame.draw.rect(frame, glow_color, rect.inflate(expand, expand), width=2, border_radius=radius)
+        frames[phase] = frame
+    return frame
+
+
 # =====================
 # BUTTON 
 # =====================
@@ -252,6 +687,9 @@ class Button(RenderObject):
         pygame.font.init()
         self.text = text
         self.font = get_font(FONT_SIZE_BUTTON)
+        self.font_key = (FONT_SIZE_BUTTON, False)
+        self._layout = None  # (testo, larghezza) delle righe già rasterizzate
+        self._line_surfaces = []
 
         self.radius = radius
         self.action_id = action_id  
@@ -266,31 +704,42 @@ class Button(RenderObject):
                 full_path = icon_path
                 if not os.path.isabs(icon_path):
                     full_path = os.path.join(base_dir, icon_path)
-                img = pygame.image.load(full_path).convert_alpha()
-                self.icon = pygame.transform.smoothscale(img, (icon_size, icon_size))
+                self.icon = load_image(full_path, icon_size)
             except Exception as e:
                 print(f"[Button] Icon load failed ({icon_path}): {e}")
 
-        self.hover_sound = None
-        self.click_sound = None
-
-        try:
-            self.hover_sound = pygame.mixer.Sound(hover_sound_path)
-        except Exception as e:
-            print(f"[Button] Hover sound load failed: {e}")
-
-        try:
-            self.click_sound = pygame.mixer.Sound(click_sound_path)
-        except Exception as e:
-            print(f"[Button] Click sound load failed: {e}")
+        # I suoni sono dell'AudioManager, che li carica alla prima riproduzione e li condivide tra i bottoni
+        self.hover_sound_path = hover_sound_path
+        self.click_sound_path = click_sound_path
+        self.audio = AudioManager()
 
         self._hovered_last_frame = self._is_hovered()
 
         self.glow_speed = 0.008
 
+    def _label_surfaces(self):
+        # Le righe dell'etichetta vengono rasterizzate solo quando cambia il testo o lo spazio disponibile
+        gap = 10
+        padding = 10
+        available_w = self.rect.w - (padding * 2) - (self.icon_size + gap if self.icon else 0)
+        if self._layout != (self.text, available_w):
+            lines = TextLayout().wrap(self.text, self.font, available_w, self.font_key)
+            self._line_surfaces = [self.font.render(l, True, (255, 255, 255)) for l in lines]
+            self._layout = (self.text, available_w)
+        return self._line_surfaces
+
+    def preload(self):
+        self._label_surfaces()
+
+    def _play_sound(self, kind):
+        self.audio.play_sfx(self.hover_sound_path if kind == "hover" else self.click_sound_path)
+
     def _is_hovered(self):
-        mx, my = pygame.mouse.get_pos()
-        return self.rect.collidepoint((mx, my))
+        return self.rect.collidepoint(get_mouse_pos())
+
+    def isAnimating(self):
+        # Il bagliore pulsa solo finché il mouse è sopra il bottone
+        return self.display and self._is_hovered()
 
     def render(self, surface):
         if not self.display:
@@ -298,30 +747,15 @@ class Button(RenderObject):
         hovered = self._is_hovered()
 
         if hovered and not self._hovered_last_frame:
-            if self.hover_sound:
-                ch = self.hover_sound.play()
-                if ch:
-                    ch.set_volume(get_sfx_volume())
+            self._play_sound("hover")
 
         self._hovered_last_frame = hovered
 
         if hovered:
-            t = pygame.time.get_ticks()
-            pulse01 = (math.sin(t * self.glow_speed) + 1.0) / 2.0
-
-            glow_intensity = int(110 + pulse01 * 90)
-            glow_color = (255, glow_intensity, glow_intensity)
-
-            for i in range(3):
-                expand = 6 + i * 5 + int(pulse01 * 4)
-                glow_rect = self.rect.inflate(expand, expand)
-                pygame.draw.rect(
-                    surface,
-                    glow_color,
-                    glow_rect,
-                    width=2,
-                    border_radius=self.radius,
-                )
+            # Fotogramma del bagliore per la fase corrente del ciclo, disegnato una volta e condiviso
+            phase = int(pygame.time.get_ticks() * self.glow_speed * GLOW_FRAMES / math.tau) % GLOW_FRAMES
+            frame = get_glow_frame(self.rect.size, self.radius, phase)
+            surface.blit(frame, (self.rect.x - GLOW_MARGIN, self.rect.y - GLOW_MARGIN))
 
         bg = self.color if not hovered else self.hover_color
         border = (255, 255, 255)
@@ -336,23 +770,8 @@ class Button(RenderObject):
         pygame.draw.rect(surface, border, self.rect, width=2, border_radius=self.radius)
 
         gap = 10
-        padding = 10
-        available_w = self.rect.w - (padding * 2) - (self.icon_size + gap if self.icon else 0)
-        words = self.text.split(' ')
-        lines = []
-        current_line = []
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            w, _ = self.font.size(test_line)
-            if w <= available_w:
-                current_line.append(word)
-            else:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-        lines.append(' '.join(current_line))
-        
-        line_surfaces = [self.font.render(l, True, (255, 255, 255)) for l in lines]
-        total_text_h = sum(s.get_height() for s in line_surfaces) + (len(lines)-1) * 2
+        line_surfaces = self._label_surfaces()
+        total_text_h = sum(s.get_height() for s in line_surfaces) + (len(line_surfaces)-1) * 2
         
         icon_w = self.icon_size if self.icon else 0
         max_line_w = max(s.get_width() for s in line_surfaces) if line_surfaces else 0
@@ -376,10 +795,7 @@ class Button(RenderObject):
         if not self.display:
             return []
         if self.rect.collidepoint(pos):
-            if self.click_sound:
-                ch = self.click_sound.play()
-                if ch:
-                    ch.set_volume(get_sfx_volume())
+            self._play_sound("click")
 
             if self.action_id:
                 return [f"ACTION:{self.action_id}"]
@@ -388,15 +804,62 @@ class Button(RenderObject):
         return []
 
 
+# =====================
+# FRAME STATS
+# =====================
+class FrameStats:
+    '''Frame disegnati al secondo e tempo di CPU del processo, misurati su finestre di period secondi'''
+
+    def __init__(self, period=5.0):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.frames = 0
+
+    def tick(self):
+        '''Conta un frame; a fine periodo restituisce (fps, cpu in %), altrimenti None'''
+        self.frames += 1
+        elapsed = time.perf_counter() - self._start
+        if elapsed < self.period:
+            return None
+        report = (self.frames / elapsed, 100.0 * (time.process_time() - self._cpu_start) / elapsed)
+        self.reset()
+        return report
+
+
 # =====================
 # GAME VIEW
 # =====================
+TRANSITION_MS = 250  # durata della dissolvenza tra una scena e l'altra
+
+class PreparedScene:
+    '''Scena già costruita e composta fuori schermo, da mostrare con GameView.showPrepared'''
+
+    def __init__(self, scene, objects, layer, layer_count):
+        self.scene = scene
+        self.objects = objects
+        self.layer = layer
+        self.layer_count = layer_count
+
+
 class GameView:
-    def __init__(self):
-        self.screen = Screen()
+    def __init__(self, window_size=None, fullscreen=False):
+        self.screen = Screen(window_size=window_size, fullscreen=fullscreen)
         self.root = RenderObject(zLayer=0)
         self.current_scene = "MENU"  # MENU | LOAD | GAME | EXIT_CONFIRM | SAVE_SLOTS
         self.menu_bg = None
+        self._overlay = None
+        # Sfondo e primi figli statici composti in un'unica superficie, ricostruita quando cambia la scena
+        self._layer = None
+        self._layer_count = 0
+        # Transizione: l'ultimo frame della scena precedente sfuma (o scorre via) sopra quella nuova
+        self.transition = "fade"  # fade | slide | None
+        self._previous = None
+        self._transition_start = None
+        self._presented = False
 
     def initScreen(self):
         self.screen.initScreen()
@@ -416,28 +879,115 @@ class GameView:
             self.menu_bg = None
 
     def setScene(self, scene_name):
+        if scene_name != self.current_scene:
+            self.startTransition()
         self.current_scene = scene_name
         self.root.children = []
+        self.invalidate()
 
     def setSceneObjects(self, objects):
         self.root.children = []
         self.root.addChildren(objects)
+        self.invalidate()
+
+    def invalidate(self):
+        '''Da chiamare se cambia l'aspetto di un oggetto statico già in scena'''
+        self._layer = None
+
+    def prepareScene(self, scene_name, objects):
+        '''Ordina gli oggetti e ne compone lo strato statico fuori schermo, senza toccare la scena attuale'''
+        root = RenderObject()
+        root.addChildren(objects)
+        layer, count = (None, 0) if self.screen.screen is None else self._compose(scene_name, root.children)
+        for child in root.children[count:]:
+            child.preload()
+        return PreparedScene(scene_name, root.children, layer, count)
+
+    def showPrepared(self, prepared):
+        '''Mostra una scena preparata: nessun oggetto da costruire né da disegnare nello strato statico'''
+        self.startTransition()
+        self.current_scene = prepared.scene
+        self.root.children = prepared.objects
+        self._layer, self._layer_count = prepared.layer, prepared.layer_count
+
+    def startTransition(self):
+        '''La scena che sta per essere mostrata sfuma sopra l'ultimo frame (anche se il nome della scena non cambia)'''
+        if not self.transition or not self._presented:
+            return
+        # Lo schermo contiene ancora l'ultimo frame mostrato
+        if self._previous is None:
+            self._previous = pygame.Surface((self.screen.width, self.screen.height)).convert()
+        self._previous.blit(self.screen.screen, (0, 0))
+        self._transition_start = pygame.time.get_ticks()
+
+    def _render_transition(self):
+        elapsed = pygame.time.get_ticks() - self._transition_start
+        if elapsed >= TRANSITION_MS:
+            self._transition_start = None
+            return
+        progress = elapsed / TRANSITION_MS
+        if self.transition == "slide":
+            self._previous.set_alpha(None)
+            self.screen.screen.blit(self._previous, (-int(progress * self.screen.width), 0))
+        else:
+            self._previous.set_alpha(255 - int(255 * progress))
+            self.screen.screen.blit(self._previous, (0, 0))
 
-    def render(self):
+    def _render_background(self, surface, scene=None):
         # Mostriamo lo sfondo del menu in queste scene per mantenere l'estetica
         menu_scenes = ("MENU", "LOAD", "SAVE", "NAMING", "WARNING", "EXIT_CONFIRM", "INFO", "ENDINGS", "LEVEL_INTRO")
-        if self.current_scene in menu_scenes and self.menu_bg:
-            self.screen.screen.blit(self.menu_bg, (0, 0))
+        if (scene or self.current_scene) in menu_scenes and self.menu_bg:
+            surface.blit(self.menu_bg, (0, 0))
+
+            if self._overlay is None:
+                self._overlay = pygame.Surface((self.screen.width, self.screen.height))
+                self._overlay.set_alpha(100) # Un po' più scuro per la leggibilità
+                self._overlay.fill((0, 0, 0))
+            surface.blit(self._overlay, (0, 0))
+        else:
+            surface.fill((20, 20, 20)) # Sfondo scuro per il gioco
+
+    def _compose(self, scene, children):
+        # Solo i figli statici che precedono il primo dinamico: l'ordine per zLayer resta quello del disegno
+        count = 0
+        for child in children:
+            if not child.static:
+                break
+            count += 1
+        if count == 0:
+            return False, 0
+        layer = pygame.Surface((self.screen.width, self.screen.height)).convert()
+        self._render_background(layer, scene)
+        for child in children[:count]:
+            child.render(layer)
+        return layer, count
 
-            overlay = pygame.Surface((self.screen.width, self.screen.height))
-            overlay.set_alpha(100) # Un po' più scuro per la leggibilità
-            overlay.fill((0, 0, 0))
-            self.screen.screen.blit(overlay, (0, 0))
+    def render(self):
+        if self._layer is None:
+            self._layer, self._layer_count = self._compose(self.current_scene, self.root.children)
+        if self._layer:
+            # Sfondo e oggetti statici: un solo blit opaco
+            self.screen.screen.blit(self._layer, (0, 0))
         else:
-            self.screen.screen.fill((20, 20, 20)) # Sfondo scuro per il gioco
+            self._render_background(self.screen.screen)
 
-        self.root.render(self.screen.screen)
+        self.root.renderChildren(self.screen.screen, self._layer_count)
+        if self._transition_start is not None:
+            self._render_transition()
+        self.screen.present()
         pygame.display.flip()
+        self._presented = True
 
     def checkClick(self, pos):
-        return self.root.checkClick(pos)
+        return self.root.checkClick(self.screen.to_logical(pos))
+
+    def isAnimating(self):
+        return self._transition_start is not None or self.root.isAnimating()
+
+    def skipReveal(self):
+        '''Completa i testi in rivelazione della scena; True se ce n'era almeno uno'''
+        skipped = False
+        for child in self.root.children:
+            if isinstance(child, MultiLineText) and child.skip():
+                skipped = True
+        return skipped